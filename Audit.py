@@ -0,0 +1,324 @@
+import csv
+import hashlib
+import os
+import shutil
+import string
+import struct
+import time
+from collections import deque
+
+from Dataframe import CREATED, PASSWORD, SITE, USERNAME
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Breach index layout, built once from a downloaded HIBP-style list and memory-mapped by every audit:
+#   8 byte magic | 8 byte count | count sorted 20 byte SHA-1 digests | count 4 byte big-endian times seen
+# The digests are one contiguous sorted array so a lookup is a binary search that only touches the pages it lands on.
+INDEX_HEADER = struct.Struct(">8sQ")
+INDEX_MAGIC = b"SYS230BR"
+# lines read from the source lists per batch while building
+BUILD_BATCH = 1 << 20
+
+# character classes for the entropy estimate, class 0 is the padding of shorter passwords
+LOWER, UPPER, DIGIT, SYMBOL, OTHER = range(1, 6)
+CLASS_SIZES = {LOWER: 26, UPPER: 26, DIGIT: 10, SYMBOL: 33, OTHER: 100}
+# passwords estimated below this many bits are reported as weak (a random 10 character password over all four classes
+# is about 65 bits)
+WEAK_BITS = 60
+# the old pwrandom drew `length` distinct characters with random.sample (Mersenne Twister, not a secure RNG)
+LEGACY_LENGTH = 8
+# rows audited per worker task
+AUDIT_CHUNK = 20000
+REPORT_COLUMNS = ("Site", "Username", "Issue", "Detail")
+
+
+def _class_table():
+    table = np.full(128, SYMBOL, dtype=np.uint8)
+    table[0] = 0
+    for characters, number in ((string.ascii_lowercase, LOWER), (string.ascii_uppercase, UPPER),
+                               (string.digits, DIGIT)):
+        table[np.frombuffer(characters.encode("ascii"), dtype=np.uint8)] = number
+    return table
+
+
+def _codes(passwords):
+    # one row of code points per password, padded with zeros to the longest one
+    text = np.array(passwords, dtype=str)
+    if text.dtype.itemsize == 0:
+        return np.zeros((len(passwords), 1), dtype=np.uint32)
+    return text.view(np.uint32).reshape(len(passwords), text.dtype.itemsize // 4)
+
+
+def _classes(codes):
+    return np.where(codes < 128, _class_table()[np.minimum(codes, 127)], OTHER)
+
+
+def entropy(passwords, codes=None):
+    """
+    Estimates the bits of each password from the character classes it uses: each character counts as a draw from every
+    class present (26 lowercase, 26 uppercase, 10 digits, 33 symbols and space, 100 for anything else). A character
+    repeating the one before it counts for nothing, so "aaaaaaaa" scores like "a". Vectorized over the whole list.
+    :param passwords: list of strings
+    :return: numpy array of float - bits per password
+    """
+    codes = _codes(passwords) if codes is None else codes
+    classes = _classes(codes)
+    pool = sum(size * (classes == number).any(axis=1) for number, size in CLASS_SIZES.items())
+    changed = codes != 0
+    changed[:, 1:] &= codes[:, 1:] != codes[:, :-1]
+    return changed.sum(axis=1) * np.log2(np.maximum(pool, 1))
+
+
+def legacy(passwords, created, codes=None):
+    """
+    Flags passwords that look like the old pwrandom made them: at least LEGACY_LENGTH printable characters from three or
+    more classes, none repeated, stored before entries had a creation time. A guess, random.sample never repeats a
+    character but people and the current generator sometimes don't either.
+    :param passwords: list of strings
+    :param created: list of strings - the entries' creation times, "" when unknown
+    :return: numpy array of bool
+    """
+    codes = _codes(passwords) if codes is None else codes
+    classes = _classes(codes)
+    ordered = np.sort(codes, axis=1)
+    repeated = ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] != 0)).any(axis=1)
+    printable = ((codes == 0) | ((codes > 32) & (codes < 127))).all(axis=1)
+    kinds = sum((classes == number).any(axis=1) for number in (LOWER, UPPER, DIGIT, SYMBOL))
+    untimed = np.array([not value for value in created], dtype=bool)
+    return untimed & ~repeated & printable & ((codes != 0).sum(axis=1) >= LEGACY_LENGTH) & (kinds >= 3)
+
+
+class Breach_Index:
+    """
+    Memory-mapped sorted SHA-1 digests of breached passwords, the offline counterpart of the HIBP range API. Pages are
+    only read when a binary search lands on them, so processes auditing at the same time share one copy in the page
+    cache.
+    ====================================================================================================================
+    :__init__: Maps an index file written by build
+               :param path: string
+    build: Converts HIBP-style lists into an index. Each line is HASH:COUNT, either a full 40 hex digit SHA-1 or, in
+           files named after their 5 hex digit prefix (what the range API returns), the other 35 digits. Lists in hash
+           order (the HIBP "ordered by hash" download, prefix files) are streamed, anything else is sorted in memory.
+           :param sources: list of strings - list files
+           :param path: string - index file, replaced once it's complete
+           :return: Breach_Index
+    counts: Returns how many times each digest was seen in breaches
+            :param digests: list of 20 byte SHA-1 digests
+            :return: numpy array of int - 0 for digests that aren't in the index
+    ====================================================================================================================
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as indexFile:
+            magic, self.count = INDEX_HEADER.unpack(indexFile.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path} isn't a breach index")
+        if self.count:
+            self.hashes = np.memmap(path, dtype="S20", mode="r", offset=INDEX_HEADER.size, shape=(self.count,))
+            self.seen = np.memmap(path, dtype=">u4", mode="r", offset=INDEX_HEADER.size + 20 * self.count,
+                                  shape=(self.count,))
+        else:
+            self.hashes = np.empty(0, dtype="S20")
+            self.seen = np.empty(0, dtype=">u4")
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def build(cls, sources, path):
+        # the lists are streamed into two part files, if they turn out not to be in hash order the parts are read back
+        # and sorted in memory
+        sources = sorted(sources, key=os.path.basename)
+        ordered = True
+        last = b""
+        with open(path + ".hashes", 'wb') as hashFile, open(path + ".seen", 'wb') as seenFile:
+            for digests, counts in _parse(sources):
+                ordered = ordered and last <= digests[0] and bool(np.all(digests[1:] >= digests[:-1]))
+                last = digests[-1]
+                hashFile.write(digests.tobytes())
+                seenFile.write(counts.tobytes())
+        if not ordered:
+            hashes = np.fromfile(path + ".hashes", dtype="S20")
+            seen = np.fromfile(path + ".seen", dtype=">u4")
+            order = np.argsort(hashes, kind="stable")
+            hashes[order].tofile(path + ".hashes")
+            seen[order].tofile(path + ".seen")
+        count = os.path.getsize(path + ".hashes") // 20
+        with open(path + ".tmp", 'wb') as indexFile:
+            indexFile.write(INDEX_HEADER.pack(INDEX_MAGIC, count))
+            for part in (".hashes", ".seen"):
+                with open(path + part, 'rb') as partFile:
+                    shutil.copyfileobj(partFile, indexFile)
+                os.remove(path + part)
+            indexFile.flush()
+            os.fsync(indexFile.fileno())
+        os.replace(path + ".tmp", path)
+        return cls(path)
+
+    def counts(self, digests):
+        if not self.count or not len(digests):
+            return np.zeros(len(digests), dtype=np.int64)
+        queries = np.array(digests, dtype="S20")
+        # sorted queries walk the index front to back, neighbouring searches share pages
+        order = np.argsort(queries)
+        positions = np.minimum(np.searchsorted(self.hashes, queries[order]), self.count - 1)
+        found = self.hashes[positions] == queries[order]
+        counts = np.zeros(len(queries), dtype=np.int64)
+        counts[order] = np.where(found, self.seen[positions], 0)
+        return counts
+
+
+def _parse(sources):
+    # yields (digests, counts) arrays per batch of lines
+    for source in sources:
+        prefix = os.path.splitext(os.path.basename(source))[0].upper()
+        with open(source, 'r', encoding="ascii") as listFile:
+            while True:
+                lines = listFile.readlines(BUILD_BATCH * 48)
+                if not lines:
+                    break
+                digests = []
+                counts = []
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    text, _, count = line.partition(":")
+                    if len(text) == 35:
+                        text = prefix + text
+                    if len(text) != 40:
+                        raise ValueError(f"{source}: {line[:50]!r} isn't a SHA-1 hash line")
+                    digests.append(bytes.fromhex(text))
+                    counts.append(int(count or 1))
+                if digests:
+                    yield np.array(digests, dtype="S20"), np.array(counts, dtype=">u4")
+
+
+# state of an audit worker, set once per process by _start
+_worker = {}
+
+
+def _start(breaches, key):
+    _worker["index"] = Breach_Index(breaches) if breaches else None
+    _worker["key"] = key
+
+
+def _check(passwords, created):
+    """
+    Audits one chunk of passwords, in a worker process or in this one. Only digests and scores go back, the plaintexts
+    stay in the chunk.
+    :return: (keyed digests for grouping reuse, bits, legacy flags, breach counts)
+    """
+    key = _worker["key"]
+    digests = [hashlib.blake2b(password.encode(), key=key, digest_size=16).digest() for password in passwords]
+    codes = _codes(passwords)
+    bits = entropy(passwords, codes)
+    flags = legacy(passwords, created, codes)
+    index = _worker["index"]
+    if index is None:
+        breached = np.zeros(len(passwords), dtype=np.int64)
+    else:
+        breached = index.counts([hashlib.sha1(password.encode()).digest() for password in passwords])
+    return digests, bits.tolist(), flags.tolist(), breached.tolist()
+
+
+def _batches(chunks, size):
+    # regroups chunks of rows into lists of at most size rows
+    batch = []
+    for rows in chunks:
+        for row in rows:
+            batch.append(row)
+            if len(batch) == size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _results(batches, breaches, key, processes):
+    # yields (keys of a batch, result of _check) in order. Large vaults go to a pool with at most two batches per
+    # process in flight, so only a few batches of plaintext exist at once however big the vault is.
+    batches = iter(batches)
+    first = next(batches, None)
+    second = next(batches, None)
+    if first is None:
+        return
+    processes = processes or os.cpu_count() or 1
+    if second is None or processes == 1:
+        _start(breaches, key)
+        for batch in (first, second):
+            if batch is not None:
+                yield _keys(batch), _check(*_columns(batch))
+        for batch in batches:
+            yield _keys(batch), _check(*_columns(batch))
+        _worker.clear()
+        return
+    # imported here, like Vaults, so small audits don't pay for multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import chain
+    with ProcessPoolExecutor(processes, initializer=_start, initargs=(breaches, key)) as pool:
+        pending = deque()
+        for batch in chain((first, second), batches):
+            pending.append((_keys(batch), pool.submit(_check, *_columns(batch))))
+            if len(pending) >= 2 * processes:
+                keys, future = pending.popleft()
+                yield keys, future.result()
+        while pending:
+            keys, future = pending.popleft()
+            yield keys, future.result()
+
+
+def _columns(batch):
+    return [row[PASSWORD] for row in batch], [row[CREATED] for row in batch]
+
+
+def _keys(batch):
+    return [(row[SITE], row[USERNAME]) for row in batch]
+
+
+def audit(chunks, report, breaches=None, weakBits=WEAK_BITS, processes=None, chunksize=AUDIT_CHUNK):
+    """
+    Checks every password of a vault for reuse, low entropy, the old pwrandom and breaches, and writes one CSV line per
+    finding. Weak, legacy and breached entries are written as their chunk is done, reused ones once every chunk was
+    seen. Passwords are never written, reused ones are grouped by a keyed hash that's thrown away with the audit.
+    :param chunks: iterable of lists of rows in RECORD_COLUMNS order, e.g. Vault_Store.chunks
+    :param report: text file object - gets REPORT_COLUMNS and one row per finding
+    :param breaches: string - Breach_Index file, None skips the breach check
+    :param weakBits: float - entropy estimate below which a password is weak
+    :param processes: int - worker processes (default: one per core), 1 or a vault of one chunk audits in this process
+    :param chunksize: int - rows per worker task
+    :return: dict - entries, reused, weak, legacy, breached (entries with each issue), seconds and rate
+    """
+    start = time.perf_counter()
+    writer = csv.writer(report)
+    writer.writerow(REPORT_COLUMNS)
+    key = os.urandom(16)
+    groups = {}
+    summary = {"entries": 0, "reused": 0, "weak": 0, "legacy": 0, "breached": 0}
+    for keys, (digests, bits, flags, breached) in _results(_batches(chunks, chunksize), breaches, key, processes):
+        summary["entries"] += len(keys)
+        for (site, username), digest, score, flag, seen in zip(keys, digests, bits, flags, breached):
+            # the first key of a password is kept alone, a list is only made once it's reused
+            first = groups.setdefault(digest, (site, username))
+            if first != (site, username):
+                if isinstance(first, tuple):
+                    groups[digest] = first = [first]
+                first.append((site, username))
+            if seen:
+                summary["breached"] += 1
+                writer.writerow((site, username, "breached", f"seen {seen} times"))
+            if score < weakBits:
+                summary["weak"] += 1
+                writer.writerow((site, username, "weak", f"about {score:.0f} bits"))
+            if flag:
+                summary["legacy"] += 1
+                writer.writerow((site, username, "legacy", "may come from the old pwrandom, regenerate it"))
+    for reused, group in enumerate(value for value in groups.values() if isinstance(value, list)):
+        summary["reused"] += len(group)
+        for site, username in group:
+            writer.writerow((site, username, "reused", f"group {reused + 1}, {len(group)} entries"))
+    seconds = time.perf_counter() - start
+    summary.update(seconds=seconds, rate=summary["entries"] / seconds if seconds else 0.0)
+    return summary
@@ -0,0 +1,311 @@
+import argparse
+import getpass
+import os
+import sys
+
+from Vault_state import VAULT_ENV, vault_root
+
+# Headless entry point for scripts, cron and CI:
+#   python -m CLI [--directory DIR] get|add|remove|list|search|generate|export|history|restore|audit|agent ...
+# --directory defaults to the SYS230_VAULT_DIR environment variable.
+# The master password comes from --password-file, the SYS230_MASTER_PASSWORD environment variable or a prompt.
+# Nothing here imports tkinter, and pandas/numpy are only loaded by the commands that need them (list, search, export,
+# generate, audit); get, add and remove work off the indexed vault file and the journal.
+# With --agent SOCKET, get/add/remove/list/search go to a running `python -m CLI agent` instead, which unlocked the
+# vault once and answers from memory.
+# SYS230_METRICS and SYS230_PROFILE record where the time goes, see Metrics.
+PASSWORD_ENV = "SYS230_MASTER_PASSWORD"
+
+
+class CLI_Error(Exception):
+    '''
+    Raised for problems the user can fix, printed without a traceback.
+    '''
+    pass
+
+
+def master_password(args):
+    if args.password_file:
+        with open(args.password_file, encoding="utf-8") as passwordFile:
+            return passwordFile.readline().rstrip("\r\n")
+    if PASSWORD_ENV in os.environ:
+        return os.environ[PASSWORD_ENV]
+    if sys.stdin.isatty():
+        return getpass.getpass("Master password: ")
+    raise CLI_Error(f"No master password: use --password-file, set {PASSWORD_ENV} or run from a terminal")
+
+
+def open_system(args):
+    import Vaults
+    # the working directory stays where the user ran the command, so the paths they pass resolve against it
+    directory = vault_root(args.directory)
+    absent = Vaults.missing(directory, args.vault)
+    if absent:
+        # System would run the interactive first time setup, which only makes sense from the GUI
+        raise CLI_Error(f"No vault in {directory} (missing {', '.join(absent)}), set one up with the GUI first")
+    # a wrong password raises MasterPasswordError rather than falling back to the security questions
+    return Vaults.unlock(directory, master_password(args), name=args.vault)
+
+
+def agent_client(args):
+    from Daemon import Agent_Client
+    return Agent_Client(args.agent)
+
+
+def command_get(args):
+    if args.agent:
+        with agent_client(args) as client:
+            rows = [(args.username, password) for password in client.get(args.username)]
+    else:
+        rows = open_system(args).fileLookup(args.username)
+    if not rows:
+        raise CLI_Error(f"No passwords with username {args.username}")
+    for row in rows:
+        print(row[1])
+
+
+def command_add(args):
+    system = None if args.agent else open_system(args)
+    if args.generate:
+        import Generator
+        password = Generator.generate(1, Generator.Policy(length=args.generate))[0]
+    elif args.password == "-":
+        password = sys.stdin.readline().rstrip("\r\n")
+    elif args.password is not None:
+        password = args.password
+    else:
+        password = getpass.getpass("Password: ")
+    fields = {"site": args.site, "url": args.url, "notes": args.notes, "tags": args.tags}
+    if system is None:
+        with agent_client(args) as client:
+            client.add(args.username, password, **fields)
+    else:
+        from Dataframe import entry
+        system.masterVerify()
+        system.fileAppend("add", *entry(args.username, password, **fields))
+    if args.generate:
+        print(password)
+
+
+def command_remove(args):
+    if args.agent:
+        with agent_client(args) as client:
+            client.remove(args.username, args.site)
+        return
+    from Dataframe import SITE
+    system = open_system(args)
+    if not [row for row in system.fileLookup(args.username) if args.site is None or row[SITE] == args.site]:
+        raise CLI_Error(f"No passwords with username {args.username}")
+    if args.site is None:
+        system.fileAppend("remove", args.username)
+    else:
+        system.fileAppend("remove", args.username, None, args.site)
+
+
+def command_list(args):
+    if args.agent:
+        with agent_client(args) as client:
+            usernames = client.list()
+    else:
+        usernames = open_system(args).fileOpen()["Username"].drop_duplicates()
+    for username in usernames:
+        print(username)
+
+
+def command_search(args):
+    if args.agent:
+        with agent_client(args) as client:
+            usernames, total = client.search(args.query, args.offset, args.limit)
+    else:
+        from Dataframe import Data_Manager
+        content = open_system(args).fileOpen()
+        usernames, total = Data_Manager(content).search(args.query, args.offset, args.limit)
+    for username in usernames:
+        print(username)
+    print(f"{total} matches", file=sys.stderr)
+
+
+def command_generate(args):
+    import Generator
+    if args.passphrase:
+        passwords = Generator.passphrases(args.count, words=args.words, wordlist=args.wordlist)
+    else:
+        passwords = Generator.generate(args.count, Generator.Policy(
+            length=args.length, symbols=not args.no_symbols, min_digits=args.min_digits,
+            min_symbols=args.min_symbols, exclude=args.exclude))
+    sys.stdout.write("\n".join(passwords) + "\n")
+
+
+def command_export(args):
+    result = open_system(args).fileExport(args.path, encrypted=not args.plaintext)
+    print(f"Exported {result['entries']} entries in {result['seconds']:.2f}s ({result['rate']:.0f} entries/s)",
+          file=sys.stderr)
+
+
+def command_history(args):
+    from datetime import datetime
+    for number, when, keyframe in open_system(args).historyVersions():
+        print(f"{number:>8}  {datetime.fromtimestamp(when).isoformat(sep=' ', timespec='seconds')}  "
+              f"{'keyframe' if keyframe else 'delta'}")
+
+
+def command_restore(args):
+    from datetime import datetime
+    if (args.version is None) == (args.at is None):
+        raise CLI_Error("restore needs either a version number or --at")
+    when = None
+    if args.at is not None:
+        try:
+            when = float(args.at)
+        except ValueError:
+            try:
+                when = datetime.fromisoformat(args.at).timestamp()
+            except ValueError:
+                raise CLI_Error(f"--at takes a unix time or an ISO date, not {args.at!r}")
+    try:
+        content = open_system(args).historyRestore(args.version, when)
+    except KeyError as error:
+        raise CLI_Error(error.args[0])
+    print(f"Restored {len(content.index)} entries", file=sys.stderr)
+
+
+def command_audit(args):
+    if args.processes is not None and args.processes < 1:
+        raise CLI_Error("--processes must be at least 1")
+    result = open_system(args).fileAudit(args.report, breaches=args.breaches, processes=args.processes)
+    print(f"Audited {result['entries']} entries in {result['seconds']:.2f}s: {result['reused']} reused, "
+          f"{result['weak']} weak, {result['legacy']} legacy, {result['breached']} breached", file=sys.stderr)
+
+
+def command_breach_index(args):
+    from Audit import Breach_Index
+    index = Breach_Index.build(args.sources, args.output)
+    print(f"Indexed {len(index)} hashes in {args.output}", file=sys.stderr)
+
+
+def command_agent(args):
+    import asyncio
+    from Daemon import Vault_Daemon
+    daemon = Vault_Daemon(open_system(args), args.socket, batchDelay=args.batch_delay / 1000)
+    print(f"Serving {args.vault} on {args.socket}", file=sys.stderr)
+    asyncio.run(daemon.serve_forever())
+
+
+def command_metrics(args):
+    import json
+    import Metrics
+    if not args.agent:
+        raise CLI_Error("metrics reads a running agent's metrics, pass --agent SOCKET")
+    with agent_client(args) as client:
+        snapshot = client.metrics()
+    sys.stdout.write(Metrics.prometheus(snapshot) if args.prometheus else json.dumps(snapshot, indent=2) + "\n")
+
+
+def parser():
+    main = argparse.ArgumentParser(prog="python -m CLI", description="Password manager command line")
+    main.add_argument("--directory", default=os.environ.get(VAULT_ENV),
+                      help=f"directory holding the vault files (default: ${VAULT_ENV} or the current directory)")
+    main.add_argument("--vault", default="password.csv", help="vault file name")
+    main.add_argument("--password-file", help="file whose first line is the master password")
+    main.add_argument("--agent", metavar="SOCKET", help="send get/add/remove/list/search to the daemon on this socket")
+    commands = main.add_subparsers(dest="command", required=True)
+
+    get = commands.add_parser("get", help="print the passwords stored for a username")
+    get.add_argument("username")
+    get.set_defaults(run=command_get)
+
+    add = commands.add_parser("add", help="store a password for a username")
+    add.add_argument("username")
+    add.add_argument("--site", default="", help="site the password is for, replaces the username's entry for it")
+    add.add_argument("--url", default="")
+    add.add_argument("--notes", default="")
+    add.add_argument("--tags", default="", help="comma separated")
+    source = add.add_mutually_exclusive_group()
+    source.add_argument("--password", help="the password, '-' reads it from stdin (default: prompt)")
+    source.add_argument("--generate", type=int, metavar="LENGTH", help="generate a password of this length")
+    add.set_defaults(run=command_add)
+
+    remove = commands.add_parser("remove", help="remove the passwords stored for a username")
+    remove.add_argument("username")
+    remove.add_argument("--site", help="only remove the entry for this site (default: every site)")
+    remove.set_defaults(run=command_remove)
+
+    listing = commands.add_parser("list", help="print every username")
+    listing.set_defaults(run=command_list)
+
+    search = commands.add_parser("search", help="print usernames matching a prefix or, fuzzily, a part of them")
+    search.add_argument("query")
+    search.add_argument("--offset", type=int, default=0, help="matches to skip")
+    search.add_argument("--limit", type=int, default=50, help="most matches printed")
+    search.set_defaults(run=command_search)
+
+    generate = commands.add_parser("generate", help="print random passwords, no vault needed")
+    generate.add_argument("--count", type=int, default=1)
+    generate.add_argument("--length", type=int, default=16)
+    generate.add_argument("--no-symbols", action="store_true")
+    generate.add_argument("--min-digits", type=int, default=0)
+    generate.add_argument("--min-symbols", type=int, default=0)
+    generate.add_argument("--exclude", default="", help="characters never to use")
+    generate.add_argument("--passphrase", action="store_true", help="generate word passphrases instead")
+    generate.add_argument("--words", type=int, default=8, help="words per passphrase")
+    generate.add_argument("--wordlist", help="file with one word per line for passphrases")
+    generate.set_defaults(run=command_generate)
+
+    export = commands.add_parser("export", help="write every entry to a CSV file")
+    export.add_argument("path")
+    export.add_argument("--plaintext", action="store_true", help="write plaintext instead of encrypting")
+    export.set_defaults(run=command_export)
+
+    history = commands.add_parser("history", help="list the versions the vault's history keeps")
+    history.set_defaults(run=command_history)
+
+    restore = commands.add_parser("restore", help="make an earlier version the vault's content again")
+    restore.add_argument("version", type=int, nargs="?", help="version number, see history")
+    restore.add_argument("--at", help="restore the vault as it was at this time (unix time or ISO date)")
+    restore.set_defaults(run=command_restore)
+
+    audit = commands.add_parser("audit", help="report reused, weak, legacy and breached passwords (never prints them)")
+    audit.add_argument("--report", default="-", help="CSV report file (default: stdout)")
+    audit.add_argument("--breaches", metavar="INDEX", help="breach index made by breach-index")
+    audit.add_argument("--processes", type=int, help="worker processes (default: one per core)")
+    audit.set_defaults(run=command_audit)
+
+    breaches = commands.add_parser("breach-index", help="build a breach index from HIBP-style SHA-1 lists, no vault "
+                                                        "needed")
+    breaches.add_argument("sources", nargs="+", help="HASH:COUNT list files, or range API files named by prefix")
+    breaches.add_argument("--output", default="breaches.idx", help="index file (default: breaches.idx)")
+    breaches.set_defaults(run=command_breach_index)
+
+    agent = commands.add_parser("agent", help="unlock the vault once and serve it on a Unix socket until stopped")
+    agent.add_argument("--socket", default="vault.sock", help="socket path (default: vault.sock)")
+    agent.add_argument("--batch-delay", type=float, default=2.0, help="ms to collect writes into one journal append")
+    agent.set_defaults(run=command_agent)
+
+    metrics = commands.add_parser("metrics", help="print the timings and counters of the agent given with --agent")
+    metrics.add_argument("--prometheus", action="store_true", help="Prometheus text instead of JSON")
+    metrics.set_defaults(run=command_metrics)
+    return main
+
+
+def main(argv=None):
+    import Metrics
+    Metrics.start_session()
+    args = parser().parse_args(argv)
+    try:
+        args.run(args)
+    except CLI_Error as error:
+        print(error, file=sys.stderr)
+        return 1
+    except Exception as error:
+        # MasterPasswordError and friends or an unreachable daemon, anything else still gets its traceback
+        from Daemon import Daemon_Error
+        from OS_interface import FileError
+        if not isinstance(error, (FileError, Daemon_Error)):
+            raise
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
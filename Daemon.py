@@ -0,0 +1,394 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import Metrics
+from Dataframe import Data_Manager
+from Search import PAGE_SIZE
+
+# Requests and responses are JSON objects, one per line. Every request carries an "op" and an optional "id" that is
+# echoed back; responses on a connection come back in request order, so clients can pipeline.
+#   {"id": 1, "op": "get", "username": "bob"}              -> {"id": 1, "ok": true, "passwords": ["..."]}
+#   {"id": 2, "op": "add", "username": "bob", "password": "..."} -> {"id": 2, "ok": true} once it's in the journal
+#       (optional "site", "url", "notes" and "tags" fields, an add replaces bob's entry for the same site)
+#   {"id": 3, "op": "remove", "username": "bob"}           -> {"id": 3, "ok": true} (optional "site": only that entry)
+#   {"id": 4, "op": "list"}                                -> {"id": 4, "ok": true, "usernames": [...]}
+#   {"id": 5, "op": "search", "query": "bo", "offset": 0, "limit": 50}
+#                                                          -> {"id": 5, "ok": true, "usernames": [...], "total": 120}
+#   {"id": 6, "op": "ping"}                                -> {"id": 6, "ok": true}
+#   {"id": 7, "op": "metrics"}                             -> {"id": 7, "ok": true, "metrics": {...}} (see Metrics)
+#   {"id": 8, "op": "query", "site": "github.com", "tag": "work", "offset": 0, "limit": 50}
+#                                                          -> {"id": 8, "ok": true, "entries": [{...}], "total": 3}
+# Failures come back as {"id": ..., "ok": false, "error": "..."}.
+SOCKET_NAME = "vault.sock"
+BATCH_DELAY = 0.002
+BATCH_LIMIT = 1000
+# requests answered from memory, checked against the files first
+READS = frozenset(("get", "list", "search", "query"))
+
+
+class Daemon_Error(Exception):
+    '''
+    Raised by Agent_Client when the daemon can't be reached or refuses a request.
+    '''
+    pass
+
+
+class Vault_Daemon:
+    """
+    Keeps one unlocked vault in memory and serves it over a Unix domain socket, so processes that need a credential
+    don't each decrypt the vault and ask for the master password. Lookups are answered from the Data_Manager index on
+    the event loop. Writes update the Data_Manager at once (later requests see them) and are queued for a single
+    writer, which waits BATCH_DELAY seconds for more to arrive and appends the whole batch to the journal with one
+    System.fileAppendMany, on its own thread. A write is only acknowledged once its batch is on disk.
+    Other processes may write to the vault too (the CLI, the GUI, another daemon). Before a read is answered
+    System.fileChanged checks, with two stats, whether any of them did since the vault was loaded; if so the vault is
+    loaded again first and requests arriving meanwhile wait for it. While writes of this daemon are still on their way
+    to the journal the check is left to the next read, their append notices the other writer as well.
+    The socket is created mode 0600 and, where the OS reports it, connections from other users are dropped.
+    ====================================================================================================================
+    :__init__: :param system: System - unlocked vault, fileOpen is called once at start
+               :param socketPath: string - where to create the socket
+               :param batchDelay: float - seconds the writer waits to collect a batch
+               :param batchLimit: int - most changes written in one batch
+    start: Loads the vault and starts listening
+           :param: None
+           :return: None
+    serve_forever: start, then serves until SIGINT or SIGTERM and closes
+                   :param: None
+                   :return: None
+    close: Stops listening, waits for queued writes to reach the journal and removes the socket
+           :param: None
+           :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, system, socketPath=SOCKET_NAME, batchDelay=BATCH_DELAY, batchLimit=BATCH_LIMIT):
+        self.system = system
+        self.socketPath = socketPath
+        self.batchDelay = batchDelay
+        self.batchLimit = batchLimit
+        # one thread, so batches reach the journal in the order they were queued
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vault-writer",
+                                           initializer=Metrics.profile_thread)
+        self.manager = None
+        self.changes = None
+        # changes queued or being written, and the reload in progress
+        self.pending = 0
+        self.reloading = None
+        self.committer = None
+        self.server = None
+        self.connections = set()
+        self.handlers = {"get": self._get, "list": self._list, "search": self._search, "add": self._add,
+                         "remove": self._remove, "ping": self._ping, "metrics": self._metrics, "query": self._query}
+
+    async def _load(self):
+        content = await asyncio.get_running_loop().run_in_executor(self.executor, self.system.fileOpen)
+        self.manager = Data_Manager(content)
+
+    async def _reload(self):
+        # one reload at a time, everyone asking meanwhile waits for the same one
+        if self.reloading is None:
+            self.reloading = asyncio.ensure_future(self._load())
+            Metrics.count("daemon.reloads")
+        try:
+            await asyncio.shield(self.reloading)
+        finally:
+            if self.reloading is not None and self.reloading.done():
+                self.reloading = None
+
+    def _current(self):
+        # whether a read can be answered from memory right away
+        compactor = self.system.compactor
+        return bool(self.pending) or ((compactor is None or not compactor.is_alive()) and not self.system.fileChanged())
+
+    async def start(self):
+        await self._load()
+        self.changes = asyncio.Queue()
+        self.committer = asyncio.create_task(self._commit())
+        if os.path.exists(self.socketPath):
+            if _listening(self.socketPath):
+                raise Daemon_Error(f"A daemon is already listening on {self.socketPath}")
+            # left behind by a daemon that didn't shut down cleanly
+            os.unlink(self.socketPath)
+        previous = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self._serve, path=self.socketPath)
+        finally:
+            os.umask(previous)
+
+    async def serve_forever(self):
+        await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        try:
+            await stop.wait()
+        finally:
+            await self.close()
+
+    async def close(self):
+        self.server.close()
+        for writer in list(self.connections):
+            writer.close()
+        await self.changes.join()
+        self.committer.cancel()
+        if os.path.exists(self.socketPath):
+            os.unlink(self.socketPath)
+        self.executor.shutdown(wait=True)
+
+    def _trusted(self, writer):
+        # the socket mode already keeps other users out where the OS honours it, SO_PEERCRED double checks on Linux
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True
+        sock = writer.get_extra_info("socket")
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", credentials)[1] == os.getuid()
+
+    async def _serve(self, reader, writer):
+        if not self._trusted(writer):
+            writer.close()
+            return
+        self.connections.add(writer)
+        # requests are read as fast as they arrive, the responses (some waiting on a batch) are written in order by
+        # _send, so pipelined writes from one client end up in the same batch
+        responses = asyncio.Queue()
+        sender = asyncio.create_task(self._send(writer, responses))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                responses.put_nowait(self._handle(line))
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than the stream limit
+            pass
+        finally:
+            responses.put_nowait(None)
+            await sender
+            self.connections.discard(writer)
+            writer.close()
+
+    async def _send(self, writer, responses):
+        try:
+            while True:
+                response = await responses.get()
+                if response is None:
+                    break
+                if asyncio.isfuture(response):
+                    response = await response
+                writer.write(json.dumps(response).encode() + b"\n")
+                if responses.empty():
+                    await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _handle(self, line):
+        # returns the response, or a future of it for writes
+        ident = None
+        try:
+            request = json.loads(line)
+            ident = request.get("id")
+            handler = self.handlers[request["op"]]
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            return {"id": ident, "ok": False, "error": f"Bad request: {error!r}"}
+        # writes wait for a reload in progress too, applied to the vault being replaced they'd be lost from memory
+        if self.reloading is not None or (request["op"] in READS and not self._current()):
+            return asyncio.ensure_future(self._refreshed(ident, handler, request))
+        return self._answer(ident, handler, request)
+
+    def _answer(self, ident, handler, request):
+        try:
+            with Metrics.timer("daemon." + request["op"]):
+                result = handler(request)
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            return {"id": ident, "ok": False, "error": f"Bad request: {error!r}"}
+        except Daemon_Error as error:
+            return {"id": ident, "ok": False, "error": str(error)}
+        if asyncio.isfuture(result):
+            return asyncio.ensure_future(self._acknowledge(ident, result))
+        return dict(result, id=ident, ok=True)
+
+    async def _refreshed(self, ident, handler, request):
+        # a compaction of this daemon's own System replaces the files too, they're only compared once it's done
+        compactor = self.system.compactor
+        if compactor is not None and compactor.is_alive():
+            await asyncio.get_running_loop().run_in_executor(None, compactor.join)
+        try:
+            if self.reloading is not None or not self._current():
+                await self._reload()
+        except Exception as error:
+            return {"id": ident, "ok": False, "error": f"Reload failed: {error}"}
+        response = self._answer(ident, handler, request)
+        return (await response) if asyncio.isfuture(response) else response
+
+    async def _acknowledge(self, ident, committed):
+        try:
+            await committed
+        except Exception as error:
+            return {"id": ident, "ok": False, "error": f"Write failed: {error}"}
+        return {"id": ident, "ok": True}
+
+    def _get(self, request):
+        return {"passwords": [row[1] for row in self.manager.store.lookup(request["username"])]}
+
+    def _list(self, request):
+        return {"usernames": list(self.manager.store.keys())}
+
+    def _search(self, request):
+        usernames, total = self.manager.search(str(request["query"]), int(request.get("offset", 0)),
+                                               int(request.get("limit", PAGE_SIZE)))
+        return {"usernames": usernames, "total": total}
+
+    def _ping(self, request):
+        return {}
+
+    def _metrics(self, request):
+        return {"metrics": Metrics.metrics.snapshot()}
+
+    def _query(self, request):
+        entries, total = self.manager.query(request.get("site"), request.get("tag"), request.get("username"),
+                                            int(request.get("offset", 0)), int(request.get("limit", PAGE_SIZE)))
+        return {"entries": entries.to_dict("records"), "total": total}
+
+    def _add(self, request):
+        row = self.manager.add(str(request["username"]), str(request["password"]), str(request.get("site", "")),
+                               str(request.get("url", "")), str(request.get("notes", "")), request.get("tags", ()))
+        return self._queue(("add",) + row)
+
+    def _remove(self, request):
+        username, site = str(request["username"]), request.get("site")
+        try:
+            self.manager.remove(username, site)
+        except KeyError:
+            raise Daemon_Error(f"No passwords with username {username}")
+        return self._queue(("remove", username) if site is None else ("remove", username, None, str(site)))
+
+    def _queue(self, change):
+        committed = asyncio.get_running_loop().create_future()
+        self.pending += 1
+        self.changes.put_nowait((change, committed))
+        return committed
+
+    async def _commit(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.changes.get()]
+            # a burst of writes arriving within the delay shares one journal append and fsync
+            await asyncio.sleep(self.batchDelay)
+            while len(batch) < self.batchLimit and not self.changes.empty():
+                batch.append(self.changes.get_nowait())
+            Metrics.count("daemon.batches")
+            Metrics.count("daemon.batched_changes", len(batch))
+            try:
+                await loop.run_in_executor(self.executor, self.system.fileAppendMany, [change for change, _ in batch])
+            except Exception as error:
+                # memory is now ahead of the disk: reload, then fail this batch and everything queued behind it
+                while not self.changes.empty():
+                    batch.append(self.changes.get_nowait())
+                try:
+                    await self._reload()
+                except Exception as reloadError:
+                    # the committer keeps running either way, a write future left unresolved would hang its client
+                    reloadError.__context__ = error
+                    error = reloadError
+                for _, committed in batch:
+                    if not committed.done():
+                        committed.set_exception(error)
+            else:
+                for _, committed in batch:
+                    committed.set_result(None)
+            finally:
+                self.pending -= len(batch)
+                for _ in batch:
+                    self.changes.task_done()
+
+
+def _listening(path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+class Agent_Client:
+    """
+    Blocking client for Vault_Daemon, one request at a time.
+    ====================================================================================================================
+    :__init__: Connects to the daemon, raises Daemon_Error if nothing is listening
+               :param socketPath: string
+               :param timeout: float - seconds to wait for a response
+    request: Sends one request and returns its response, raises Daemon_Error if it failed
+             :param op: string
+             :param fields: the request's other fields
+             :return: dict
+    get, add, remove, list, search, metrics, query: Shortcuts for the matching requests
+    close: Closes the connection
+           :param: None
+           :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, socketPath=SOCKET_NAME, timeout=5.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(socketPath)
+        except OSError as error:
+            self.sock.close()
+            raise Daemon_Error(f"No daemon listening on {socketPath}: {error}")
+        self.stream = self.sock.makefile("rb")
+        self.ident = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, op, **fields):
+        self.ident += 1
+        self.sock.sendall(json.dumps(dict(fields, op=op, id=self.ident)).encode() + b"\n")
+        line = self.stream.readline()
+        if not line:
+            raise Daemon_Error("Daemon closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise Daemon_Error(response["error"])
+        return response
+
+    def get(self, username):
+        return self.request("get", username=username)["passwords"]
+
+    def add(self, username, password, **fields):
+        self.request("add", username=username, password=password, **fields)
+
+    def remove(self, username, site=None):
+        self.request("remove", username=username, **({} if site is None else {"site": site}))
+
+    def query(self, site=None, tag=None, username=None, offset=0, limit=PAGE_SIZE):
+        response = self.request("query", site=site, tag=tag, username=username, offset=offset, limit=limit)
+        return response["entries"], response["total"]
+
+    def list(self):
+        return self.request("list")["usernames"]
+
+    def search(self, query, offset=0, limit=PAGE_SIZE):
+        response = self.request("search", query=query, offset=offset, limit=limit)
+        return response["usernames"], response["total"]
+
+    def metrics(self):
+        return self.request("metrics")["metrics"]
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
@@ -1,41 +1,588 @@
-import random
-import string
-# Module to create filesystem paths. We can use the touch() method.
-import pandas as pd
-
-#data manager class
-class Data_Manager:
-    #This initialises the dataframe
-    def __init__(self, df, input_function=input):
-        self.dataframe = df
-        self.input_function = input_function
-    #this adds a user with a password to the dataframe
-    def add(self, username, passwd):
-        # adds a user with their password
-        index = len(self.dataframe.index)
-        self.dataframe.loc[index, :] = [username, passwd]
-    #removes the user with their password
-    def remove(self, username):  # input a pandas dataframe
-        # removes a user with their password
-
-        index = int(self.dataframe[self.dataframe['Username'] == username].index.values)
-        self.dataframe.drop(labels=[index], axis=0, inplace=True)
-
-    def pwrandom(self):
-        # generates a random password based on the length the user specifies
-        length = int(self.input_function("What would you like the length of your password to be? "))
-
-        lowercase = string.ascii_lowercase
-        uppercase = string.ascii_uppercase
-        numbers = string.digits
-        symbols = string.punctuation
-
-        all = lowercase + uppercase + numbers + symbols
-
-        temp = random.sample(all, length)
-        random_password = "".join(temp)
-
-        return random_password
-    #retrieves the data for a certain username
-    def retrieve(self, username):
-        return self.dataframe[self.dataframe['Username'] == username]
\ No newline at end of file
+import bisect
+import time
+from array import array
+from itertools import chain, compress
+# Module to create filesystem paths. We can use the touch() method.
+import Metrics
+from Lazy import lazy_import
+from Search import MAX_FUZZY, PAGE_SIZE, Username_Index
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+# System imports this module for the record layout, only pwrandom needs the generator's word list and audit Audit
+Generator = lazy_import("Generator")
+Audit = lazy_import("Audit")
+
+# number of rows held by each column chunk in Vault_Store
+CHUNK_SIZE = 4096
+# imports adding more names than this drop the search index, it's rebuilt in one go on the next search
+INDEX_REBUILD = 1000
+
+# fields of an entry in the order they're stored on disk. Entries are keyed by (site, username); vaults and journal
+# records written before the metadata existed only have the first two fields, the rest read as empty
+RECORD_COLUMNS = ("Username", "Password", "Site", "URL", "Notes", "Tags", "Created", "Modified")
+USERNAME, PASSWORD, SITE, URL, NOTES, TAGS, CREATED, MODIFIED = range(len(RECORD_COLUMNS))
+# values shared by many entries, stored once in a Category with the rows holding codes
+CATEGORY_COLUMNS = (SITE, URL, TAGS)
+# seconds since the epoch, "" when unknown
+TIME_COLUMNS = (CREATED, MODIFIED)
+TAG_SEPARATOR = ","
+
+
+def record(row):
+    # pads a stored row (from the vault, the journal or a lookup) to RECORD_COLUMNS, None reads as ""
+    row = ["" if value is None else value for value in row]
+    return row + [""] * (len(RECORD_COLUMNS) - len(row))
+
+
+def tag_list(tags):
+    # "work, mail" or ["work", "mail"] -> ["work", "mail"]
+    if isinstance(tags, str):
+        tags = tags.split(TAG_SEPARATOR)
+    return [tag.strip() for tag in tags if tag and tag.strip()]
+
+
+def entry(username, password, site="", url="", notes="", tags=(), created=None):
+    """
+    Builds a new entry row, stamped with the current time.
+    :param tags: string or list of strings
+    :param created: int - creation time of the entry this one replaces, now if not given
+    :return: tuple - one string per RECORD_COLUMNS
+    """
+    now = int(time.time())
+    return (username, password, site, url, notes, TAG_SEPARATOR.join(tag_list(tags)),
+            str(now if created is None else created), str(now))
+
+
+class Category:
+    """
+    The distinct values of a category column, a row holds the code of its value.
+    ====================================================================================================================
+    encode: Returns the code of a value, adding the value if it's new
+            :param value: string
+            :return: int
+    ====================================================================================================================
+    """
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _array(values):
+    # numpy slots -> array("I")
+    slots = array("I")
+    slots.frombytes(values.astype(np.dtype(f"u{slots.itemsize}")).tobytes())
+    return slots
+
+
+def _postings(chunks):
+    # {code: array("I") of the slots holding it, in slot order} for a category column, sorted in one go by numpy
+    if not chunks:
+        return {}
+    codes = np.concatenate([np.frombuffer(chunk, dtype=np.dtype(f"u{chunk.itemsize}")) for chunk in chunks])
+    order = np.argsort(codes, kind="stable")
+    ordered = codes[order]
+    starts = np.flatnonzero(np.diff(ordered)) + 1
+    return {int(code): _array(slots) for code, slots in zip(ordered[np.r_[0, starts]], np.split(order, starts))}
+
+
+#indexed in-memory store that sits behind Data_Manager
+class Vault_Store:
+    """
+    Entries are kept column by column in fixed size chunks so appending never copies the existing rows. Category
+    columns (site, URL, tags) hold array('I') codes into a Category and the timestamps array('q') seconds, so a site
+    shared by thousands of entries is stored once and costs 4 bytes per entry. A dict maps each username to the slots
+    holding its entries so lookups and removals don't scan the vault. The site and tag indexes (arrays of slots) are
+    built on the first query and kept up to date by appends; removals only tombstone the slot, queries skip dead ones.
+    The chunks are compacted once more than half of the slots are dead. Sort orders (lists of live slots sorted by a
+    column, text case-insensitively) are built the first time a column is sorted on and kept up to date by appends
+    and removals, so paging through a sorted vault never sorts it again.
+    ====================================================================================================================
+    :__init__: Initializes an empty store
+               :return: None
+    from_dataframe: Builds a store from a pandas dataframe, missing RECORD_COLUMNS are left empty
+                    :param df: dataframe
+                    :return: Vault_Store
+    append: Adds a row
+            :param row: tuple - values in RECORD_COLUMNS order, missing trailing values are empty
+            :return: int - slot the row was stored in
+    extend: Adds many rows at once, filling the column chunks slice by slice
+            :param columns: list of lists - one list of values per RECORD_COLUMNS column
+            :return: None
+    keys: Returns the usernames that have at least one entry
+          :param: None
+          :return: dict keys view
+    row: Returns the entry in a slot
+         :param slot: int
+         :return: tuple - strings in RECORD_COLUMNS order
+    lookup: Returns the entries stored under a username, for every site
+            :param key: string - username
+            :return: list - row tuples
+    find: Returns the slots holding the entry for a site and username
+          :param username: string
+          :param site: string
+          :return: list of int
+    contains: Tells which (username, site) pairs have an entry, for a whole batch at once
+              :param usernames: list of strings
+              :param sites: list of strings - one per username
+              :return: numpy array of bool
+    delete: Removes the entries stored under a username, for one site or for all of them
+            :param key: string - username
+            :param site: string - None removes the username's entries for every site
+            :return: int - number of rows removed
+    select: Returns the slots of the entries matching every given filter, walking the shortest index that applies
+            :param site: string - exact site
+            :param tag: string - one of the entry's tags
+            :param username: string - exact username
+            :return: list of int - in slot (insertion) order
+    slots: Returns the slots holding a username's entries
+           :param key: string - username
+           :return: tuple of int
+    order: Returns the live slots sorted by a column, ties in slot order. The list is the store's own, don't change it.
+           :param position: int - column, e.g. USERNAME
+           :return: list of int
+    sort_key: Returns what a slot is sorted on for a column
+              :param position: int - column
+              :param slot: int
+              :return: string (casefolded) or int (seconds)
+    chunks: Yields the live rows, one list per column chunk
+            :param: None
+            :return: generator of lists of row tuples
+    to_dataframe: Converts the live rows into a pandas dataframe of strings. The result is cached until the next change.
+                  :param: None
+                  :return: dataframe
+    ====================================================================================================================
+    """
+
+    def __init__(self):
+        self.columns = RECORD_COLUMNS
+        self._categories = {position: Category() for position in CATEGORY_COLUMNS}
+        self._chunks = [[] for _ in self.columns]
+        self._alive = []
+        self._size = 0
+        self._live = 0
+        self._index = {}
+        self._sites = None
+        self._tags = None
+        self._tagSets = {}
+        self._orders = {}
+        self._frame = None
+
+    @classmethod
+    def from_dataframe(cls, df):
+        store = cls()
+        count = len(df.index)
+        data = []
+        for name in store.columns:
+            if name not in df.columns:
+                data.append([""] * count)
+            else:
+                column = df[name]
+                data.append((column.fillna("") if column.hasnans else column).tolist())
+        store.extend(data)
+        return store
+
+    def __len__(self):
+        return self._live
+
+    def _new_chunk(self):
+        for position, column in enumerate(self._chunks):
+            if position in CATEGORY_COLUMNS:
+                column.append(array("I"))
+            elif position in TIME_COLUMNS:
+                column.append(array("q"))
+            else:
+                column.append([])
+        self._alive.append(bytearray())
+
+    def _encode(self, position, values):
+        # stored form of a column's values: codes, seconds or the strings themselves
+        if position in CATEGORY_COLUMNS:
+            return array("I", map(self._categories[position].encode, values))
+        if position in TIME_COLUMNS:
+            return array("q", [int(value) if value else 0 for value in values])
+        return values
+
+    def _decode(self, position, values):
+        if position in CATEGORY_COLUMNS:
+            return list(map(self._categories[position].values.__getitem__, values))
+        if position in TIME_COLUMNS:
+            return [str(value) if value else "" for value in values]
+        return list(values)
+
+    def _tagsOf(self, code):
+        # the tags of a Tags code, split once per distinct tag set
+        tags = self._tagSets.get(code)
+        if tags is None:
+            tags = self._tagSets[code] = tuple(tag_list(self._categories[TAGS].values[code]))
+        return tags
+
+    def _indexSlot(self, key, slot):
+        # most usernames have a single entry, their slot is stored as is instead of in a list
+        slots = self._index.get(key)
+        if slots is None:
+            self._index[key] = slot
+        elif isinstance(slots, list):
+            slots.append(slot)
+        else:
+            self._index[key] = [slots, slot]
+
+    def _slots(self, key):
+        slots = self._index.get(key, ())
+        return (slots,) if isinstance(slots, int) else slots
+
+    def slots(self, key):
+        return tuple(self._slots(key))
+
+    def _indexSecondary(self, slot, site, tags):
+        self._sites.setdefault(site, array("I")).append(slot)
+        for tag in self._tagsOf(tags):
+            self._tags.setdefault(tag, array("I")).append(slot)
+
+    def append(self, row):
+        self.extend([[value] for value in record(row)])
+        return self._size - 1
+
+    def extend(self, columns):
+        count = len(columns[0])
+        first = self._size
+        start = 0
+        while start < count:
+            if self._size % CHUNK_SIZE == 0:
+                # last chunk is full (or there are none yet), start a new one instead of growing the old ones
+                self._new_chunk()
+            stop = min(count, start + CHUNK_SIZE - self._size % CHUNK_SIZE)
+            for position, (column, values) in enumerate(zip(self._chunks, columns)):
+                column[-1].extend(self._encode(position, values[start:stop]))
+            self._alive[-1].extend(b"\x01" * (stop - start))
+            self._size += stop - start
+            start = stop
+        for slot, key in enumerate(columns[USERNAME], first):
+            self._indexSlot(key, slot)
+        if self._sites is not None:
+            for slot in range(first, self._size):
+                self._indexSecondary(slot, self._value(SITE, slot), self._value(TAGS, slot))
+        self._live += count
+        if count > INDEX_REBUILD:
+            self._orders = {}
+        for position, order in self._orders.items():
+            for slot in range(first, self._size):
+                # after the slots sorting the same, like a stable sort would put it
+                bisect.insort(order, slot, key=lambda other: self.sort_key(position, other))
+        if count:
+            self._frame = None
+
+    def keys(self):
+        return self._index.keys()
+
+    def _value(self, position, slot):
+        # stored value, a code for category columns
+        chunk, offset = divmod(slot, CHUNK_SIZE)
+        return self._chunks[position][chunk][offset]
+
+    def row(self, slot):
+        chunk, offset = divmod(slot, CHUNK_SIZE)
+        return tuple(self._decode(position, column[chunk][offset:offset + 1])[0]
+                     for position, column in enumerate(self._chunks))
+
+    def lookup(self, key):
+        return [self.row(slot) for slot in self._slots(key)]
+
+    def find(self, username, site):
+        code = self._categories[SITE].codes.get(site)
+        if code is None:
+            return []
+        return [slot for slot in self._slots(username) if self._value(SITE, slot) == code]
+
+    def contains(self, usernames, sites):
+        # one set intersection finds the usernames the batch shares with the vault and only their entries are read,
+        # then every pair is tested against those in a single pass
+        shared = self._index.keys() & usernames
+        pairs = {(key, self._value(SITE, slot)) for key in shared for slot in self._slots(key)}
+        codes = map(self._categories[SITE].codes.get, sites)
+        return np.fromiter(map(pairs.__contains__, zip(usernames, codes)), dtype=bool, count=len(usernames))
+
+    def delete(self, key, site=None):
+        slots = self._slots(key)
+        if site is not None:
+            slots = self.find(key, site)
+            kept = [slot for slot in self._slots(key) if slot not in slots]
+            if len(kept) > 1:
+                self._index[key] = kept
+            elif kept:
+                self._index[key] = kept[0]
+            else:
+                self._index.pop(key, None)
+        else:
+            self._index.pop(key, None)
+        for slot in slots:
+            # taken out of the sort orders while its strings are still there to find it by
+            for position, order in self._orders.items():
+                sortKey = self.sort_key(position, slot)
+                start = bisect.bisect_left(order, sortKey, key=lambda other: self.sort_key(position, other))
+                del order[order.index(slot, start)]
+            chunk, offset = divmod(slot, CHUNK_SIZE)
+            self._alive[chunk][offset] = 0
+            # the strings are dropped now, codes and timestamps are plain numbers and wait for the compaction
+            for position in (USERNAME, PASSWORD, NOTES):
+                self._chunks[position][chunk][offset] = None
+        self._live -= len(slots)
+        if slots:
+            self._frame = None
+        if self._size > CHUNK_SIZE and self._live * 2 < self._size:
+            self._compact()
+        return len(slots)
+
+    def _compact(self):
+        # drops the tombstoned slots and rebuilds the chunks and the indexes from the live rows
+        live = []
+        for position, column in enumerate(self._chunks):
+            values = compress(chain.from_iterable(column), chain.from_iterable(self._alive))
+            live.append(array(column[0].typecode, values) if isinstance(column[0], array) else list(values))
+        self._chunks = [[values[start:start + CHUNK_SIZE] for start in range(0, self._live, CHUNK_SIZE)]
+                        for values in live]
+        self._alive = [bytearray(b"\x01" * len(chunk)) for chunk in self._chunks[0]]
+        self._index = {}
+        self._sites = None
+        self._tags = None
+        self._orders = {}
+        for slot, key in enumerate(live[USERNAME]):
+            self._indexSlot(key, slot)
+        self._size = self._live
+
+    def _secondary(self):
+        # builds the site and tag indexes the first time a query needs them
+        if self._sites is None:
+            self._sites = _postings(self._chunks[SITE])
+            parts = {}
+            for code, slots in _postings(self._chunks[TAGS]).items():
+                for tag in self._tagsOf(code):
+                    parts.setdefault(tag, []).append(slots)
+            # a tag shared by several tag sets gets their slots merged back into slot order
+            self._tags = {tag: slots[0] if len(slots) == 1 else _array(np.sort(np.concatenate(slots)))
+                          for tag, slots in parts.items()}
+
+    def select(self, site=None, tag=None, username=None):
+        checks = []
+        postings = []
+        if username is not None:
+            postings.append(self._slots(username))
+            checks.append(lambda slot: self._value(USERNAME, slot) == username)
+        if site is not None or tag is not None:
+            self._secondary()
+        if site is not None:
+            code = self._categories[SITE].codes.get(site)
+            postings.append(self._sites.get(code, ()))
+            checks.append(lambda slot: self._value(SITE, slot) == code)
+        if tag is not None:
+            postings.append(self._tags.get(tag, ()))
+            checks.append(lambda slot: tag in self._tagsOf(self._value(TAGS, slot)))
+        if not postings:
+            return list(compress(range(self._size), chain.from_iterable(self._alive)))
+        # the shortest list is walked, the other filters are checked on its slots only
+        shortest = min(postings, key=len)
+        if len(postings) == 1:
+            checks = []
+        alive = self._alive
+        if not checks and self._live == self._size:
+            # nothing removed since the last compaction, every slot in the index is live
+            return list(shortest)
+        return [slot for slot in shortest if alive[slot // CHUNK_SIZE][slot % CHUNK_SIZE]
+                and all(check(slot) for check in checks)]
+
+    def sort_key(self, position, slot):
+        value = self._value(position, slot)
+        if position in CATEGORY_COLUMNS:
+            return self._categories[position].values[value].casefold()
+        if position in TIME_COLUMNS:
+            return value
+        return value.casefold()
+
+    def order(self, position):
+        order = self._orders.get(position)
+        if order is None:
+            # the keys of every slot at once, a category's values are folded once instead of once per entry
+            stored = chain.from_iterable(self._chunks[position])
+            if position in CATEGORY_COLUMNS:
+                folded = [value.casefold() for value in self._categories[position].values]
+                keys = list(map(folded.__getitem__, stored))
+            elif position in TIME_COLUMNS:
+                keys = list(stored)
+            else:
+                keys = ["" if value is None else value.casefold() for value in stored]
+            live = compress(range(self._size), chain.from_iterable(self._alive))
+            order = self._orders[position] = sorted(live, key=keys.__getitem__)
+        return order
+
+    def chunks(self):
+        for number, alive in enumerate(self._alive):
+            columns = [self._decode(position, column[number]) for position, column in enumerate(self._chunks)]
+            rows = list(compress(zip(*columns), alive))
+            if rows:
+                yield rows
+
+    def to_dataframe(self):
+        if self._frame is None:
+            alive = list(chain.from_iterable(self._alive))
+            data = {name: self._decode(position, compress(chain.from_iterable(column), alive))
+                    for position, (name, column) in enumerate(zip(self.columns, self._chunks))}
+            self._frame = pd.DataFrame(data, columns=self.columns)
+        return self._frame
+
+
+#data manager class
+class Data_Manager:
+    #This initialises the dataframe
+    def __init__(self, df, input_function=input):
+        self.dataframe = df
+        self.input_function = input_function
+
+    #the dataframe is only built from the store when something (like System.fileClose) asks for it
+    @property
+    def dataframe(self):
+        with Metrics.timer("manager.to_dataframe"):
+            return self.store.to_dataframe()
+
+    @dataframe.setter
+    def dataframe(self, df):
+        with Metrics.timer("manager.from_dataframe"):
+            self.store = Vault_Store.from_dataframe(df)
+        self._index = None
+        self._view = None
+        self.version = 0
+        self.saved_version = 0
+
+    #every change bumps the version, whoever writes the vault marks the version it wrote as saved
+    @property
+    def dirty(self):
+        return self.version != self.saved_version
+
+    def mark_saved(self, version):
+        # changes made while the save was running keep the manager dirty
+        self.saved_version = max(self.saved_version, version)
+
+    #the search index is only built when something searches, then kept up to date by add and remove
+    @property
+    def index(self):
+        if self._index is None:
+            with Metrics.timer("manager.index_build"):
+                self._index = Username_Index(self.store.keys())
+        return self._index
+
+    #this adds a user with a password to the dataframe
+    def add(self, username, passwd, site="", url="", notes="", tags=()):
+        # adds a user with their password, replacing the entry the username already has for the site (which keeps its
+        # creation time), returns the stored row for the journal
+        with Metrics.timer("manager.add"):
+            slots = self.store.find(username, site)
+            row = entry(username, passwd, site, url, notes, tags,
+                        created=(self.store.row(slots[0])[CREATED] or None) if slots else None)
+            if slots:
+                self.store.delete(username, site)
+            self.store.append(row)
+            self.version += 1
+            if self._index is not None:
+                self._index.add(username)
+            return row
+    #adds a whole dataframe of users at once, e.g. from an import
+    def add_many(self, df, replace=False):
+        # duplicates within df keep the last one, (site, username) entries already in the vault are skipped or replaced
+        with Metrics.timer("manager.add_many"):
+            return self._add_many(df, replace)
+
+    def _add_many(self, df, replace):
+        df = df.reindex(columns=RECORD_COLUMNS, fill_value="").fillna("")
+        now = str(int(time.time()))
+        for column in TIME_COLUMNS:
+            df[RECORD_COLUMNS[column]] = df[RECORD_COLUMNS[column]].replace("", now)
+        df = df.drop_duplicates(["Site", "Username"], keep="last")
+        usernames, sites = df["Username"].tolist(), df["Site"].tolist()
+        existing = self.store.contains(usernames, sites)
+        if replace:
+            for position in np.flatnonzero(existing).tolist():
+                self.store.delete(usernames[position], sites[position])
+        else:
+            df = df[~existing]
+        self.store.extend([df[column].tolist() for column in self.store.columns])
+        if len(df.index):
+            self.version += 1
+        if self._index is not None:
+            if len(df.index) > INDEX_REBUILD:
+                self._index = None
+            else:
+                for username in df["Username"]:
+                    self._index.add(username)
+        return len(df.index)
+    #removes the user with their password
+    def remove(self, username, site=None):  # input a pandas dataframe
+        # removes a user with their password, for one site or (site=None) every site
+        with Metrics.timer("manager.remove"):
+            if not self.store.delete(username, site):
+                raise KeyError(username if site is None else (site, username))
+            self.version += 1
+            if self._index is not None and username not in self.store.keys():
+                self._index.remove(username)
+
+    def pwrandom(self):
+        # generates a random password based on the length the user specifies
+        length = int(self.input_function("What would you like the length of your password to be? "))
+
+        # drawn from os.urandom over lowercase + uppercase + numbers + symbols, see Generator
+        random_password = Generator.generate(1, Generator.Policy(length=length))[0]
+
+        return random_password
+    #searches usernames by prefix, then fuzzily, returns one page of (usernames, total matches)
+    def search(self, query, offset=0, limit=PAGE_SIZE):
+        index = self.index
+        with Metrics.timer("manager.search"):
+            return index.search(query, offset, limit)
+    #retrieves the data for a certain username
+    def retrieve(self, username):
+        return pd.DataFrame(self.store.lookup(username), columns=self.store.columns)
+    #checks every password for reuse, weakness, the old pwrandom and breaches, see Audit.audit
+    def audit(self, report, breaches=None, processes=None):
+        with Metrics.timer("manager.audit"):
+            return Audit.audit(self.store.chunks(), report, breaches, processes=processes)
+    #filters entries by site, tag and username through the store's indexes, returns one page of (entries, total matches)
+    def query(self, site=None, tag=None, username=None, offset=0, limit=PAGE_SIZE):
+        with Metrics.timer("manager.query"):
+            slots = self.store.select(site, tag, username)
+            rows = [self.store.row(slot) for slot in slots[offset:offset + limit]]
+            return pd.DataFrame(rows, columns=self.store.columns), len(slots)
+    #one page of the entries a list view shows, filtered by search and sorted by a column, returns (row tuples, total)
+    def entries(self, query="", username=None, sort=None, descending=False, offset=0, limit=PAGE_SIZE):
+        # query searches usernames like search does and keeps its ranking unless sort (a column) is given, username
+        # narrows down to that username's entries. Scrolling only slices the slots the last call ordered.
+        with Metrics.timer("manager.entries"):
+            key = (query, username, sort, self.version)
+            if self._view is None or self._view[0] != key:
+                self._view = (key, self._ordered(query, username, sort))
+            slots = self._view[1]
+            total = len(slots)
+            if descending:
+                page = slots[max(total - offset - limit, 0):max(total - offset, 0)][::-1]
+            else:
+                page = slots[offset:offset + limit]
+            return [self.store.row(slot) for slot in page], total
+
+    def _ordered(self, query, username, sort):
+        if username is not None:
+            slots = self.store.slots(username)
+        elif not query:
+            # every entry, the store keeps the order up to date itself
+            return self.store.order(USERNAME if sort is None else sort)
+        else:
+            index = self.index
+            names, total = index.search(query, 0, len(index) + MAX_FUZZY)
+            slots = [slot for name in names for slot in self.store.slots(name)]
+        if sort is not None:
+            slots = sorted(slots, key=lambda slot: self.store.sort_key(sort, slot))
+        return slots
@@ -0,0 +1,129 @@
+import os
+import string
+
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+
+LOWERCASE = string.ascii_lowercase
+UPPERCASE = string.ascii_uppercase
+DIGITS = string.digits
+SYMBOLS = string.punctuation
+
+# Fallback word list for passphrases (256 words, 8 bits each). Pass wordlist= a bigger list, e.g. the EFF long list
+# (7776 words, ~12.9 bits each), for stronger passphrases with fewer words.
+WORDS = """
+able acid aged also area army away baby back ball band bank base bath bear beat been beer bell belt best bike bird
+blow blue boat body bomb bond bone book boot born boss both bowl bulk burn bush busy cake call calm came camp card
+care cart case cash cast cell chat chip city clay club coal coat code cold come cook cool cope copy core corn cost crew
+crop dark data date dawn dead deal dear debt deck deep deny desk dial diet dirt dish disk dock door dose down draw drop
+drum dual duck dust duty each earn east easy edge else even ever exit face fact fair fall farm fast fate fear feed feel
+file fill film find fine fire firm fish five flag flat flow folk food foot fork form fort four free frog fuel full fund
+gain game gate gear gift girl give glad goal gold golf good gray grew grid grow gulf hair half hall hand hang hard harm
+hate have head hear heat held hero hill hint hire hold hole holy home hope horn host hour huge hung hunt idea inch iron
+item jazz join joke jump jury just keen keep kept kick kind king kiss knee knew know lack lady lake lamp land lane last
+late lawn lead leaf lean left lend less life lift like line link lion list live load loan lock long look loop lord lose
+loud love luck lung made mail main make male mall many mark mass meal mean meat meet menu
+""".split()
+
+
+class Policy:
+    """
+    Describes what generated passwords may contain.
+    ====================================================================================================================
+    :__init__: :param length: int - characters per password
+               :param lowercase, uppercase, digits, symbols: bool - which character classes to draw from
+               :param min_lowercase, min_uppercase, min_digits, min_symbols: int - least characters of each class
+               :param exclude: string - characters never to use (e.g. look-alikes like "O0l1")
+    alphabet: Returns the characters passwords are drawn from
+              :param: None
+              :return: string
+    ====================================================================================================================
+    """
+
+    def __init__(self, length=16, lowercase=True, uppercase=True, digits=True, symbols=True, min_lowercase=0,
+                 min_uppercase=0, min_digits=0, min_symbols=0, exclude=""):
+        self.length = length
+        self.classes = [(LOWERCASE, lowercase, min_lowercase), (UPPERCASE, uppercase, min_uppercase),
+                        (DIGITS, digits, min_digits), (SYMBOLS, symbols, min_symbols)]
+        self.exclude = set(exclude)
+        if length < 0:
+            raise ValueError("Policy length can't be negative")
+        if not self.alphabet():
+            raise ValueError("Policy leaves no characters to choose from")
+        if sum(minimum for _, _, minimum in self.classes) > length:
+            raise ValueError("Policy minimums add up to more than the password length")
+        for characters, enabled, minimum in self.classes:
+            if minimum and not (enabled and set(characters) - self.exclude):
+                raise ValueError("Policy requires a character class it doesn't allow")
+
+    def alphabet(self):
+        return "".join(char for characters, enabled, _ in self.classes if enabled
+                       for char in characters if char not in self.exclude)
+
+
+def _uniform(count, bound):
+    """
+    Returns `count` uniform random integers in [0, bound) from os.urandom. Samples at or above the largest multiple of
+    bound that fits the sample type are thrown away instead of being folded back with %, which would bias the low
+    values.
+    """
+    dtype = np.uint8 if bound <= 1 << 8 else np.uint16 if bound <= 1 << 16 else np.uint32
+    span = 1 << (8 * np.dtype(dtype).itemsize)
+    limit = span - span % bound
+    accepted = [np.empty(0, dtype=dtype)]
+    needed = count
+    while needed > 0:
+        # ask for enough extra samples that one round is nearly always enough
+        draw = int(needed * span / limit) + 64
+        samples = np.frombuffer(os.urandom(draw * np.dtype(dtype).itemsize), dtype=dtype)
+        samples = samples[samples < limit][:needed]
+        accepted.append(samples)
+        needed -= len(samples)
+    return np.concatenate(accepted).astype(np.int64) % bound
+
+
+def generate(count=1, policy=None):
+    """
+    Generates `count` passwords in one go.
+    :param count: int - number of passwords
+    :param policy: Policy - defaults to 16 characters from all four classes
+    :return: list of strings
+    """
+    policy = policy or Policy()
+    if count * policy.length == 0:
+        # nothing to draw, a length 0 policy makes empty passwords
+        return [""] * count
+    alphabet = policy.alphabet()
+    codes = np.frombuffer(alphabet.encode("ascii"), dtype=np.uint8)
+    # class of every alphabet position, to count the characters of each class per password
+    classes = np.array([next(number for number, (characters, _, _) in enumerate(policy.classes) if char in characters)
+                        for char in alphabet])
+    minimums = [(number, minimum) for number, (_, _, minimum) in enumerate(policy.classes) if minimum]
+
+    rows = np.empty((0, policy.length), dtype=np.int64)
+    while len(rows) < count:
+        # whole rows that miss a minimum are redrawn, so the accepted ones stay uniform over the allowed passwords
+        missing = count - len(rows)
+        batch = _uniform(missing * policy.length, len(alphabet)).reshape(missing, policy.length)
+        keep = np.ones(missing, dtype=bool)
+        for number, minimum in minimums:
+            keep &= (classes[batch] == number).sum(axis=1) >= minimum
+        rows = np.concatenate([rows, batch[keep]])
+    text = codes[rows].tobytes().decode("ascii")
+    return [text[start:start + policy.length] for start in range(0, count * policy.length, policy.length)]
+
+
+def passphrases(count=1, words=8, separator="-", wordlist=None):
+    """
+    Generates `count` passphrases of `words` words each.
+    :param wordlist: list of strings or path of a file with one word per line (the number and tab prefix of the EFF
+                     dice lists is ignored), defaults to WORDS
+    :return: list of strings
+    """
+    if isinstance(wordlist, str):
+        with open(wordlist, encoding="utf-8") as wordFile:
+            wordlist = [line.split()[-1] for line in wordFile if line.strip()]
+    wordlist = np.array(wordlist or WORDS, dtype=object)
+    picks = wordlist[_uniform(count * words, len(wordlist)).reshape(count, words)]
+    return [separator.join(row) for row in picks]
@@ -0,0 +1,284 @@
+import json
+import os
+import shutil
+import time
+import zlib
+from collections import Counter
+from itertools import chain, compress, islice
+
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Every vault snapshot System writes becomes a version in a directory next to the vault, one file per version:
+#   <version, 8 digits>-<unix time in ns>.key    keyframe, every row of the version
+#   <version, 8 digits>-<unix time in ns>.delta  rows removed and added since the version before it
+# each one Fernet tokens (vault key) of zlib compressed JSON, one per line. A keyframe holds {"width": fields per row,
+# "rows": every field of up to KEYFRAME_CHUNK rows in one flat list} per token, a delta one token with "removedAt", the
+# positions of the removed rows in the version before it, and "added", the new rows as a flat list (deltas written
+# before positions were used have the removed rows themselves under "removed"). A version's rows are in a fixed order:
+# a keyframe's as written, a delta's the rows kept from the version before it followed by the added ones. Restoring a
+# version decrypts the keyframe at or before it and applies the deltas in between, at most interval - 1 of them. The
+# names alone give the timeline, so listing versions and picking one by time never decrypts anything.
+HISTORY_SUFFIX = ".history"
+# versions per keyframe, bounds how many deltas a restore applies
+KEYFRAME_INTERVAL = 100
+# versions kept by default
+HISTORY_KEEP = 1000
+# rows per token of a keyframe, only this many are serialized at a time
+KEYFRAME_CHUNK = 50000
+
+
+class Version:
+    """
+    One version in the history directory.
+    ====================================================================================================================
+    :__init__: :param name: string - file name, see the layout above
+    ====================================================================================================================
+    """
+
+    def __init__(self, name):
+        stem, kind = name.split(".")
+        number, stamp = stem.split("-")
+        self.name = name
+        self.number = int(number)
+        self.time = int(stamp) / 1e9
+        self.keyframe = kind == "key"
+
+
+class History:
+    """
+    Encrypted, delta compressed history of a vault's snapshots, with keyframes every `interval` versions so any version
+    is restored from one keyframe and a few small deltas. Old versions are dropped a keyframe group at a time once
+    every version in the group is past the retention policy, so the oldest kept version never needs rewriting.
+    Deltas are found by hashing: between records only a hash per row of the newest version is kept (8 bytes a row, no
+    plaintext), the rows themselves are only read while recording and never all held at once.
+    Callers hold the vault's exclusive lock while recording or pruning.
+    ====================================================================================================================
+    :__init__: :param directory: string - history directory, created on the first record
+               :param keep: int - newest versions always kept (a few more are until their keyframe group expires)
+               :param days: float - versions newer than this are kept too, None keeps only by count
+               :param interval: int - versions per keyframe
+    versions: Returns the recorded versions, oldest first
+              :param: None
+              :return: list of Version
+    at: Returns the newest version recorded at or before a point in time
+        :param when: float - unix time
+        :return: Version, None if nothing was recorded by then
+    record: Records a snapshot as a new version, a delta against the newest version unless a keyframe is due or the
+            delta wouldn't be much smaller. Nothing is recorded if the rows didn't change.
+            :param key: Fernet - vault cipher
+            :param rows: function - returns a new iterator over the row tuples each call, called twice
+            :return: Version, None if nothing changed
+    load: Rebuilds the rows of a version
+          :param key: Fernet - vault cipher
+          :param number: int - version number, the newest if None
+          :return: list of row tuples
+    prune: Drops the keyframe groups whose versions are all past the retention policy, record calls it
+           :param: None
+           :return: int - number of versions dropped
+    remove: Deletes the whole history
+            :param: None
+            :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, directory, keep=HISTORY_KEEP, days=None, interval=KEYFRAME_INTERVAL):
+        self.directory = directory
+        self.keep = keep
+        self.days = days
+        self.interval = interval
+        # hash of every row of the newest version in its order, so the next delta doesn't have to load it again
+        self.hashes = None
+        self.hashesNumber = None
+
+    def versions(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((Version(name) for name in names if name.endswith((".key", ".delta"))),
+                      key=lambda version: version.number)
+
+    def at(self, when):
+        found = None
+        for version in self.versions():
+            if version.time <= when:
+                found = version
+        return found
+
+    def record(self, key, rows):
+        versions = self.versions()
+        # hash() is only compared within this process, between the rows given and the newest version's
+        hashes = np.fromiter(map(hash, rows()), dtype=np.int64)
+        if versions:
+            latest = versions[-1]
+            base = self._base(key, versions, latest)
+            kept = np.isin(_copies(base), _copies(hashes))
+            added = ~np.isin(_copies(hashes), _copies(base))
+            changes = len(base) - int(kept.sum()) + int(added.sum())
+            if not changes and len(base) == len(hashes):
+                return None
+            since = next((distance for distance, version in enumerate(reversed(versions)) if version.keyframe),
+                         len(versions))
+            keyframe = since + 1 >= self.interval or changes >= len(hashes) // 2
+            number = latest.number + 1
+        else:
+            keyframe = True
+            number = 1
+        name = f"{number:08d}-{time.time_ns()}.{'key' if keyframe else 'delta'}"
+        if keyframe:
+            self._write(name, (self._token(key, {"width": len(chunk[0]), "rows": _flat(chunk)})
+                               for chunk in _chunks(rows(), KEYFRAME_CHUNK)))
+            self.hashes = hashes
+        else:
+            addedRows = list(compress(rows(), added.tolist()))
+            payload = {"width": len(addedRows[0]) if addedRows else 0,
+                       "removedAt": np.flatnonzero(~kept).tolist(), "added": _flat(addedRows)}
+            self._write(name, [self._token(key, payload)])
+            self.hashes = np.concatenate([base[kept], hashes[added]])
+        self.hashesNumber = number
+        self.prune()
+        return Version(name)
+
+    def _token(self, key, payload):
+        # zlib's fastest level, a keyframe of a big vault compresses about as well and several times faster
+        return key.encrypt(zlib.compress(json.dumps(payload).encode(), 1))
+
+    def _base(self, key, versions, latest):
+        # another process may have recorded versions since this one last did, or this one never did
+        if self.hashesNumber != latest.number:
+            self.hashes = self._hashes(key, versions, latest.number)
+            self.hashesNumber = latest.number
+        return self.hashes
+
+    def load(self, key, number=None):
+        versions = self.versions()
+        if not versions:
+            raise KeyError("the vault has no history yet")
+        return self._rows(key, versions, versions[-1].number if number is None else number)
+
+    def _rows(self, key, versions, number):
+        keyframe, deltas = self._span(versions, number)
+        rows = []
+        for chunk in self._read(key, keyframe):
+            rows.extend(_rows(chunk["rows"], chunk["width"]))
+        for version in deltas:
+            delta = next(self._read(key, version))
+            if "removedAt" in delta:
+                kept = np.ones(len(rows), dtype=bool)
+                kept[delta["removedAt"]] = False
+                rows = list(compress(rows, kept.tolist()))
+            else:
+                removed = Counter(_rows(delta["removed"], delta["width"]))
+                rows = [row for row in rows if not _take(removed, row)]
+            rows.extend(_rows(delta["added"], delta["width"]))
+        return rows
+
+    def _hashes(self, key, versions, number):
+        # the same steps as _rows on the rows' hashes, only a chunk of rows is decrypted at a time
+        keyframe, deltas = self._span(versions, number)
+        hashes = np.concatenate([np.zeros(0, dtype=np.int64)]
+                                + [_hashed(chunk["rows"], chunk["width"]) for chunk in self._read(key, keyframe)])
+        for version in deltas:
+            delta = next(self._read(key, version))
+            if "removedAt" in delta:
+                kept = np.ones(len(hashes), dtype=bool)
+                kept[delta["removedAt"]] = False
+            else:
+                kept = ~np.isin(_copies(hashes), _copies(_hashed(delta["removed"], delta["width"])))
+            hashes = np.concatenate([hashes[kept], _hashed(delta["added"], delta["width"])])
+        return hashes
+
+    def _span(self, versions, number):
+        # the keyframe a version is rebuilt from and the deltas after it, up to the version
+        position = next((position for position, version in enumerate(versions) if version.number == number), None)
+        if position is None:
+            raise KeyError(f"no version {number} in the history")
+        start = position
+        while not versions[start].keyframe:
+            start -= 1
+        return versions[start], versions[start + 1:position + 1]
+
+    def _read(self, key, version):
+        # one payload per token, a keyframe's chunks are decrypted one at a time
+        with open(os.path.join(self.directory, version.name), 'rb') as versionFile:
+            for token in versionFile:
+                if token.strip():
+                    yield json.loads(zlib.decompress(key.decrypt(token.strip())))
+
+    def _write(self, name, tokens):
+        # written next to its final name and renamed, a crash never leaves half a version
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        temp = os.path.join(self.directory, name + ".tmp")
+        with open(temp, 'wb') as versionFile:
+            for token in tokens:
+                versionFile.write(token + b"\n")
+            versionFile.flush()
+            os.fsync(versionFile.fileno())
+        os.replace(temp, os.path.join(self.directory, name))
+
+    def prune(self):
+        versions = self.versions()
+        cutoff = None if self.days is None else time.time() - self.days * 86400
+        groups = []
+        for version in versions:
+            if version.keyframe or not groups:
+                groups.append([])
+            groups[-1].append(version)
+        dropped = 0
+        for group in groups[:-1]:
+            # newest first, a version is kept while it's one of the newest `keep` or younger than the cutoff
+            age = len(versions) - dropped - len(group)
+            if age < self.keep or (cutoff is not None and group[-1].time >= cutoff):
+                break
+            for version in group:
+                os.remove(os.path.join(self.directory, version.name))
+            dropped += len(group)
+        return dropped
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.hashes = None
+        self.hashesNumber = None
+
+
+def _flat(rows):
+    return list(chain.from_iterable(rows))
+
+
+def _rows(flat, width):
+    # tuples of width fields back out of a flat list
+    return zip(*[iter(flat)] * width) if width else iter(())
+
+
+def _hashed(flat, width):
+    return np.fromiter(map(hash, _rows(flat, width)), dtype=np.int64)
+
+
+def _chunks(rows, size):
+    # lists of up to size rows
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _copies(hashes):
+    # a row in twice is told apart by which copy it is, its hash mixed with the copy's number among the same hashes
+    order = np.argsort(hashes, kind="stable")
+    ordered = hashes[order]
+    first = np.r_[True, ordered[1:] != ordered[:-1]] if len(ordered) else np.zeros(0, dtype=bool)
+    positions = np.arange(len(ordered))
+    copy = np.empty_like(hashes)
+    copy[order] = positions - np.maximum.accumulate(np.where(first, positions, 0))
+    return hashes + copy * np.int64(-7046029254386353131)
+
+
+def _take(counts, row):
+    # whether row is one of the rows left in counts, taking it out if so
+    if counts[row] > 0:
+        counts[row] -= 1
+        return True
+    return False
@@ -0,0 +1,166 @@
+import json
+import os
+import struct
+import threading
+
+# Journal layout: a sequence of records, each one
+#   8 byte sequence number | 4 byte token length | Fernet token of [sequence, op, username, password, *fields]
+# where the fields after username are the rest of the entry (see Dataframe.RECORD_COLUMNS). Records written before
+# entries had metadata stop at the password, removals of every entry for a username stop at the username.
+# The sequence number is duplicated outside the token so the journal can be scanned without the key, the copy inside
+# the token is the one that's trusted. A torn record at the end (crash mid-append) is dropped on the next open.
+RECORD_HEADER = struct.Struct(">QI")
+
+
+class Journal:
+    """
+    Append-only log of vault changes kept next to the snapshot, so a single add or remove costs one small encrypted
+    write instead of re-encrypting the whole vault.
+    ====================================================================================================================
+    :__init__: Opens (or prepares to create) a journal file and finds the last complete record
+               :param name: string - journal file name
+               :param floor: int - sequence number already folded into the snapshot, new records are numbered after it
+               :return: None
+    append: Encrypts and appends one change, fsyncs it and returns its sequence number
+            :param key: Fernet - cipher for the record
+            :param op: string - "add" or "remove"
+            :param username: string
+            :param password: string - None for removals
+            :param fields: strings - rest of the entry, the site of a removal that only removes one site's entry
+            :return: int - sequence number of the record
+    extend: Appends several changes with a single write and fsync
+            :param key: Fernet - cipher for the records
+            :param changes: list of (op, username, password, *fields) tuples
+            :return: int - sequence number of the last record
+    records: Yields the decrypted changes after a sequence number
+             :param key: Fernet - cipher for the records
+             :param after: int - records with a sequence number <= this are skipped
+             :return: generator of (sequence, op, row) - row is the list [username, password, *fields]
+    refresh: Rescans the journal if the file changed since this object last read or wrote it (another process
+             appended to it or compacted it), call it with the vault locked
+             :param floor: int - sequence number already folded into the snapshot
+             :return: None
+    discard: Drops every record up to and including a sequence number (they've been folded into a snapshot)
+             :param through: int - last sequence number to drop
+             :return: None
+    size: Returns the size of the journal in bytes
+          :param: None
+          :return: int
+    remove: Deletes the journal file
+            :param: None
+            :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, name, floor=0):
+        self.name = name
+        self.lock = threading.Lock()
+        self.lastSeq = 0
+        self.end = 0
+        self.stamp = None
+        if os.path.exists(name):
+            self._scan()
+        self.lastSeq = max(self.lastSeq, floor)
+
+    def _scan(self):
+        # walks the record headers to find the last sequence number and where the last complete record ends, the
+        # tokens themselves are skipped
+        with open(self.name, 'rb') as journal:
+            total = os.fstat(journal.fileno()).st_size
+            while True:
+                header = journal.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                seq, length = RECORD_HEADER.unpack(header)
+                if journal.tell() + length > total:
+                    break
+                journal.seek(length, os.SEEK_CUR)
+                self.lastSeq = seq
+                self.end = journal.tell()
+        self.stamp = self._stat()
+
+    def _stat(self):
+        # identifies the journal's current contents: a compaction renames a new file in, an append grows it
+        try:
+            info = os.stat(self.name)
+        except FileNotFoundError:
+            return None
+        return info.st_ino, info.st_size, info.st_mtime_ns
+
+    def refresh(self, floor=0):
+        with self.lock:
+            stamp = self._stat()
+            if stamp != self.stamp:
+                self.lastSeq = 0
+                self.end = 0
+                self.stamp = None
+                if stamp is not None:
+                    self._scan()
+            self.lastSeq = max(self.lastSeq, floor)
+
+    def size(self):
+        return self.end
+
+    def append(self, key, op, username, password=None, *fields):
+        return self.extend(key, [(op, username, password) + fields])
+
+    def extend(self, key, changes):
+        with self.lock:
+            seq = self.lastSeq
+            records = bytearray()
+            for op, *row in changes:
+                seq += 1
+                token = key.encrypt(json.dumps([seq, op, *row]).encode())
+                records += RECORD_HEADER.pack(seq, len(token)) + token
+            with open(self.name, 'r+b' if os.path.exists(self.name) else 'wb') as journal:
+                # anything past self.end is a torn record from a crash, overwrite it
+                journal.seek(self.end)
+                journal.write(records)
+                journal.truncate()
+                journal.flush()
+                os.fsync(journal.fileno())
+                self.end = journal.tell()
+            self.lastSeq = seq
+            self.stamp = self._stat()
+            return seq
+
+    def records(self, key, after=0):
+        if not os.path.exists(self.name):
+            return
+        with open(self.name, 'rb') as journal:
+            while journal.tell() < self.end:
+                seq, length = RECORD_HEADER.unpack(journal.read(RECORD_HEADER.size))
+                token = journal.read(length)
+                if seq <= after:
+                    continue
+                seq, op, *row = json.loads(key.decrypt(token))
+                yield seq, op, row
+
+    def discard(self, through):
+        with self.lock:
+            kept = bytearray()
+            if os.path.exists(self.name):
+                with open(self.name, 'rb') as journal:
+                    while journal.tell() < self.end:
+                        header = journal.read(RECORD_HEADER.size)
+                        seq, length = RECORD_HEADER.unpack(header)
+                        token = journal.read(length)
+                        if seq > through:
+                            kept += header + token
+            # the shortened journal replaces the old one in a single rename, so a crash leaves one or the other
+            temp = self.name + ".tmp"
+            with open(temp, 'wb') as journal:
+                journal.write(kept)
+                journal.flush()
+                os.fsync(journal.fileno())
+            os.replace(temp, self.name)
+            self.end = len(kept)
+            self.stamp = self._stat()
+
+    def remove(self):
+        with self.lock:
+            if os.path.exists(self.name):
+                os.remove(self.name)
+            self.lastSeq = 0
+            self.end = 0
+            self.stamp = None
@@ -0,0 +1,169 @@
+import argparse
+import base64
+import hmac
+import os
+import time
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+# mpass.txt holds one header line: $<kdf>$<cost parameters>$<base64 salt>$<base64 hash>, e.g.
+#   $scrypt$n=65536,r=8,p=1$...$...
+#   $pbkdf2-sha256$i=1000000$...$...
+# Anything that doesn't start with "$" is the legacy str() of an unsalted SHA256 digest.
+SALT_SIZE = 16
+HASH_SIZE = 32
+TARGET_SECONDS = 0.25
+
+
+class Scrypt_KDF:
+    """
+    scrypt with cost n (a power of two), block size r and parallelism p. Memory cost is 128 * n * r bytes.
+    ====================================================================================================================
+    :__init__: :param n: int - CPU/memory cost
+               :param r: int - block size
+               :param p: int - parallelism
+    derive: Derives HASH_SIZE bytes from a password
+            :param password: string
+            :param salt: bytes
+            :return: bytes
+    params: Returns the cost parameters as they're written in the header
+            :param: None
+            :return: string
+    memory: Returns the memory one derivation needs, in bytes
+            :param: None
+            :return: int
+    stronger: Returns the next setting up, used by calibrate
+              :param: None
+              :return: Scrypt_KDF - same settings with n doubled
+    ====================================================================================================================
+    """
+    name = "scrypt"
+
+    def __init__(self, n=1 << 16, r=8, p=1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def derive(self, password, salt):
+        return Scrypt(salt=salt, length=HASH_SIZE, n=self.n, r=self.r, p=self.p).derive(password.encode())
+
+    def params(self):
+        return f"n={self.n},r={self.r},p={self.p}"
+
+    def memory(self):
+        return 128 * self.n * self.r * self.p
+
+    def stronger(self):
+        return Scrypt_KDF(self.n * 2, self.r, self.p)
+
+
+class PBKDF2_KDF:
+    """
+    PBKDF2-HMAC-SHA256 with a number of iterations. Needs next to no memory, use it where scrypt's memory cost isn't
+    affordable.
+    ====================================================================================================================
+    :__init__: :param i: int - iterations
+    derive, params, memory: as in Scrypt_KDF
+    stronger: Returns the same KDF with the iterations doubled
+    ====================================================================================================================
+    """
+    name = "pbkdf2-sha256"
+
+    def __init__(self, i=600000):
+        self.i = i
+
+    def derive(self, password, salt):
+        return PBKDF2HMAC(algorithm=hashes.SHA256(), length=HASH_SIZE, salt=salt, iterations=self.i).derive(
+            password.encode())
+
+    def params(self):
+        return f"i={self.i}"
+
+    def memory(self):
+        return 0
+
+    def stronger(self):
+        return PBKDF2_KDF(self.i * 2)
+
+
+KDFS = {Scrypt_KDF.name: Scrypt_KDF, PBKDF2_KDF.name: PBKDF2_KDF}
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def timed(kdf, password="calibration"):
+    # returns the seconds one derivation with kdf takes on this machine
+    start = time.perf_counter()
+    kdf.derive(password, os.urandom(SALT_SIZE))
+    return time.perf_counter() - start
+
+
+def calibrate(name="scrypt", target=TARGET_SECONDS):
+    """
+    Returns the cheapest KDF of the given kind that takes at least `target` seconds to derive on this machine.
+    scrypt doubles n, PBKDF2 scales the iterations from a timed run.
+    """
+    if name == PBKDF2_KDF.name:
+        probe = PBKDF2_KDF(100000)
+        return PBKDF2_KDF(max(100000, int(probe.i * target / timed(probe))))
+    kdf = Scrypt_KDF(1 << 12)
+    while timed(kdf) < target:
+        kdf = kdf.stronger()
+    return kdf
+
+
+def hash_password(password, kdf=None):
+    # returns the mpass.txt header for a password, calibrating a scrypt KDF if none is given
+    kdf = kdf or calibrate()
+    salt = os.urandom(SALT_SIZE)
+    return f"${kdf.name}${kdf.params()}${_b64(salt)}${_b64(kdf.derive(password, salt))}"
+
+
+def parse(header):
+    # returns (kdf, salt, hash) from an mpass.txt header, raises ValueError for anything else
+    _, name, params, salt, digest = header.strip().split("$")
+    values = {key: int(value) for key, value in (param.split("=") for param in params.split(","))}
+    return KDFS[name](**values), base64.b64decode(salt), base64.b64decode(digest)
+
+
+def is_legacy(header):
+    return not header.startswith("$")
+
+
+def verify(header, password, legacyHash=None):
+    """
+    Checks a password against an mpass.txt header in constant time.
+    :param legacyHash: function - str -> the legacy digest repr, used for headers written before the KDF existed
+    :return: bool
+    """
+    if is_legacy(header):
+        return legacyHash is not None and hmac.compare_digest(header.encode(), str(legacyHash(password)).encode())
+    kdf, salt, digest = parse(header)
+    return hmac.compare_digest(kdf.derive(password, salt), digest)
+
+
+def benchmark(target=TARGET_SECONDS):
+    # prints unlock latency and memory cost for a range of settings around the calibrated ones
+    print(f"{'kdf':>14} {'params':>22} {'unlock ms':>10} {'memory MB':>10}")
+    settings = [Scrypt_KDF(1 << n) for n in range(14, 19)] + [PBKDF2_KDF(i) for i in (300000, 600000, 1200000)]
+    settings += [calibrate("scrypt", target), calibrate(PBKDF2_KDF.name, target)]
+    for number, kdf in enumerate(settings):
+        label = kdf.params() + (" (calibrated)" if number >= len(settings) - 2 else "")
+        print(f"{kdf.name:>14} {label:>22} {timed(kdf) * 1000:>10.0f} {kdf.memory() / (1 << 20):>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Master password key derivation")
+    parser.add_argument("--benchmark", action="store_true", help="report unlock latency and memory of KDF settings")
+    parser.add_argument("--target", type=float, default=TARGET_SECONDS, help="target unlock latency in seconds")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.target)
+    else:
+        for name in KDFS:
+            kdf = calibrate(name, args.target)
+            print(f"{name}: {kdf.params()} ({timed(kdf) * 1000:.0f} ms)")
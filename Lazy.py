@@ -0,0 +1,20 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Returns a module that is only really imported the first time one of its attributes is used, so code paths that
+    never touch a heavy dependency (pandas, numpy) don't pay for importing it.
+    :param name: string - module name
+    :return: module
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,189 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Timings and counts of what the vault spends its time on. Timers and counters are always on, they cost a
+# perf_counter call and a dict update. Two environment variables extend them for one GUI or CLI session:
+#   SYS230_METRICS=path  writes the metrics when the process exits, as Prometheus text if path ends in .prom and as
+#                        JSON otherwise
+#   SYS230_PROFILE=path  records a latency histogram per operation and runs cProfile on the main thread and on the
+#                        vault's worker threads, the merged pstats file is written to path on exit
+#                        (python -m pstats path to read it)
+METRICS_ENV = "SYS230_METRICS"
+PROFILE_ENV = "SYS230_PROFILE"
+# upper bounds of the histogram buckets in seconds, the last bucket is unbounded
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    """
+    Registry of timers and counters, safe to update from several threads. The module keeps one for the process,
+    `metrics`, and the functions below forward to it.
+    ====================================================================================================================
+    :__init__: :param histograms: boolean - whether timers also count their observations into BUCKETS
+    timer: Context manager timing the block it wraps under an operation name
+           :param name: string - operation, e.g. "system.decrypt"
+           :return: context manager
+    observe: Records one timing
+             :param name: string - operation
+             :param seconds: float
+             :return: None
+    count: Adds to a counter
+           :param name: string - event, e.g. "system.entries_loaded"
+           :param amount: int
+           :return: None
+    snapshot: Returns a copy of everything recorded
+              :param: None
+              :return: dict - {"timers": {name: {"count", "seconds", "max", "buckets"}}, "counters": {name: int}},
+                       "buckets" only when histograms are on, counts per bucket of BUCKETS plus the unbounded one
+    reset: Forgets everything recorded
+           :param: None
+           :return: None
+    to_json: Returns the snapshot as JSON
+             :param: None
+             :return: string
+    to_prometheus: Returns the snapshot in the Prometheus text exposition format
+                   :param: None
+                   :return: string
+    ====================================================================================================================
+    """
+
+    def __init__(self, histograms=False):
+        self.histograms = histograms
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = {"count": 0, "seconds": 0.0, "max": 0.0,
+                                             "buckets": [0] * (len(BUCKETS) + 1)}
+            timer["count"] += 1
+            timer["seconds"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+            if self.histograms:
+                timer["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            timers = {}
+            for name, timer in self.timers.items():
+                timers[name] = dict(timer, buckets=list(timer["buckets"]))
+                if not self.histograms:
+                    del timers[name]["buckets"]
+            return {"timers": timers, "counters": dict(self.counters)}
+
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        return prometheus(self.snapshot())
+
+
+metrics = Metrics()
+_profilers = []
+
+
+def prometheus(snapshot):
+    # Prometheus text exposition format of a snapshot, ours or one fetched from a daemon
+    timers = sorted(snapshot["timers"].items())
+    histograms = any("buckets" in timer for _, timer in timers)
+    lines = ["# HELP sys230_operation_seconds Time spent in vault operations.",
+             "# TYPE sys230_operation_seconds " + ("histogram" if histograms else "summary")]
+    for name, timer in timers:
+        label = f'operation="{name}"'
+        if "buckets" in timer:
+            total = 0
+            for bound, observed in zip(BUCKETS + ("+Inf",), timer["buckets"]):
+                total += observed
+                lines.append(f'sys230_operation_seconds_bucket{{{label},le="{bound}"}} {total}')
+        lines.append(f"sys230_operation_seconds_sum{{{label}}} {timer['seconds']!r}")
+        lines.append(f"sys230_operation_seconds_count{{{label}}} {timer['count']}")
+    lines += ["# HELP sys230_operation_seconds_max Longest single vault operation.",
+              "# TYPE sys230_operation_seconds_max gauge"]
+    lines += [f'sys230_operation_seconds_max{{operation="{name}"}} {timer["max"]!r}' for name, timer in timers]
+    lines += ["# HELP sys230_events_total Vault events.", "# TYPE sys230_events_total counter"]
+    lines += [f'sys230_events_total{{event="{name}"}} {value}' for name, value in sorted(snapshot["counters"].items())]
+    return "\n".join(lines) + "\n"
+
+
+def timer(name):
+    return metrics.timer(name)
+
+
+def observe(name, seconds):
+    metrics.observe(name, seconds)
+
+
+def count(name, amount=1):
+    metrics.count(name, amount)
+
+
+def profile_thread():
+    # profiles the calling thread for the rest of the session when SYS230_PROFILE is set, pass it as the initializer of
+    # the executors the vault work runs on
+    if os.environ.get(PROFILE_ENV):
+        import cProfile
+        profiler = cProfile.Profile()
+        with metrics.lock:
+            _profilers.append(profiler)
+        profiler.enable()
+
+
+def start_session():
+    # called once by the GUI and CLI entry points, sets up what the environment variables ask for
+    if os.environ.get(PROFILE_ENV):
+        metrics.histograms = True
+        profile_thread()
+        # absolute, so it still points at the same file if something changes the working directory later
+        atexit.register(_write_profile, os.path.abspath(os.environ[PROFILE_ENV]))
+    if os.environ.get(METRICS_ENV):
+        atexit.register(write, os.path.abspath(os.environ[METRICS_ENV]))
+
+
+def write(path):
+    # Prometheus text for .prom files, JSON for anything else
+    with open(path, 'w', encoding="utf-8") as output:
+        output.write(metrics.to_prometheus() if path.endswith(".prom") else metrics.to_json())
+
+
+def _write_profile(path):
+    import pstats
+    with metrics.lock:
+        profilers = list(_profilers)
+    stats = None
+    for profiler in profilers:
+        profiler.disable()
+        try:
+            if stats is None:
+                stats = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+        except TypeError:
+            # a thread that never ran anything under its profiler has no stats to merge
+            pass
+    if stats is not None:
+        stats.dump_stats(path)
@@ -1,329 +1,850 @@
-import base64
-import time
-import tkinter
-import os
-import sys
-import random
-import pathlib
-import pandas as pd
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-
-
-class System:
-    """
-    KEY:
-        ~~internal use only~~ denotes that a function is primarily intended to be utilized within the class, not to
-                              called externally (you *can* if you really want to but it might break something, as these
-                              functions are also called within other functions and some aren't meant to be called twice)
-        -All hashes are done in SHA256
-    ====================================================================================================================
-    :__init__: Initializes class object.
-               :param name: string - optional file name
-               :param get_input: function - solicits input from UI
-               :param securityQ: boolean - indicates whether object is the security questions
-               :return: None
-    checkLegality: This is an attempt to avert an exception in the event that a file needs to be created
-                   by making sure the user's inputted file name will be accepted by the host OS (Certain
-                   characters/file names/etc are disallowed by the OS).
-                   :param name: string - file name
-                   :return: bool - indicates whether file name is legal
-                   -----------------------------------------------------------------------------------------------------
-                   calling this externally won't break anything but System handles this so it isn't really necessary
-                   ~~internal use only ~~
-    strHash: Returns a hash of the inputted string
-             :param string_word: string - string to be hashed
-             :return: string - SHA256 hash of input string
-             -----------------------------------------------------------------------------------------------------------
-             only call this if you're using it for your own class, don't pass a hash to System
-             ~~internal use only~~
-    firstTime: creates files if they are not found
-               :param: None
-               :return: None
-               ---------------------------------------------------------------------------------------------------------
-               System handles this, calling this externally will catastrophically break everything
-               ~~internal use only~~
-    fileExists: Checks to see if specified file exists
-                :param name: string - file to look for
-                :return: bool - indicates whether file was found
-                --------------------------------------------------------------------------------------------------------
-                calling this externally won't break anything but System handles this so it isn't really necessary
-                ~~internal use only~~
-    fileNameGet: Returns name of file
-                 :param: None
-                 :return: string - name of file
-    fileOpen: Opens and decrypts file.
-              :param: None
-              :return: dataframe - decrypted dataframe read from file
-    fileClose: Saves pd dataframe to file, encrypts file, closes file.
-               :param: dataframe - changed dataframe to encrypt and save
-               :return: None
-    fileCreate: Creates file in the OS.
-                  :param file: string - Name of file.
-                  :param contents: string - optional contents to be written to file.
-                  :return: None
-                --------------------------------------------------------------------------------------------------------
-                file creation is handled internally, calling this will probably overwrite something and break it
-                ~~internal use only~~
-    fileEncrypt: Encrypts file in OS. Used exclusively within fileClose
-                 :param: None
-                 :return: None
-                 -------------------------------------------------------------------------------------------------------
-                 we handled cryptography internally, using this outside of System it will break something
-                 ~~internal use only~~
-    fileDecrypt: Decrypts file in OS. Used exclusively within fileOpen
-                 :param: None
-                 :return: None
-                 -------------------------------------------------------------------------------------------------------
-                 we handled cryptography internally, using this outside of System it will break something
-                 ~~internal use only~~
-    SecQ: Handles decryption via security questions in the case of a forgotten password.
-          :param: None
-          :return: boolean - indicates whether questions were answered correctly
-          --------------------------------------------------------------------------------------------------------------
-          This function involves cryptography, so calling it will break something.
-          ~~internal use only~~
-    factoryReset: Factory reset. Deletes all files associated with the program and remakes them from scratch. Anything
-                  currently saved will be lost.
-                  :param: None
-                  :return: None
-    ====================================================================================================================
-    FILES:
-        key.key - symmetric encryption key
-        security.csv - hashed security question answers (row 1 = plaintext q's, row 2 = answer hashes)
-        password.csv - encrypted password file (row 1 = username, row 2 = password)
-        mpass.txt - hashed master password
-    ====================================================================================================================
-    """
-
-    def __init__(self, name='', get_input=input, securityQ=False):
-        self.securityQ = securityQ
-        self.fileName = name
-        self.input = get_input
-        if not self.checkLegality(name):
-            raise Exception("Error - file name invalid")
-        if not self.fileExists("mpass.txt") or not self.fileExists("key.key") or not self.fileExists(name):
-            self.firstTime()
-
-    def strHash(self, string_word):
-        generate = hashes.Hash(hashes.SHA256())
-        generate.update(string_word.encode())
-        # The Finalize method is used to perform cleanup operations on unmanaged resources held
-        # by the current object before the object is destroyed.
-        return generate.finalize()
-
-    def firstTime(self):
-        if not self.fileExists("key.key"):
-            create = open("key.key", 'x')
-            create.close()
-            create = open("key.key", 'wb')
-            # Fernet guarantees that a message encrypted using it cannot be manipulated or read without the key.
-            # Used in symmetric cryptography. Fernet key can be in bytes or string. generate_key() is in the Fernet library.
-            create.write(Fernet.generate_key())
-            create.close()
-
-        # Create master password if the mpass file doesn't exist.
-        if not self.fileExists("mpass.txt"):
-            mpass = str(self.input("What would you like your master password to be?"))
-            self.fileCreate("mpass.txt", str(self.strHash(mpass)))
-
-        # If the password.csv does not exist, then create a csv file called "password.csv"
-        if not self.fileExists("password.csv"):
-            # print("Make the password file")
-            self.fileCreate("password.csv")
-        if not self.fileExists("security.csv"):
-            qList = []
-            aList = []
-            while True:
-                q = str(self.input("Please input a security question. Input 'stop' to stop."))
-                if q == "stop":
-                    break
-                a = str(self.input("Please input an answer to said security question. (CASE SENSITIVE): "))
-                qList.append(q)
-                aList.append(a)
-
-            # Reformats information to where the pandas dataframe can accept it. Prepping the data for pandas.
-            SecurityToCsv = [[qList[a] for a in range(len(qList))], [self.strHash(aList[a]) for a in range(len(aList))]]
-            secDF = pd.DataFrame(SecurityToCsv)
-            print(secDF)
-            # Where the inputted questions and the answers are written to the security.csv file.
-            secDF.to_csv("security.csv", header=False, index=False)
-
-    def checkLegality(self, name):  # Intended for internal use only
-        illegalWin = ["\\/<>:\"\'|?*", "CON", "PRN", "AUX", "NUL", "COM1", "COM2", "COM3", "COM4", "COM5", "COM6",
-                      "COM7", "COM8", "COM9", "LPT1", "LPT2", "LPT3", "LPT4", "LPT5", "LPT6", "LPT7", "LPT8",
-                      "LPT9", ""]
-        illegalMac = ["/", ":", "NUL", ""]
-        illegalLinux = ["/", "NUL", ""]
-        if sys.platform == "win32":  # windows
-            winContentCheck = False
-            for char in illegalWin[0]:  # checks for illegal chars in file name
-                if char in name:
-                    winContentCheck = True
-            if winContentCheck or name.upper() in illegalWin or len(name) > 255 or name[-1] == '.':
-                return False
-            else:
-                return True
-        elif sys.platform == "darwin":  # macOS
-            if name.upper() in illegalMac or len(name) > 255:
-                return False
-            else:
-                return True
-        elif sys.platform == "linux":  # linux
-            if name.upper() in illegalLinux or len(name > 255):
-                return False
-            else:
-                return True
-        else:  # unsupported OS!
-            return True
-
-    def fileExists(self, name=''):
-        return (name in os.listdir()) if name else (self.fileName in os.listdir())
-
-    def fileNameGet(self):
-        return self.fileName
-
-    def fileOpen(self):
-        if self.fileExists():
-            if not self.securityQ:
-                self.fileDecrypt()
-            try:
-                content = pd.read_csv(self.fileName, dtype=str, header=None, index_col=False)
-            except pd.errors.EmptyDataError:
-                content = pd.DataFrame(columns=("Username", "Password"))
-            return content
-        else:
-            raise Exception("Error - File does not exist")
-
-    def fileClose(self, panda):
-        if not isinstance(panda, pd.DataFrame):
-            raise PandasError()
-        if self.securityQ == False:
-            panda.to_csv(self.fileName, header=False, index=False)
-            self.fileEncrypt()
-        else:
-            panda.iloc[1] = [self.strHash(x) for x in panda.iloc[1]]
-            panda.to_csv(self.fileName, header=False, index=False)
-        # self.fileName = ("password.csv")
-        # directory = " "
-        # filepath = directory + input("Enter filename: ")
-
-    def fileCreate(self, file, contents=""):
-        create = open(file, 'x')
-        # print(file, contents)
-        if contents != "":
-            create.write(contents)
-        create.close()
-        print(file)
-
-    def fileEncrypt(self):
-        # Opens key.key file, keyStorage is the file object.
-        # almostKey is the contents of key.key that has not been set to the symmetric key.
-        keyStorage = open("key.key", 'rb')
-        almostKey = keyStorage.read()
-        # Fernet function = reads out the key.
-        # key variable is the actual key.
-        key = Fernet(almostKey)
-        keyStorage.close()
-
-        decryptedStorage = open(self.fileName, 'rb')
-        decrypted = decryptedStorage.read()
-        encrypted = key.encrypt(decrypted)
-        decryptedStorage.close()
-
-        # Open the file and write the encrypted string.
-        encryptedStorage = open(self.fileName, 'wb')
-        encryptedStorage.write(encrypted)
-        encryptedStorage.close()
-
-    def fileDecrypt(self):
-        mPassFile = open("mpass.txt", 'r')
-        mPass = mPassFile.read()
-        print(mPass)
-        mPassFile.close()
-        while (True):
-            verifyPassword = str(self.input("Please input your master password. (CASE SENSITIVE)"))
-            if str(mPass) == str(self.strHash(verifyPassword)):
-                break
-                # decrypts if input hash matches stored hash
-            else:  # security question else block
-                check = str(self.input("Password incorrect. Type 'HELP' if you forgot your password."))
-                if check == 'HELP':
-                    # user opted for security questions
-                    check = self.SecQ()
-                    if check:
-                        break
-                        # correctly answered security question, decrypt
-                    else:
-                        raise MasterPasswordError()
-                else:
-                    raise MasterPasswordError()
-        keyStorage = open("key.key", 'rb')
-        almostKey = keyStorage.read()
-        key = Fernet(almostKey)
-        keyStorage.close()
-
-        encryptedStorage = open(self.fileName, 'rb')
-        encrypted = encryptedStorage.read()
-        if encrypted:
-            decrypted = key.decrypt(encrypted)
-        else:
-            decrypted = encrypted
-        print(decrypted)
-        encryptedStorage.close()
-        decryptedStorage = open(self.fileName, 'wb')
-        decryptedStorage.write(decrypted)
-        decryptedStorage.close()
-
-    def SecQ(self):
-        qs = pd.read_csv('security.csv', dtype=str, header=None, index_col=False)
-        ind = random.randint(0, len(qs.columns) - 1)  # selects random question
-        ansHash = str(self.strHash(self.input(qs.iat[0, ind])))  # hashes user input to be compared to correct answer
-        if ansHash == qs.iat[1, ind]:  # compares user input to expected input
-            return True
-        else:
-            return False
-
-    def factoryReset(self):
-        if self.fileExists(self.fileName):
-            os.remove(self.fileName)
-        if self.fileExists("key.key"):
-            os.remove("key.key")
-        if self.fileExists("mpass.txt"):
-            os.remove("mpass.txt")
-        if self.fileExists("security.csv"):
-            os.remove("security.csv")
-        if self.fileExists("password.csv"):
-            os.remove("password.csv")
-        self.firstTime()
-
-
-# Exceptions for errors
-class FileError(Exception):
-    '''
-    Exceptions for errors
-    '''
-    pass
-
-
-# Send a message if the master password is incorrect.
-class MasterPasswordError(FileError):
-    '''
-    Send a message if the master password is incorrect.
-    '''
-
-    def __init__(self, message=''):
-        default_message = "Master password is incorrect."
-        super().__init__(message if message else default_message)
-
-
-class FileTypeError(FileError):
-    def __init__(self, message=''):
-        default_message = "File cannot be accessed."
-        super().__init__(message if message else default_message)
-
-
-class PandasError(FileError):
-    def __init__(self, message=''):
-        default_message = "Input must be a pandas dataframe."
+import csv
+import hmac
+import io
+import time
+import os
+import sys
+import random
+import threading
+from contextlib import contextmanager
+import Key_derivation
+import Metrics
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from History import HISTORY_KEEP, HISTORY_SUFFIX, History
+from Journal import Journal
+from Dataframe import RECORD_COLUMNS, SITE, record
+from Lazy import lazy_import
+from Recovery import RECOVERY_NAME, Recovery
+from Session import Session
+from Vault_io import BLOCK_ROWS, ENTRY_VERSION, Block_Reader, Block_Writer, Encrypted_Reader, Encrypted_Writer, \
+    Entry_Reader, Entry_Writer, open_vault, read_header
+from Vault_lock import LOCK_NAME, Vault_Lock
+from Vault_state import Vault_State, vault_root
+
+# only the paths that build dataframes pay for importing pandas, and only imports, exports and audits for their modules
+pd = lazy_import("pandas")
+Audit = lazy_import("Audit")
+Transfer = lazy_import("Transfer")
+
+
+class System:
+    """
+    KEY:
+        ~~internal use only~~ denotes that a function is primarily intended to be utilized within the class, not to
+                              called externally (you *can* if you really want to but it might break something, as these
+                              functions are also called within other functions and some aren't meant to be called twice)
+        -All hashes are done in SHA256, except the master password which goes through a salted KDF (see
+         Key_derivation)
+    ====================================================================================================================
+    :__init__: Initializes class object.
+               :param name: string - optional file name
+               :param get_input: function - solicits input from UI
+               :param securityQ: boolean - indicates whether object is the security questions (fileOpen returns the
+                                 questions, fileClose sets up new questions from a frame of questions and answers)
+               :param journalLimit: int - journal size in bytes that triggers a background compaction
+               :param layout: string - "block" (compressed blocks of length prefixed fields, the default: the fastest to
+                              load and save whole and the smallest) or "entry" (records encrypted one by one with an
+                              index, opt in for vaults mostly read a username at a time by fileLookup, whole saves
+                              cost about 4x as much), see Vault_io. Files in either layout can be read, vaults in the
+                              other layout or still in a csv layout (legacy or stream) are rewritten in this one by the
+                              next save, csv ones the first time they're opened.
+               :param sessionTimeout: float - idle seconds before the cached key and master password verification
+                                      expire, None to keep them for the life of the object
+               :param directory: string - vault directory holding the files listed below, created if missing. Made
+                                 absolute once. Defaults to $SYS230_VAULT_DIR, or the current directory if that isn't
+                                 set.
+               :param historyKeep: int - snapshots kept as versions (see History), 0 keeps no history
+               :param historyDays: float - versions younger than this many days are kept as well
+               :return: None
+    checkLegality: This is an attempt to avert an exception in the event that a file needs to be created
+                   by making sure the user's inputted file name will be accepted by the host OS (Certain
+                   characters/file names/etc are disallowed by the OS).
+                   :param name: string - file name
+                   :return: bool - indicates whether file name is legal
+                   -----------------------------------------------------------------------------------------------------
+                   calling this externally won't break anything but System handles this so it isn't really necessary
+                   ~~internal use only ~~
+    strHash: Returns a hash of the inputted string
+             :param string_word: string - string to be hashed
+             :return: string - SHA256 hash of input string
+             -----------------------------------------------------------------------------------------------------------
+             only call this if you're using it for your own class, don't pass a hash to System
+             ~~internal use only~~
+    firstTime: creates files if they are not found
+               :param: None
+               :return: None
+               ---------------------------------------------------------------------------------------------------------
+               System handles this, calling this externally will catastrophically break everything
+               ~~internal use only~~
+    filePath: Returns the path of one of the vault's files
+              :param name: string - file name
+              :return: string - the name joined to the vault directory
+    fileExists: Checks to see if specified file exists in the vault directory, with one stat of the file
+                :param name: string - file to look for
+                :return: bool - indicates whether file was found
+                --------------------------------------------------------------------------------------------------------
+                calling this externally won't break anything but System handles this so it isn't really necessary
+                ~~internal use only~~
+    fileNameGet: Returns name of file
+                 :param: None
+                 :return: string - name of file
+    fileOpen: Opens and decrypts file. The plaintext is read straight out of the decrypting stream and never written
+              to disk. Changes in the journal are replayed on top of the snapshot. A vault still stored as csv is
+              upgraded to the binary layout.
+              :param: None
+              :return: dataframe - decrypted dataframe read from file, with the Dataframe.RECORD_COLUMNS columns
+                       (empty for fields a vault written before entries had metadata doesn't have)
+    fileClose: Saves pd dataframe to file. The dataframe is serialized straight into the encrypting stream and the
+               journal records it includes are discarded. The dataframe replaces the whole vault, so changes another
+               process journaled after this one read the vault are lost (last writer wins), use fileAppend for
+               changes that have to survive concurrent writers.
+               :param: dataframe - changed dataframe to encrypt and save
+               :return: None
+    fileLookup: Looks up a single username without decrypting the rest of the vault (entry layout only, the block
+                layout decrypts every block and csv layouts fall back to a full fileOpen). Journal records for the
+                username are applied on top. Doesn't need pandas unless the vault is csv.
+                :param username: string - username to look up
+                :return: list - matching rows, one per site, padded to Dataframe.RECORD_COLUMNS
+    fileRetrieve: fileLookup as a dataframe
+                  :param username: string - username to look up
+                  :return: dataframe - matching rows
+    fileAppend: Records a single change in the journal instead of rewriting the whole file. Starts a background
+                compaction once the journal grows past journalLimit. An add replaces the entry the username already
+                has for the same site.
+                :param op: string - "add" or "remove"
+                :param username: string - username that was added or removed
+                :param password: string - password that was added, None for removals
+                :param fields: strings - the rest of an added entry (Dataframe.entry builds one), or the site of a
+                               removal that only removes one site's entry
+                :return: None
+    fileAppendMany: fileAppend for a batch of changes, written with a single fsync
+                    :param changes: list of (op, username, password, *fields) tuples
+                    :return: None
+    fileChanged: Checks whether another process saved the vault or appended to its journal since this System last
+                 opened it, two stats. This System's own saves, appends and compactions don't count, a history
+                 restore does.
+                 :param: None
+                 :return: bool - True until fileOpen is called again, also if the vault was never opened
+    fileImport: Imports a CSV or JSON export from another password manager (or one of our exports) into a
+                Data_Manager in chunks, then saves the vault once.
+                :param path: string - export file
+                :param manager: Data_Manager - unlocked vault to import into
+                :param fmt: string - "csv" or "json", guessed from the extension if not given
+                :param replace: boolean - whether imported entries replace existing ones with the same site and
+                                username
+                :param chunksize: int - rows parsed at a time, Transfer.CHUNK_SIZE if None
+                :return: dict - entries read, entries added, seconds, entries per second
+    fileExport: Writes every entry to a CSV file, encrypted with the vault key (our stream layout, fileImport reads
+                it back) or as plaintext. Rows are streamed from the vault file chunksize at a time.
+                :param path: string - export file
+                :param encrypted: boolean - whether to encrypt the export
+                :param chunksize: int - rows handled at a time, Transfer.CHUNK_SIZE if None
+                :return: dict - entries written, seconds, entries per second
+    fileAudit: Checks every password for reuse, weakness, the old pwrandom and breaches (see Audit) and writes the
+               findings to a CSV report. Rows are streamed from the vault file like fileExport, the passwords themselves
+               are never written.
+               :param path: string - report file, "-" for stdout
+               :param breaches: string - optional Breach_Index file
+               :param processes: int - worker processes, see Audit.audit
+               :param chunksize: int - rows read at a time, Transfer.CHUNK_SIZE if None
+               :return: dict - entries checked, entries with each issue, seconds, entries per second
+    fileCreate: Creates file in the OS.
+                  :param file: string - Name of file.
+                  :param contents: string - optional contents to be written to file.
+                  :return: None
+                --------------------------------------------------------------------------------------------------------
+                file creation is handled internally, calling this will probably overwrite something and break it
+                ~~internal use only~~
+    fileEncrypt: Serializes a dataframe into the encrypted file, one record per row (entry layout) or in BLOCK_ROWS
+                 blocks (block layout). The new file is written next to the old one, fsynced and renamed over it, so a
+                 crash mid-write leaves the previous snapshot intact.
+                 Used exclusively within fileClose and journalCompact
+                 :param panda: dataframe - dataframe to encrypt and save
+                 :param sequence: int - last journal record included in the dataframe
+                 :return: None
+                 -------------------------------------------------------------------------------------------------------
+                 we handled cryptography internally, using this outside of System it will break something
+                 ~~internal use only~~
+    fileDecrypt: Verifies the master password and opens a reader for the file's layout, as a context manager that
+                 holds the session (see Session.hold) until it closes the reader. Used exclusively within fileOpen
+                 :param: None
+                 :return: Entry_Reader, Block_Reader or Encrypted_Reader (readable binary stream of the plaintext csv
+                          of an older vault)
+                 -------------------------------------------------------------------------------------------------------
+                 we handled cryptography internally, using this outside of System it will break something
+                 ~~internal use only~~
+    masterVerify: Asks for the master password (or the security questions) and raises if it's wrong. Doesn't ask
+                  again while the session is unlocked. A legacy SHA256 mpass.txt is rewritten with a calibrated KDF
+                  header the first time the right password is entered.
+                  :param: None
+                  :return: None
+                  ~~internal use only~~
+    keyGet: Returns the symmetric key, key.key is only read once per session
+            :param: None
+            :return: Fernet - cipher built from key.key
+            ~~internal use only~~
+    journalReplay: Applies journal records on top of a snapshot dataframe
+                   :param content: dataframe - snapshot
+                   :param after: int - sequence number the snapshot already includes
+                   :param through: int - optional last sequence number to apply
+                   :return: dataframe
+                   ~~internal use only~~
+    journalCompact: Folds the journal into a new snapshot on a background thread. Does nothing if a compaction is
+                    already running.
+                    :param: None
+                    :return: threading.Thread - the compaction thread
+    SecQ: Handles decryption via security questions in the case of a forgotten password. Questions are asked in a
+          random order until enough were answered right to unwrap the vault key (see Recovery), or too many were
+          answered wrong. Vaults set up before recovery.txt existed still ask one random question from security.csv.
+          Doesn't need pandas.
+          :param: None
+          :return: boolean - indicates whether questions were answered correctly
+          --------------------------------------------------------------------------------------------------------------
+          This function involves cryptography, so calling it will break something.
+          ~~internal use only~~
+    historyVersions: Returns the versions the vault's history holds
+                     :param: None
+                     :return: list of (version number, unix time, whether it's a keyframe) tuples, oldest first
+    historyRestore: Makes an earlier version the vault's content again. The restore is saved like any other
+                    snapshot, so it becomes the newest version and can be undone by restoring the one before it.
+                    Changes still in the journal are dropped with the content they applied to.
+                    :param version: int - version number, the newest recorded before `when` if not given
+                    :param when: float - unix time to restore the vault to
+                    :return: dataframe - the restored entries, for the Data_Manager
+    factoryReset: Factory reset. Deletes all files associated with the program and remakes them from scratch. Anything
+                  currently saved will be lost, including the history (it's encrypted with the key being replaced).
+                  :param: None
+                  :return: None
+    ====================================================================================================================
+    FILES:
+        key.key - symmetric encryption key
+        recovery.txt - security questions, salted KDF verifiers of their answers and the vault key wrapped so that
+                       enough right answers unwrap it (see Recovery)
+        security.csv - legacy security questions (row 1 = plaintext q's, row 2 = unsalted answer hashes), only read
+                       when recovery.txt doesn't exist
+        password.csv - encrypted password file (row 1 = username, row 2 = password), see Vault_io for the layout
+        password.csv.journal - encrypted changes made since password.csv was last written, see Journal for the layout
+        password.csv.history/ - encrypted keyframes and deltas of the last snapshots written, see History
+        mpass.txt - KDF header of the master password (kdf, cost parameters, salt, hash)
+        vault.lock - advisory lock, shared while a process reads the vault and exclusive while one writes it, so
+                     several processes can use the same vault directory (see Vault_lock)
+    ====================================================================================================================
+    """
+
+    def __init__(self, name='', get_input=input, securityQ=False, journalLimit=1 << 20, layout="block",
+                 sessionTimeout=300, directory=None, historyKeep=HISTORY_KEEP, historyDays=None):
+        self.securityQ = securityQ
+        self.fileName = name
+        self.directory = vault_root(directory)
+        self.input = get_input
+        self.journalLimit = journalLimit
+        self.layout = layout
+        self.compactor = None
+        # stamps of the vault file and its journal as this System last read or wrote them, see fileChanged
+        self.seen = None
+        self.recovery = None
+        if not self.checkLegality(name):
+            raise Exception("Error - file name invalid")
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self.state = Vault_State(self.directory)
+        self.session = Session(self.filePath("key.key"), sessionTimeout)
+        self.lock = Vault_Lock(self.filePath(LOCK_NAME))
+        self.history = None
+        if not securityQ and historyKeep:
+            self.history = History(self.filePath(name + HISTORY_SUFFIX), historyKeep, historyDays)
+        if not self.fileExists("mpass.txt") or not self.fileExists("key.key") or not self.fileExists(name):
+            with self.lock.exclusive():
+                self.firstTime()
+        if not securityQ:
+            self.journal = Journal(self.filePath(self.fileName + ".journal"))
+            with self.lock.shared():
+                self._journalRefresh()
+
+    def strHash(self, string_word):
+        generate = hashes.Hash(hashes.SHA256())
+        generate.update(string_word.encode())
+        # The Finalize method is used to perform cleanup operations on unmanaged resources held
+        # by the current object before the object is destroyed.
+        return generate.finalize()
+
+    def filePath(self, name):
+        return self.state.path(name)
+
+    def firstTime(self):
+        # called with the vault locked exclusively, another process may have set the vault up while this one waited
+        if not self.fileExists("key.key"):
+            create = open(self.filePath("key.key"), 'x')
+            create.close()
+            create = open(self.filePath("key.key"), 'wb')
+            # Fernet guarantees that a message encrypted using it cannot be manipulated or read without the key.
+            # Used in symmetric cryptography. Fernet key can be in bytes or string. generate_key() is in the Fernet library.
+            create.write(Fernet.generate_key())
+            create.close()
+
+        # Create master password if the mpass file doesn't exist.
+        if not self.fileExists("mpass.txt"):
+            mpass = str(self.input("What would you like your master password to be?"))
+            with Metrics.timer("system.kdf"):
+                header = Key_derivation.hash_password(mpass)
+            self.fileCreate("mpass.txt", header)
+
+        # If the vault file does not exist, then create it
+        if not self.fileExists(self.fileName):
+            # print("Make the password file")
+            self.fileCreate(self.fileName)
+        if not self.fileExists(RECOVERY_NAME) and not self.fileExists("security.csv"):
+            pairs = []
+            while True:
+                q = str(self.input("Please input a security question. Input 'stop' to stop."))
+                if q == "stop":
+                    break
+                a = str(self.input("Please input an answer to said security question. (CASE SENSITIVE): "))
+                pairs.append((q, a))
+            self._recoverySave(pairs)
+
+    def checkLegality(self, name):  # Intended for internal use only
+        illegalWin = ["\\/<>:\"\'|?*", "CON", "PRN", "AUX", "NUL", "COM1", "COM2", "COM3", "COM4", "COM5", "COM6",
+                      "COM7", "COM8", "COM9", "LPT1", "LPT2", "LPT3", "LPT4", "LPT5", "LPT6", "LPT7", "LPT8",
+                      "LPT9", ""]
+        illegalMac = ["/", ":", "NUL", ""]
+        illegalLinux = ["/", "NUL", ""]
+        if sys.platform == "win32":  # windows
+            winContentCheck = False
+            for char in illegalWin[0]:  # checks for illegal chars in file name
+                if char in name:
+                    winContentCheck = True
+            if winContentCheck or name.upper() in illegalWin or len(name) > 255 or name[-1] == '.':
+                return False
+            else:
+                return True
+        elif sys.platform == "darwin":  # macOS
+            if name.upper() in illegalMac or len(name) > 255:
+                return False
+            else:
+                return True
+        elif sys.platform == "linux":  # linux
+            if name.upper() in illegalLinux or len(name) > 255:
+                return False
+            else:
+                return True
+        else:  # unsupported OS!
+            return True
+
+    def fileExists(self, name=''):
+        return self.state.exists(name if name else self.fileName)
+
+    def fileNameGet(self):
+        return self.fileName
+
+    def fileOpen(self):
+        if self.fileExists():
+            if self.securityQ:
+                return pd.DataFrame([[question.text for question in self._recoveryLoad().questions]])
+            # asked before locking, so a process waiting on the prompt doesn't hold writers off
+            self.masterVerify()
+            with self.lock.shared():
+                with self.fileDecrypt() as decrypted:
+                    content = self._frameRead(decrypted)
+                    sequence = decrypted.sequence
+                if isinstance(decrypted, Encrypted_Reader):
+                    self._upgrade(content, sequence)
+                self.journal.refresh(sequence)
+                content = self.journalReplay(content, sequence)
+                self.seen = self._stamps()
+            Metrics.count("system.opens")
+            Metrics.count("system.entries_loaded", len(content.index))
+            return content
+        else:
+            raise Exception("Error - File does not exist")
+
+    def fileClose(self, panda):
+        if not isinstance(panda, pd.DataFrame):
+            raise PandasError()
+        if self.securityQ == False:
+            with self.lock.exclusive(), self._writing():
+                self._journalRefresh()
+                sequence = self.journal.lastSeq
+                self.fileEncrypt(panda, sequence)
+                self.journal.discard(sequence)
+        else:
+            # row 0 = questions, row 1 = answers, the answers are only stretched into the recovery file
+            self._recoverySave(list(zip(panda.iloc[0].astype(str), panda.iloc[1].astype(str))))
+        # self.fileName = ("password.csv")
+        # directory = " "
+        # filepath = directory + input("Enter filename: ")
+
+    def fileLookup(self, username):
+        self.masterVerify()
+        with self.lock.shared(), Metrics.timer("system.lookup"):
+            with self._vaultOpen() as decrypted:
+                if isinstance(decrypted, (Entry_Reader, Block_Reader)):
+                    rows = decrypted.lookup(username)
+                else:
+                    content = self._frameRead(decrypted)
+                    rows = content[content.iloc[:, 0] == username].values.tolist()
+                sequence = decrypted.sequence
+            self.journal.refresh(sequence)
+            rows = [record(row) for row in rows]
+            for seq, op, row in self.journal.records(self.keyGet(), sequence):
+                if row[0] == username:
+                    removed = _removedKeys(op, row)
+                    rows = [kept for kept in rows if not _isRemoved(removed, kept)]
+                    if op == "add":
+                        rows.append(record(row))
+        return rows
+
+    def fileRetrieve(self, username):
+        return pd.DataFrame(self.fileLookup(username), columns=RECORD_COLUMNS)
+
+    def fileAppend(self, op, username, password=None, *fields):
+        self.fileAppendMany([(op, username, password) + fields])
+
+    def fileAppendMany(self, changes):
+        with self.lock.exclusive(), self._writing(), Metrics.timer("system.journal_append"):
+            # numbers the records after whatever other processes appended
+            self._journalRefresh()
+            self.journal.extend(self.keyGet(), changes)
+        Metrics.count("system.journal_records", len(changes))
+        if self.journal.size() > self.journalLimit:
+            self.journalCompact()
+
+    def fileChanged(self):
+        # two stats, no lock: a write in progress shows up as a change and is read again once it's done
+        return self._stamps() != self.seen
+
+    def _stamps(self):
+        return self.state.stamp(self.fileName), self.state.stamp(self.fileName + ".journal")
+
+    @contextmanager
+    def _writing(self):
+        # with the vault locked exclusively: what this System writes isn't a change by someone else, unless someone
+        # else already wrote since it last read or wrote the vault, then fileChanged keeps reporting that
+        unchanged = self._stamps() == self.seen
+        yield
+        if unchanged:
+            self.seen = self._stamps()
+
+    def _journalRefresh(self):
+        # called with the vault locked, picks up journal records and snapshots written by other processes. The header
+        # is only read again once the vault file was replaced, usually this is two stats.
+        self.journal.refresh(self.state.read(self.fileName, _sequence))
+
+    @contextmanager
+    def _vaultOpen(self):
+        # the session's keys stay intact while the reader is open, see Session.hold
+        with self.session.hold():
+            keys = self.session.entryKeys()
+            with open_vault(open(self.filePath(self.fileName), 'rb'), self.keyGet(), keys) as reader:
+                yield reader
+
+    def _journalChanges(self, after, through=None):
+        # returns (keys removed from the snapshot, see _removedKeys, rows added after it)
+        # removals and adds drop every earlier row with the same key, whether it came from the snapshot or the journal
+        removed = set()
+        pending = []
+        for seq, op, row in self.journal.records(self.keyGet(), after):
+            if through is not None and seq > through:
+                break
+            keys = _removedKeys(op, row)
+            removed |= keys
+            pending = [kept for kept in pending if not _isRemoved(keys, kept)]
+            if op == "add":
+                pending.append(record(row))
+        return removed, pending
+
+    def journalReplay(self, content, after, through=None):
+        with Metrics.timer("system.journal_replay"):
+            removed, pending = self._journalChanges(after, through)
+            if removed:
+                # only the rows of usernames that were touched are checked one by one
+                touched = content["Username"].isin({key[0] for key in removed})
+                dropped = [_isRemoved(removed, row) for row in content[touched].itertuples(index=False, name=None)]
+                content = content.drop(content.index[touched][dropped])
+            if pending:
+                content = pd.concat([content, pd.DataFrame(pending, columns=content.columns)], ignore_index=True)
+            return content
+
+    def fileImport(self, path, manager, fmt=None, replace=False, chunksize=None):
+        chunksize = chunksize or Transfer.CHUNK_SIZE
+        start = time.perf_counter()
+        with open(path, 'rb') as source:
+            version = read_header(source)[0]
+        if version in (1, 2):
+            # one of our encrypted exports
+            source = io.TextIOWrapper(io.BufferedReader(Encrypted_Reader(open(path, 'rb'), self.keyGet())),
+                                      encoding="utf-8", newline="")
+            fmt = "csv"
+        else:
+            source = path
+        entries = added = 0
+        try:
+            for chunk in Transfer.read(source, fmt, chunksize):
+                entries += len(chunk.index)
+                added += manager.add_many(chunk, replace=replace)
+        finally:
+            if source is not path:
+                source.close()
+        # one encrypted commit for the whole import
+        self.fileClose(manager.dataframe)
+        seconds = time.perf_counter() - start
+        return {"entries": entries, "added": added, "seconds": seconds, "rate": entries / seconds}
+
+    def fileExport(self, path, encrypted=True, chunksize=None):
+        chunksize = chunksize or Transfer.CHUNK_SIZE
+        self.masterVerify()
+        start = time.perf_counter()
+        with self.lock.shared():
+            with self._vaultOpen() as decrypted:
+                self.journal.refresh(decrypted.sequence)
+                removed, pending = self._journalChanges(decrypted.sequence)
+                chunks = self._rowChunks(decrypted, removed, pending, chunksize)
+                if encrypted:
+                    with open(path, 'wb') as exportFile:
+                        writer = Encrypted_Writer(exportFile, self.keyGet())
+                        with io.TextIOWrapper(writer, encoding="utf-8", newline="") as stream:
+                            entries = Transfer.write_csv(stream, chunks, RECORD_COLUMNS)
+                else:
+                    with open(path, 'w', encoding="utf-8", newline="") as stream:
+                        entries = Transfer.write_csv(stream, chunks, RECORD_COLUMNS)
+        seconds = time.perf_counter() - start
+        return {"entries": entries, "seconds": seconds, "rate": entries / seconds if seconds else 0.0}
+
+    def fileAudit(self, path, breaches=None, processes=None, chunksize=None):
+        chunksize = chunksize or Transfer.CHUNK_SIZE
+        self.masterVerify()
+        with self.lock.shared(), Metrics.timer("system.audit"):
+            with self._vaultOpen() as decrypted:
+                self.journal.refresh(decrypted.sequence)
+                removed, pending = self._journalChanges(decrypted.sequence)
+                chunks = self._rowChunks(decrypted, removed, pending, chunksize)
+                if path == "-":
+                    return Audit.audit(chunks, sys.stdout, breaches, processes=processes)
+                with open(path, 'w', encoding="utf-8", newline="") as report:
+                    return Audit.audit(chunks, report, breaches, processes=processes)
+
+    def _rowChunks(self, decrypted, removed, pending, chunksize):
+        # yields the snapshot's rows in lists of chunksize, minus removed entries, followed by the journal's additions
+        if isinstance(decrypted, (Entry_Reader, Block_Reader)):
+            rows = []
+            for row in decrypted.rows():
+                if not _isRemoved(removed, row):
+                    rows.append(record(row))
+                if len(rows) == chunksize:
+                    yield rows
+                    rows = []
+            if rows:
+                yield rows
+        else:
+            try:
+                for chunk in pd.read_csv(io.BufferedReader(decrypted), dtype=str, header=None, index_col=False,
+                                         keep_default_na=False, chunksize=chunksize):
+                    yield [record(row) for row in chunk.values.tolist() if not _isRemoved(removed, row)]
+            except pd.errors.EmptyDataError:
+                pass
+        if pending:
+            yield pending
+
+    def journalCompact(self):
+        if self.compactor is None or not self.compactor.is_alive():
+            # not a daemon thread, so the interpreter waits for a compaction to finish before exiting
+            self.compactor = threading.Thread(target=self._compact, name="journal-compaction")
+            self.compactor.start()
+        return self.compactor
+
+    def _compact(self):
+        with self.lock.exclusive(), self._writing(), Metrics.timer("system.compact"):
+            with self._vaultOpen() as decrypted:
+                content = self._frameRead(decrypted)
+                sequence = decrypted.sequence
+            self.journal.refresh(sequence)
+            through = self.journal.lastSeq
+            if through > sequence:
+                self.fileEncrypt(self.journalReplay(content, sequence, through), through)
+            self.journal.discard(through)
+
+    def _upgrade(self, content, sequence):
+        # rewrites a csv vault in the binary layout, unless another process replaced it while the lock was upgraded
+        with self.lock.exclusive():
+            with open(self.filePath(self.fileName), 'rb') as storage:
+                version, current = read_header(storage)
+            if version < ENTRY_VERSION and current == sequence:
+                self.fileEncrypt(content, sequence)
+
+    def _frameRead(self, decrypted):
+        # binary layouts are decrypted and split into fields, csv layouts are parsed out of the decrypting stream
+        with Metrics.timer("system.csv_parse" if isinstance(decrypted, Encrypted_Reader) else "system.decrypt"):
+            return self._frameBuild(decrypted)
+
+    def _frameBuild(self, decrypted):
+        if isinstance(decrypted, Block_Reader):
+            columns = None
+            for block in decrypted.columns():
+                if columns is None:
+                    columns = block
+                else:
+                    for column, fields in zip(columns, block):
+                        column += fields
+            return _records(pd.DataFrame(dict(enumerate(columns))) if columns[0] else pd.DataFrame())
+        if isinstance(decrypted, Entry_Reader):
+            return _records(pd.DataFrame(list(decrypted.rows())))
+        try:
+            return _records(pd.read_csv(io.BufferedReader(decrypted), dtype=str, header=None, index_col=False,
+                                        keep_default_na=False))
+        except pd.errors.EmptyDataError:
+            return _records(pd.DataFrame())
+
+    def keyGet(self):
+        # the session reads key.key and builds the Fernet cipher the first time, later calls reuse it
+        return self.session.fernet()
+
+    def fileCreate(self, file, contents=""):
+        create = open(self.filePath(file), 'x')
+        # print(file, contents)
+        if contents != "":
+            create.write(contents)
+        create.close()
+
+    def fileEncrypt(self, panda, sequence=0):
+        # rows are encrypted as they are written (entry layout), or a block of columns at a time (block layout), so
+        # only a row or a block of plaintext is held in memory at a time and none of it reaches the disk.
+        temp = self.filePath(self.fileName + ".tmp")
+        filled = panda.fillna("")
+        with open(temp, 'wb') as encryptedStorage, self.session.hold():
+            if self.layout == "entry":
+                # serializing and encrypting happen row by row, they're timed together
+                with Metrics.timer("system.encrypt"):
+                    writer = Entry_Writer(encryptedStorage, self.session.entryKeys(), sequence=sequence)
+                    for row in filled.itertuples(index=False, name=None):
+                        writer.write_row(row)
+                    writer.close()
+            else:
+                with Metrics.timer("system.serialize"):
+                    columns = [column.tolist() for _, column in filled.items()]
+                with Metrics.timer("system.encrypt"):
+                    writer = Block_Writer(encryptedStorage, self.session.entryKeys(), sequence=sequence)
+                    for start in range(0, len(panda.index), BLOCK_ROWS):
+                        writer.write_columns([column[start:start + BLOCK_ROWS] for column in columns])
+                    writer.close()
+                del columns
+            with Metrics.timer("system.file_write"):
+                encryptedStorage.flush()
+                os.fsync(encryptedStorage.fileno())
+        # the old snapshot is only replaced once the new one is completely on disk
+        os.replace(temp, self.filePath(self.fileName))
+        if self.history is not None:
+            # History reads the rows twice, once to hash them and once to write what changed, a block at a time
+            # instead of collecting a second copy of the vault
+            with Metrics.timer("system.history"):
+                self.history.record(self.keyGet(), lambda: _rows(filled))
+        Metrics.count("system.saves")
+        Metrics.count("system.entries_saved", len(panda.index))
+
+    @contextmanager
+    def fileDecrypt(self):
+        self.masterVerify()
+
+        # the reader owns the file handle from here on, closing the reader closes the file
+        encryptedStorage = open(self.filePath(self.fileName), 'rb')
+        with self.session.hold():
+            try:
+                reader = open_vault(encryptedStorage, self.keyGet(), self.session.entryKeys())
+            except Exception:
+                encryptedStorage.close()
+                raise
+            with reader:
+                yield reader
+
+    def masterVerify(self):
+        if self.session.verified():
+            return
+        mPass = self.state.read("mpass.txt", _text)
+        while (True):
+            verifyPassword = str(self.input("Please input your master password. (CASE SENSITIVE)"))
+            with Metrics.timer("system.kdf"):
+                correct = Key_derivation.verify(mPass, verifyPassword, legacyHash=self.strHash)
+            if correct:
+                if Key_derivation.is_legacy(mPass):
+                    self._masterUpgrade(verifyPassword)
+                break
+                # decrypts if input hash matches stored hash
+            else:  # security question else block
+                Metrics.count("system.wrong_password")
+                check = str(self.input("Password incorrect. Type 'HELP' if you forgot your password."))
+                if check == 'HELP':
+                    # user opted for security questions
+                    check = self.SecQ()
+                    if check:
+                        break
+                        # correctly answered security question, decrypt
+                    else:
+                        raise MasterPasswordError()
+                else:
+                    raise MasterPasswordError()
+        self.session.verify()
+
+    def _masterUpgrade(self, password):
+        # replaces a legacy unsalted hash, the rename means a crash leaves either the old or the new header
+        with self.lock.exclusive():
+            with Metrics.timer("system.kdf"):
+                header = Key_derivation.hash_password(password)
+            with open(self.filePath("mpass.txt.tmp"), 'w') as mPassFile:
+                mPassFile.write(header)
+                mPassFile.flush()
+                os.fsync(mPassFile.fileno())
+            os.replace(self.filePath("mpass.txt.tmp"), self.filePath("mpass.txt"))
+
+    def SecQ(self):
+        if not self.fileExists(RECOVERY_NAME):
+            return self._legacySecQ()
+        recovery = self._recoveryLoad()
+        order = random.sample(range(len(recovery.questions)), len(recovery.questions))
+        shares = {}
+        for asked, index in enumerate(order):
+            # stop once the key can be unwrapped, or once it can't be anymore
+            if len(shares) >= recovery.threshold or len(shares) + len(order) - asked < recovery.threshold:
+                break
+            answer = str(self.input(recovery.questions[index].text))
+            with Metrics.timer("system.kdf"):
+                share = recovery.check(index, answer)
+            if share is not None:
+                shares[index] = share
+        key = recovery.unwrap(shares)
+        if key is None:
+            return False
+        with open(self.filePath("key.key"), 'rb') as keyStorage:
+            return hmac.compare_digest(key, keyStorage.read())
+
+    def _legacySecQ(self):
+        # security.csv written before recovery.txt: one random question, unsalted SHA256 repr of the answer
+        with open(self.filePath("security.csv"), newline="") as securityFile:
+            qs = list(csv.reader(securityFile))
+        if len(qs) < 2 or not qs[0]:
+            return False
+        ind = random.randrange(len(qs[0]))
+        ansHash = str(self.strHash(str(self.input(qs[0][ind]))))
+        return hmac.compare_digest(ansHash.encode(), qs[1][ind].encode())
+
+    def _recoveryLoad(self):
+        # recovery.txt is read once, answering questions again reuses it
+        if self.recovery is None:
+            self.recovery = Recovery.load(self.filePath(RECOVERY_NAME))
+        return self.recovery
+
+    def _recoverySave(self, pairs):
+        # the answers are stretched with the master password's KDF settings, so setting them up doesn't calibrate again
+        header = self.state.read("mpass.txt", _text)
+        kdf = None if Key_derivation.is_legacy(header) else Key_derivation.parse(header)[0]
+        with open(self.filePath("key.key"), 'rb') as keyStorage:
+            key = keyStorage.read()
+        with Metrics.timer("system.kdf"):
+            self.recovery = Recovery.create(pairs, key, kdf=kdf)
+        self.recovery.save(self.filePath(RECOVERY_NAME))
+
+    def historyVersions(self):
+        if self.history is None:
+            return []
+        return [(version.number, version.time, version.keyframe) for version in self.history.versions()]
+
+    def historyRestore(self, version=None, when=None):
+        self.masterVerify()
+        if self.history is None:
+            raise KeyError("this vault keeps no history")
+        with self.lock.exclusive(), Metrics.timer("system.restore"):
+            if version is None:
+                found = self.history.at(time.time() if when is None else when)
+                if found is None:
+                    raise KeyError("no version was recorded by then")
+                version = found.number
+            content = pd.DataFrame(self.history.load(self.keyGet(), version), columns=RECORD_COLUMNS)
+            self._journalRefresh()
+            through = self.journal.lastSeq
+            self.fileEncrypt(content, through)
+            self.journal.discard(through)
+        return content
+
+    def factoryReset(self):
+        with self.lock.exclusive():
+            for name in (self.fileName, "key.key", "mpass.txt", RECOVERY_NAME, "security.csv", "password.csv"):
+                if self.fileExists(name):
+                    os.remove(self.filePath(name))
+                self.state.forget(name)
+            self.recovery = None
+            if not self.securityQ:
+                self.journal.remove()
+            if self.history is not None:
+                self.history.remove()
+            # the old key is gone, so is anything cached from it
+            self.session.expire()
+            self.firstTime()
+
+
+def _text(path):
+    with open(path, 'r') as textFile:
+        return textFile.read()
+
+
+def _sequence(path):
+    # last journal sequence number folded into a vault file
+    with open(path, 'rb') as storage:
+        return read_header(storage)[1]
+
+
+def _records(frame):
+    # names the columns of a decrypted vault, fields missing from older rows are empty
+    frame = frame.reindex(columns=range(len(RECORD_COLUMNS)), fill_value="").fillna("")
+    frame.columns = RECORD_COLUMNS
+    return frame
+
+
+def _rows(frame):
+    # the frame's rows as tuples padded to RECORD_COLUMNS, a block of columns at a time, itertuples boxes every field
+    # of a string column on its own
+    padding = ("",) * (len(RECORD_COLUMNS) - len(frame.columns))
+    for start in range(0, len(frame.index), BLOCK_ROWS):
+        columns = [column.tolist() for _, column in frame.iloc[start:start + BLOCK_ROWS].items()]
+        for row in zip(*columns):
+            yield row + padding
+
+
+def _removedKeys(op, row):
+    # the keys a journal record drops earlier rows by: (username,) drops the username's entries for every site, a
+    # (username, site) pair only that site's. An add replaces the entry for its site.
+    if op == "remove" and len(row) <= SITE:
+        return {(row[0],)}
+    return {(row[0], row[SITE] if len(row) > SITE else "")}
+
+
+def _isRemoved(removed, row):
+    return bool(removed) and ((row[0],) in removed or (row[0], row[SITE] if len(row) > SITE else "") in removed)
+
+
+# Exceptions for errors
+class FileError(Exception):
+    '''
+    Exceptions for errors
+    '''
+    pass
+
+
+# Send a message if the master password is incorrect.
+class MasterPasswordError(FileError):
+    '''
+    Send a message if the master password is incorrect.
+    '''
+
+    def __init__(self, message=''):
+        default_message = "Master password is incorrect."
+        super().__init__(message if message else default_message)
+
+
+class FileTypeError(FileError):
+    def __init__(self, message=''):
+        default_message = "File cannot be accessed."
+        super().__init__(message if message else default_message)
+
+
+class PandasError(FileError):
+    def __init__(self, message=''):
+        default_message = "Input must be a pandas dataframe."
         super().__init__(message if message else default_message)
\ No newline at end of file
@@ -0,0 +1,230 @@
+import base64
+import hashlib
+import hmac
+import os
+
+import Key_derivation
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# recovery.txt, one header line followed by one line per security question:
+#   $recovery$k=<threshold>$<base64 nonce>$<base64 wrapped key>
+#   <base64 question>$<kdf>$<cost parameters>$<base64 salt>$<base64 verifier>$<base64 sealed share>
+# The vault key is encrypted (AES-GCM) with a random recovery secret, which is split into one Shamir share per question
+# so any `threshold` right answers rebuild it. Each answer is stretched with the same KDFs as the master password (see
+# Key_derivation); the result is split into a verifier, which says whether that answer is right, and a pad that seals
+# the question's share. The question lines are the associated data of the wrapped key, so editing a question or a
+# verifier makes recovery fail instead of quietly accepting other answers.
+RECOVERY_NAME = "recovery.txt"
+SECRET_SIZE = 32
+NONCE_SIZE = 12
+
+# GF(256) with the AES polynomial, EXP is doubled so products never need a modulo
+EXP = [0] * 510
+LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    EXP[_power] = EXP[_power + 255] = _value
+    LOG[_value] = _power
+    _value ^= ((_value << 1) ^ (0x11b if _value & 0x80 else 0)) & 0xff
+del _value, _power
+
+
+def _multiply(a, b):
+    if not a or not b:
+        return 0
+    return EXP[LOG[a] + LOG[b]]
+
+
+def _divide(a, b):
+    if not a:
+        return 0
+    return EXP[LOG[a] + 255 - LOG[b]]
+
+
+def split(secret, threshold, count):
+    """
+    Splits a secret into count Shamir shares over GF(256), any threshold of them rebuild it.
+    :param secret: bytes
+    :return: list of bytes - share i is the polynomials evaluated at x = i + 1
+    """
+    # one random polynomial of degree threshold - 1 per byte, its constant term is the secret byte
+    coefficients = [secret] + [os.urandom(len(secret)) for _ in range(threshold - 1)]
+    shares = []
+    for x in range(1, count + 1):
+        share = bytearray(len(secret))
+        for coefficient in reversed(coefficients):
+            for position, byte in enumerate(coefficient):
+                share[position] = _multiply(share[position], x) ^ byte
+        shares.append(bytes(share))
+    return shares
+
+
+def combine(shares):
+    """
+    Rebuilds a secret from threshold shares (Lagrange interpolation at x = 0).
+    :param shares: dict - x -> share
+    :return: bytes
+    """
+    secret = bytearray(len(next(iter(shares.values()))))
+    for x, share in shares.items():
+        basis = 1
+        for other in shares:
+            if other != x:
+                basis = _multiply(basis, _divide(other, other ^ x))
+        for position, byte in enumerate(share):
+            secret[position] ^= _multiply(byte, basis)
+    return bytes(secret)
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _mac(key, label):
+    return hmac.new(key, label, hashlib.sha256).digest()
+
+
+def _xor(a, b):
+    return bytes(x ^ y for x, y in zip(a, b))
+
+
+def majority(count):
+    # default threshold, more than half of the questions
+    return count // 2 + 1 if count else 0
+
+
+class Question:
+    """
+    One security question with the verifier and sealed share of its answer.
+    ====================================================================================================================
+    :__init__: :param text: string - the question
+               :param kdf: Scrypt_KDF or PBKDF2_KDF - stretches the answer
+               :param salt: bytes
+               :param verifier: bytes - MAC of the stretched answer
+               :param sealed: bytes - the question's share, XORed with a pad from the stretched answer
+    line: Returns the question's line of recovery.txt
+          :param: None
+          :return: string
+    check: Stretches an answer and returns the question's share if it's right. Takes the same time for right and wrong
+           answers.
+           :param answer: string
+           :return: bytes or None
+    ====================================================================================================================
+    """
+
+    def __init__(self, text, kdf, salt, verifier, sealed):
+        self.text = text
+        self.kdf = kdf
+        self.salt = salt
+        self.verifier = verifier
+        self.sealed = sealed
+
+    @classmethod
+    def parse(cls, line):
+        text, name, params, salt, verifier, sealed = line.strip().split("$")
+        kdf, salt, verifier = Key_derivation.parse(f"${name}${params}${salt}${verifier}")
+        return cls(base64.b64decode(text).decode(), kdf, salt, verifier, base64.b64decode(sealed))
+
+    def line(self):
+        return (f"{_b64(self.text.encode())}${self.kdf.name}${self.kdf.params()}${_b64(self.salt)}"
+                f"${_b64(self.verifier)}${_b64(self.sealed)}")
+
+    def check(self, answer):
+        stretched = self.kdf.derive(answer, self.salt)
+        share = _xor(self.sealed, _mac(stretched, b"share"))
+        if hmac.compare_digest(_mac(stretched, b"verifier"), self.verifier):
+            return share
+        return None
+
+
+class Recovery:
+    """
+    The security questions of a vault, loaded from recovery.txt once. Answering `threshold` of them right gives back the
+    vault key. Doesn't need pandas.
+    ====================================================================================================================
+    :__init__: :param questions: list of Question
+               :param threshold: int - right answers needed
+               :param nonce: bytes - AES-GCM nonce of the wrapped key
+               :param wrapped: bytes - vault key encrypted with the recovery secret
+    create: Sets up questions for a vault key
+            :param pairs: list of (question, answer) tuples
+            :param key: bytes - vault key to wrap (contents of key.key)
+            :param threshold: int - right answers needed, more than half of the questions if not given
+            :param kdf: Scrypt_KDF or PBKDF2_KDF - stretches the answers, calibrated if not given
+            :return: Recovery
+    load: Reads recovery.txt
+          :param path: string
+          :return: Recovery
+    save: Writes recovery.txt next to the old one and renames it over it
+          :param path: string
+          :return: None
+    check: Returns the share of a question if the answer is right, see Question.check
+           :param index: int - question number
+           :param answer: string
+           :return: bytes or None
+    unwrap: Rebuilds the recovery secret from shares and decrypts the vault key
+            :param shares: dict - question number -> share returned by check
+            :return: bytes - the vault key, None if there are too few shares or they're wrong
+    ====================================================================================================================
+    """
+
+    def __init__(self, questions, threshold, nonce=b"", wrapped=b""):
+        self.questions = questions
+        self.threshold = threshold
+        self.nonce = nonce
+        self.wrapped = wrapped
+
+    @classmethod
+    def create(cls, pairs, key, threshold=None, kdf=None):
+        threshold = majority(len(pairs)) if threshold is None else threshold
+        if pairs and not 1 <= threshold <= len(pairs):
+            raise ValueError(f"threshold must be between 1 and {len(pairs)}")
+        if not pairs:
+            return cls([], 0)
+        kdf = kdf or Key_derivation.calibrate()
+        secret = os.urandom(SECRET_SIZE)
+        questions = []
+        for (text, answer), share in zip(pairs, split(secret, threshold, len(pairs))):
+            salt = os.urandom(Key_derivation.SALT_SIZE)
+            stretched = kdf.derive(answer, salt)
+            questions.append(Question(text, kdf, salt, _mac(stretched, b"verifier"),
+                                      _xor(share, _mac(stretched, b"share"))))
+        recovery = cls(questions, threshold, os.urandom(NONCE_SIZE))
+        recovery.wrapped = AESGCM(secret).encrypt(recovery.nonce, bytes(key), recovery._associated())
+        return recovery
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as recoveryFile:
+            header, *lines = recoveryFile.read().splitlines()
+        _, name, threshold, nonce, wrapped = header.split("$")
+        if name != "recovery":
+            raise ValueError(f"{path} isn't a recovery file")
+        return cls([Question.parse(line) for line in lines if line], int(threshold.split("=")[1]),
+                   base64.b64decode(nonce), base64.b64decode(wrapped))
+
+    def save(self, path):
+        lines = [f"$recovery$k={self.threshold}${_b64(self.nonce)}${_b64(self.wrapped)}"]
+        lines += [question.line() for question in self.questions]
+        with open(path + ".tmp", 'w') as recoveryFile:
+            recoveryFile.write("\n".join(lines) + "\n")
+            recoveryFile.flush()
+            os.fsync(recoveryFile.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _associated(self):
+        return "\n".join([f"k={self.threshold}"] + [question.line() for question in self.questions]).encode()
+
+    def check(self, index, answer):
+        return self.questions[index].check(answer)
+
+    def unwrap(self, shares):
+        if not self.questions or len(shares) < self.threshold:
+            return None
+        # Shamir shares are numbered from 1, questions from 0
+        secret = combine({index + 1: share for index, share in list(shares.items())[:self.threshold]})
+        try:
+            return AESGCM(secret).decrypt(self.nonce, self.wrapped, self._associated())
+        except InvalidTag:
+            return None
@@ -0,0 +1,238 @@
+import bisect
+import math
+from array import array
+
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+
+PAGE_SIZE = 50
+# least fraction of the query's trigrams a username has to contain to be a fuzzy match
+MIN_SIMILARITY = 0.5
+# most fuzzy matches kept per query, and the number of prefix matches past which fuzzy matching isn't tried
+MAX_FUZZY = 10000
+# shorter queries are matched by prefix only, they don't have a trigram of their own
+MIN_FUZZY_LENGTH = 3
+# trigrams in more than this fraction of the usernames ("com", "mai" in a vault full of gmail addresses) tell little
+# apart and have the longest postings, they're left out of fuzzy matching while the query has STOP_KEEP rarer ones
+STOP_FRACTION = 0.1
+STOP_KEEP = 3
+
+
+def trigrams(name):
+    # padded like pg_trgm so the start and end of a name count for more
+    padded = f"  {name.casefold()} "
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def query_trigrams(folded):
+    # no padding at the end, the user may still be typing the name
+    padded = "  " + folded
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+class Username_Index:
+    """
+    Searches usernames as the user types: prefix matches first, in alphabetical order, then fuzzy matches ranked by the
+    share of the query's trigrams they contain, both case-insensitive. Names are added and removed one at a time as
+    the vault changes.
+    Prefix search bisects a list of the usernames kept sorted by their casefolded form, which answers the same range
+    query a prefix trie does without a node per character. Fuzzy search keeps, for every trigram, the ids of the
+    usernames containing it in an array. Ids only grow, so the arrays stay sorted and numpy can count shared trigrams
+    and test membership without building sets. Removed names are tombstoned and the index is rebuilt once more than
+    half of the ids are dead.
+    ====================================================================================================================
+    :__init__: Builds the index
+               :param usernames: iterable of strings
+               :return: None
+    add: Adds a username, does nothing if it's already indexed
+         :param name: string
+         :return: None
+    remove: Removes a username, does nothing if it isn't indexed
+            :param name: string
+            :return: None
+    search: Returns one page of matches
+            :param query: string - an empty query lists every username
+            :param offset: int - matches to skip
+            :param limit: int - most matches returned
+            :return: tuple - (list of usernames, number of matches so far: fuzzy matches are counted from the first
+                     page that reaches the end of the prefix matches on)
+    ====================================================================================================================
+    """
+
+    def __init__(self, usernames=()):
+        self._sorted = sorted(usernames, key=str.casefold)
+        self._dead = 0
+        self._version = 0
+        self._ranked = None
+        self._build()
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def _build(self):
+        # bulk version of _insert for every name in _sorted, ids follow the sorted order
+        names = self._sorted
+        self._names = list(names)
+        self._ids = {name: ident for ident, name in enumerate(names)}
+        self._alive = bytearray(b"\x01" * len(names))
+        self._postings = {}
+        self._sizes = array("H")
+        if not names:
+            return
+        padded = [f"  {name.casefold()} " for name in names]
+        chars = np.frombuffer("\x00".join(padded).encode("utf-32-le"), dtype=np.uint32)
+        # numbers the characters in use densely (\x00 gets 0, even when a single name leaves it out), so every trigram
+        # is a small integer
+        counts = np.bincount(chars)
+        counts[0] = 1
+        present = np.flatnonzero(counts)
+        base = len(present)
+        table = np.zeros(int(present[-1]) + 1, dtype=np.int32 if base ** 3 < 1 << 31 else np.int64)
+        table[present] = np.arange(base)
+        dense = table[chars]
+        codes = (dense[:-2] * base + dense[1:-1]) * base + dense[2:]
+        lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded)) + 1
+        ids = np.repeat(np.arange(len(names), dtype=np.int32), lengths)[:len(codes)]
+        # windows running into the \x00 between two names
+        valid = (dense[:-2] != 0) & (dense[1:-1] != 0) & (dense[2:] != 0)
+        codes, ids = codes[valid], ids[valid]
+
+        # groups by trigram with a stable radix sort, 16 bits at a time, so the ids stay in order within a group
+        order = np.arange(len(codes))
+        for shift in range(0, max(1, (base ** 3 - 1).bit_length()), 16):
+            order = order[np.argsort(((codes[order] >> shift) & 0xFFFF).astype(np.uint16), kind="stable")]
+        codes, ids = codes[order], ids[order]
+        # a name holding a trigram twice has its id listed twice in a row
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (ids[1:] != ids[:-1])
+        codes, ids = codes[keep], ids[keep]
+
+        self._sizes = array("H", np.bincount(ids, minlength=len(names)).clip(max=0xFFFF).astype(np.uint16).tobytes())
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:], len(codes)]
+        characters = [chr(char) for char in present.tolist()]
+        for code, start, end in zip(codes[starts].tolist(), starts.tolist(), ends.tolist()):
+            first, rest = divmod(code, base * base)
+            gram = characters[first] + characters[rest // base] + characters[rest % base]
+            self._postings[gram] = array("i", ids[start:end].tobytes())
+
+    def _insert(self, name):
+        ident = len(self._names)
+        self._ids[name] = ident
+        self._names.append(name)
+        grams = trigrams(name)
+        self._sizes.append(min(len(grams), 0xFFFF))
+        self._alive.append(1)
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("i")
+            postings.append(ident)
+
+    def add(self, name):
+        if name in self._ids:
+            return
+        bisect.insort(self._sorted, name, key=str.casefold)
+        self._insert(name)
+        self._version += 1
+
+    def remove(self, name):
+        ident = self._ids.pop(name, None)
+        if ident is None:
+            return
+        self._alive[ident] = 0
+        self._names[ident] = None
+        # several names can share a casefolded form, step through them to the right one
+        position = bisect.bisect_left(self._sorted, name.casefold(), key=str.casefold)
+        while self._sorted[position] != name:
+            position += 1
+        del self._sorted[position]
+        self._dead += 1
+        self._version += 1
+        if self._dead * 2 > len(self._names):
+            self._dead = 0
+            self._build()
+
+    def _range(self, folded):
+        # positions in _sorted of the names starting with folded
+        low = bisect.bisect_left(self._sorted, folded, key=str.casefold)
+        high = bisect.bisect_left(self._sorted, folded + "\U0010ffff", key=str.casefold)
+        return low, high
+
+    def _fuzzy(self, folded, low, high):
+        # ids of the fuzzy matches, cached until the query or the index changes so paging through them is cheap
+        if self._ranked is None or self._ranked[:2] != (folded, self._version):
+            if len(folded) >= MIN_FUZZY_LENGTH and high - low <= MAX_FUZZY:
+                ranked = self._rank(folded)
+            else:
+                ranked = np.empty(0, dtype=np.int64)
+            self._ranked = (folded, self._version, ranked)
+        return self._ranked[2]
+
+    def _rank(self, folded):
+        grams = query_trigrams(folded)
+        found = sorted((self._postings[gram] for gram in grams if gram in self._postings), key=len)
+        common = len(self._names) * STOP_FRACTION
+        rare = sum(len(postings) <= common for postings in found)
+        counted = len(grams)
+        if rare >= STOP_KEEP:
+            counted -= len(found) - rare
+            found = found[:rare]
+        needed = math.ceil(MIN_SIMILARITY * counted)
+        # a match contains at least `needed` of the counted trigrams, so it has to contain one of the
+        # counted - needed + 1 rarest (trigrams nobody has being the rarest of all)
+        generators = len(found) - needed + 1
+        if generators <= 0:
+            return np.empty(0, dtype=np.int64)
+        if sum(map(len, found[:generators])) * 16 < sum(map(len, found)):
+            # candidates from the rare trigrams, the common ones are only checked for those candidates
+            candidates, shared = np.unique(np.concatenate(
+                [np.frombuffer(postings, dtype=np.int32) for postings in found[:generators]]), return_counts=True)
+            rest = len(found) - generators
+            for postings in found[generators:]:
+                # candidates that can't reach `needed` with the trigrams left are dropped on the way
+                keep = shared + rest >= needed
+                candidates, shared = candidates[keep], shared[keep]
+                postings = np.frombuffer(postings, dtype=np.int32)
+                places = np.searchsorted(postings, candidates).clip(max=len(postings) - 1)
+                shared += postings[places] == candidates
+                rest -= 1
+        else:
+            ids = np.concatenate([np.frombuffer(postings, dtype=np.int32) for postings in found])
+            if len(ids) * 8 < len(self._names):
+                # sorting a few ids beats counting into an array as long as the index
+                candidates, shared = np.unique(ids, return_counts=True)
+            else:
+                counts = np.bincount(ids)
+                candidates = np.flatnonzero(counts >= needed)
+                shared = counts[candidates]
+        keep = (shared >= needed) & (np.frombuffer(self._alive, dtype=np.uint8)[candidates] == 1)
+        # prefix matches are listed already. They hold every trigram of the query, so only those candidates are checked
+        complete = np.flatnonzero(keep & (shared == counted))
+        keep[complete[[self._names[ident].casefold().startswith(folded) for ident in candidates[complete].tolist()]]] = False
+        candidates, shared = candidates[keep].astype(np.int64), shared[keep].astype(np.int64)
+        # fewest missing trigrams first, then the shortest names, then by id
+        sizes = np.frombuffer(self._sizes, dtype=np.uint16)[candidates].astype(np.int64)
+        keys = ((counted - shared) << 48) | (sizes << 32) | candidates
+        if len(keys) > MAX_FUZZY:
+            keys = np.partition(keys, MAX_FUZZY)[:MAX_FUZZY]
+        keys.sort()
+        return keys & 0xFFFFFFFF
+
+    def search(self, query, offset=0, limit=PAGE_SIZE):
+        folded = query.casefold()
+        low, high = self._range(folded)
+        matches = self._sorted[min(low + offset, high):min(low + offset + limit, high)]
+        if offset + limit < high - low or not folded:
+            # fuzzy matches are only ranked once a page reaches the end of the prefix matches, until then the total
+            # counts the prefix matches alone (and any fuzzy ones already ranked for this query)
+            cached = self._ranked is not None and self._ranked[:2] == (folded, self._version)
+            return matches, high - low + (len(self._ranked[2]) if cached else 0)
+        ranked = self._fuzzy(folded, low, high)
+        start = max(0, offset - (high - low))
+        matches += [self._names[ident] for ident in ranked[start:start + limit - len(matches)].tolist()]
+        return matches, high - low + len(ranked)
@@ -0,0 +1,139 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import Metrics
+from cryptography.fernet import Fernet
+from Vault_io import entry_keys
+
+
+class Session:
+    """
+    Holds the unlocked state of a vault: key.key is read once and the ciphers built from it are cached, along with
+    whether the master password has been verified. After `timeout` seconds without use the session expires: the key
+    buffers it owns are overwritten with zeros, the ciphers are dropped and the master password has to be entered again.
+    Readers and writers use the index key for as long as they're open, they run inside hold(): an expiry meanwhile
+    locks the session at once but leaves the buffers alone until the last holder is done, then zeroes them.
+    ====================================================================================================================
+    :__init__: Initializes a locked session
+               :param keyFile: string - path of the symmetric key file
+               :param timeout: float - idle seconds before the session expires, None to never expire
+               :return: None
+    fernet: Returns the cached Fernet cipher, loading key.key if the session is locked
+            :param: None
+            :return: Fernet
+    entryKeys: Returns the cached record cipher and index key for entry layout vaults (see Vault_io)
+               :param: None
+               :return: tuple - (AESGCM, bytearray)
+    verified: Returns whether the master password was verified in this session
+              :param: None
+              :return: bool
+    verify: Marks the master password as verified
+            :param: None
+            :return: None
+    hold: Context manager keeping the key buffers handed out intact until it exits, even if the session expires
+          :param: None
+    expire: Locks the session now, zeroing the key buffers, or once nothing holds the session any more
+            :param: None
+            :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, keyFile="key.key", timeout=300):
+        self.keyFile = keyFile
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.lastUsed = 0
+        self.timer = None
+        self.rawKey = None
+        self.indexKey = None
+        self.cipher = None
+        self.recordCipher = None
+        self.unlocked = False
+        # hold() blocks in progress, and buffers of an expired session waiting for them to end
+        self.holders = 0
+        self.retired = []
+
+    def _touch(self):
+        # called with self.lock held, resets the idle clock and makes sure the expiry timer is running
+        self.lastUsed = time.monotonic()
+        if self.timeout is not None and self.timer is None:
+            self._schedule(self.timeout)
+
+    def _schedule(self, delay):
+        self.timer = threading.Timer(delay, self._check)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _check(self):
+        with self.lock:
+            self.timer = None
+            idle = time.monotonic() - self.lastUsed
+            if idle >= self.timeout:
+                self.expire()
+            else:
+                # used since the timer was set, wait out the rest of the timeout
+                self._schedule(self.timeout - idle)
+
+    def _load(self):
+        if self.rawKey is None:
+            with Metrics.timer("session.key_load"):
+                with open(self.keyFile, 'rb') as keyStorage:
+                    self.rawKey = bytearray(keyStorage.read())
+                self.cipher = Fernet(bytes(self.rawKey))
+                self.recordCipher, self.indexKey = entry_keys(self.rawKey)
+        self._touch()
+
+    def fernet(self):
+        with self.lock:
+            self._load()
+            return self.cipher
+
+    def entryKeys(self):
+        with self.lock:
+            self._load()
+            return self.recordCipher, self.indexKey
+
+    def verified(self):
+        with self.lock:
+            if self.unlocked:
+                self._touch()
+            return self.unlocked
+
+    def verify(self):
+        with self.lock:
+            self.unlocked = True
+            self._touch()
+
+    @contextmanager
+    def hold(self):
+        with self.lock:
+            self.holders += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.holders -= 1
+                self._wipe()
+
+    def _wipe(self):
+        # called with self.lock held. The buffers are zeroed in place so copies handed out earlier are wiped too
+        if not self.holders:
+            for buffer in self.retired:
+                buffer[:] = bytes(len(buffer))
+            self.retired = []
+
+    def expire(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            # the cipher objects keep their own copies of the key internally and are only dropped, the next use loads
+            # new buffers while a holder still works with the old ones
+            self.retired.extend(buffer for buffer in (self.rawKey, self.indexKey) if buffer is not None)
+            self._wipe()
+            self.rawKey = None
+            self.indexKey = None
+            self.cipher = None
+            self.recordCipher = None
+            self.unlocked = False
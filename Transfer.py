@@ -0,0 +1,195 @@
+import csv
+import json
+
+from Lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+# Column names other password managers use in their exports, checked case-insensitively in this order.
+# Bitwarden: login_username/login_password, LastPass and Chrome: username/password, 1Password: Username/Password,
+# KeePass: User Name (or Login Name)/Password, Dashlane: login/password, and our own exports: Username/Password
+USERNAME_COLUMNS = ("login_username", "username", "user name", "login name", "login", "email")
+PASSWORD_COLUMNS = ("login_password", "password")
+# optional metadata, kept when an export has it: Bitwarden name/login_uri/notes/folder, LastPass name/url/extra/grouping,
+# 1Password Title/Website, KeePass Title/URL/Notes/Group/Created/Last Modified (ISO dates), Bitwarden JSON
+# creationDate/revisionDate, and our own exports: Site/URL/Notes/Tags/Created/Modified (seconds since the epoch)
+OPTIONAL_COLUMNS = {"Site": ("site", "name", "title"), "URL": ("login_uri", "url", "website"),
+                    "Notes": ("notes", "extra", "comments"), "Tags": ("tags", "folder", "grouping", "group"),
+                    "Created": ("created", "creationdate"), "Modified": ("modified", "last modified", "revisiondate")}
+TIME_COLUMNS = ("Created", "Modified")
+CHUNK_SIZE = 50000
+
+
+class Transfer_Error(Exception):
+    '''
+    Raised when an export file can't be understood.
+    '''
+    pass
+
+
+def _pick(columns, candidates, kind):
+    lowered = {column.strip().lower(): column for column in columns}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    raise Transfer_Error(f"No {kind} column found, expected one of {', '.join(candidates)}")
+
+
+def _optional(columns):
+    # {our column: export column} for the metadata an export has, the first candidate found wins like in _pick
+    lowered = {column.strip().lower(): column for column in columns}
+    found = {}
+    for ours, candidates in OPTIONAL_COLUMNS.items():
+        for candidate in candidates:
+            if candidate in lowered:
+                found[ours] = lowered[candidate]
+                break
+    return found
+
+
+def _normalize(frame, username, password, optional=None):
+    # keeps the columns we store, as strings, and drops rows without a username
+    columns = {"Username": frame[username], "Password": frame[password]}
+    columns.update({ours: frame[theirs] for ours, theirs in (optional or {}).items()})
+    frame = pd.DataFrame(columns).fillna("").astype(str)
+    for column in TIME_COLUMNS:
+        if column in frame:
+            frame[column] = _seconds(frame[column])
+    return frame[frame["Username"] != ""]
+
+
+def _seconds(values):
+    # the vault stores seconds since the epoch (int64), dates are converted and anything else, numbers too long to
+    # fit included, is left empty, which Data_Manager.add_many stamps with the import time
+    numeric = values.str.fullmatch(r"0*\d{1,18}")
+    dates = pd.to_datetime(values.where(~numeric, ""), utc=True, errors="coerce", format="ISO8601")
+    seconds = (dates - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    return values.where(numeric, seconds.astype("Int64").astype("string").fillna("")).astype(str)
+
+
+def read_csv(source, chunksize=CHUNK_SIZE):
+    """
+    Reads a CSV export in chunks of `chunksize` rows.
+    :param source: path or text file object
+    :return: generator of dataframes with Username and Password columns, and the OPTIONAL_COLUMNS the export has
+    """
+    chunks = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize)
+    username = password = optional = None
+    for chunk in chunks:
+        if username is None:
+            username = _pick(chunk.columns, USERNAME_COLUMNS, "username")
+            password = _pick(chunk.columns, PASSWORD_COLUMNS, "password")
+            optional = _optional(chunk.columns)
+        yield _normalize(chunk, username, password, optional)
+
+
+def _json_item(item, folders):
+    # Bitwarden nests the credentials and URIs under "login" and names the folder by id, flat exports have everything
+    # at the top level under the CSV column names. Returns {our column: value} for the fields the item has.
+    login = item.get("login")
+    if not isinstance(login, dict):
+        # Dashlane's "login" is the username itself
+        login = item
+    username = next((login[key] for key in login if key.lower() in USERNAME_COLUMNS), None)
+    password = next((login[key] for key in login if key.lower() in PASSWORD_COLUMNS), None)
+    row = {"Username": username, "Password": password}
+    for ours, theirs in _optional(item).items():
+        row[ours] = item[theirs]
+    uris = login.get("uris")
+    if "URL" not in row and uris:
+        row["URL"] = uris[0].get("uri") if isinstance(uris[0], dict) else uris[0]
+    if "Tags" not in row and item.get("folderId") in folders:
+        row["Tags"] = folders[item["folderId"]]
+    return {ours: "" if value is None else str(value) for ours, value in row.items()}
+
+
+def read_json(source, chunksize=CHUNK_SIZE):
+    """
+    Reads a JSON export in chunks of `chunksize` entries. JSON Lines files (one object per line) are streamed, a
+    single JSON document (a list of entries, or Bitwarden's {"items": [...]}) has to be parsed in one go.
+    :param source: path or text file object
+    :return: generator of dataframes with Username and Password columns, and the OPTIONAL_COLUMNS the entries have
+    """
+    handle = open(source, encoding="utf-8") if isinstance(source, str) else source
+    try:
+        folders = {}
+        first = handle.read(1)
+        while first.isspace():
+            first = handle.read(1)
+        if first == "{":
+            # either JSON Lines or one document, find out from the first line
+            line = first + handle.readline()
+            try:
+                document = json.loads(line)
+                lines = True
+            except json.JSONDecodeError:
+                document = json.loads(line + handle.read())
+                lines = False
+            if lines and "items" not in document:
+                items = _chain_lines(document, handle)
+            else:
+                items = iter(document.get("items", []))
+                folders = {folder.get("id"): folder.get("name") for folder in document.get("folders", [])}
+        elif first == "[":
+            items = iter(json.loads(first + handle.read()))
+        elif first == "":
+            return
+        else:
+            raise Transfer_Error("Not a JSON export")
+
+        rows = []
+        for item in items:
+            row = _json_item(item, folders)
+            if row["Username"]:
+                rows.append(row)
+            if len(rows) == chunksize:
+                yield _json_frame(rows)
+                rows = []
+        if rows:
+            yield _json_frame(rows)
+    finally:
+        if handle is not source:
+            handle.close()
+
+
+def _json_frame(rows):
+    frame = pd.DataFrame(rows).fillna("")
+    return _normalize(frame, "Username", "Password", {ours: ours for ours in OPTIONAL_COLUMNS if ours in frame})
+
+
+def _chain_lines(first, handle):
+    yield first
+    for line in handle:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read(source, fmt=None, chunksize=CHUNK_SIZE):
+    """
+    Reads an export, picking the parser from `fmt` ("csv" or "json") or from the file extension.
+    :return: generator of dataframes with Username and Password columns, and the OPTIONAL_COLUMNS the export has
+    """
+    if fmt is None:
+        fmt = "json" if str(source).lower().endswith((".json", ".jsonl")) else "csv"
+    if fmt == "json":
+        return read_json(source, chunksize)
+    if fmt == "csv":
+        return read_csv(source, chunksize)
+    raise Transfer_Error(f"Unknown export format {fmt}")
+
+
+def write_csv(stream, chunks, columns=("Username", "Password")):
+    """
+    Writes rows as CSV with a header line.
+    :param stream: text file object
+    :param chunks: iterable of lists of rows
+    :param columns: header, one name per field of the rows
+    :return: int - number of rows written
+    """
+    writer = csv.writer(stream)
+    writer.writerow(columns)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
@@ -1,210 +1,386 @@
-import tkinter as tk
-import time
-from pandas import DataFrame
-from OS_interface import System, MasterPasswordError
-from Dataframe import Data_Manager
-
-class GUI:
-    """
-    KEY:
-        * denotes that a function has been completed
-        ! denotes that a function is a work in progress
-        (function names that start with _) denotes that a function is primarily intended to be utilized within the
-                              class, not to called externally (you *can* if you really want to but it might break
-                              something, as these functions are also called within other functions and some aren't
-                              meant to be called twice)
-
-    ====================================================================================================================
-    * :__init__: Initializes class object
-
-    * update_pass_csv: Updates password csv file
-
-    * clear_frame: Clears the window of all widgets currently in the window 
-                   (except for the menu buttons at the top)
-    
-    * _grid_frame: Grids the frame in its designated place
-
-    * get_input: GUI replacement of python input function
-
-    * _store_result: Stores the result for the get_input function
-
-    * create_interfaces: Creates OS interface with password file and conducts master password authentication
-
-    * _authenticate: Authenticates user
-
-    * display_help: Displays the instructions on the GUI 
-                   (Instruction message is in a work in progress)
-
-    * retrieve_pass: Retrieves a password for the user
-
-    * add_pass: Adds a password for the user (takes a parameter for custom password or not)
-
-    * remove_pass: Removes a password for the user
-
-    * list_usernames: Lists usernames of the user
-
-    * factory_reset: Reset to initial system state
-    """
-    instructions = ("Welcome to the Password Manager!\n"
-                    "When first entering the password manager, you will be prompted to set up a master password and security questions.\n"
-                    "To access other features of the manager, you will be asked to enter your master password.\n"
-                    "To retrieve, remove, or generate a password, click the corresponding button and enter the associated username.\n"
-                    "To add a custom password, click the corresponding button and enter your username/password.\n"
-                    "To list all your usernames, click the corresponding button.\n")
-
-    def __init__(self):
-        #self.sys_obj = System(name="password.csv")
-        self.authenticated = False
-        self.root = tk.Tk()
-        self.root.title("Password Manager")
-        self.root.resizable(False, False)
-        self.main_frame = tk.Frame(self.root)
-        # button_frame = tk.Frame(self.root)
-        width = self.root.winfo_screenwidth()
-        height = self.root.winfo_screenheight()
-
-        # Chosen so window is essentially centered on the screen
-        top_left = (width//6, height//10)
-        self.root.geometry(f"{(2*width)//3}x{(2*height)//3}+{top_left[0]}+{top_left[1]}")
-        menu = tk.Menu(self.root)
-        menu.add_command(label="Help", command=self.display_help)
-        menu.add_command(label="Retrieve Password", command=self.retrieve_pass)
-        menu.add_command(label="Add Custom Password", command=self.add_pass)
-        menu.add_command(label="Remove Password", command=self.remove_pass)
-        menu.add_command(label="Generate Password", command=lambda: self.add_pass(custom=False))
-        menu.add_command(label="List Usernames", command=self.list_usernames)
-        menu.add_command(label="Factory Reset", command=self.factory_reset)
-        self.root.config(menu=menu)
-
-        self.root.after(1000, self.create_interfaces)
-        self.root.mainloop()
-        self.update_pass_csv()
-        
-    def update_pass_csv(self):
-        self.pass_int.fileClose(self.manager.dataframe)
-
-    def clear_frame(self):
-        self.main_frame.destroy()
-        self.main_frame = tk.Frame(self.root)
-    
-    def _grid_frame(self, x=0.3, y=0.1):
-        self.main_frame.place(relx=x, rely=y)
-
-    def get_input(self, prompt):
-        """
-        :param prompt: Input prompt
-        :return: str, User input string
-        """
-        self.result = tk.StringVar()
-        self.clear_frame()
-        tk.Label(self.main_frame, text=prompt).grid(row=0)
-        self.txtbox = tk.Text(self.main_frame, height=1, width=30)
-        self.txtbox.grid(row=1, pady=10)
-        self._grid_frame()
-        tk.Button(self.main_frame, text="Enter", command=self._store_result).grid(row=1, column=1)
-        self.txtbox.bind("<Return>", lambda event: self._store_result())
-        self.root.update()
-        self.root.wait_variable(self.result)
-        self.clear_frame()
-        val = self.result.get()
-        print(val)
-        return val
-    
-    def _store_result(self):
-        result = self.txtbox.get("1.0", "end").strip().replace("\r", "")
-        self.txtbox.delete("1.0", "end")
-        if result:
-            self.result.set(result)
-
-    def create_interfaces(self):
-        self.pass_int = System(name="password.csv", get_input=self.get_input)
-        self._authenticate()
-    
-    def _authenticate(self):
-        while not self.authenticated:
-            try:
-                df = self.pass_int.fileOpen()
-                df.columns = ("Username", "Password")
-                self.manager = Data_Manager(df, input_function=self.get_input)
-                self.authenticated = True
-                self.update_pass_csv()
-            except MasterPasswordError:
-                self.clear_frame()
-                tk.Label(self.main_frame, text="Authentication Failed.").grid()
-                self._grid_frame()
-                self.root.update()
-                time.sleep(1)
-
-    def display_help(self):
-        if self.authenticated:
-            self.clear_frame()
-            tk.Label(self.main_frame, text=self.instructions).pack()
-            self._grid_frame(x=0.2)
-
-    def retrieve_pass(self, prompt="view"):
-        if self.authenticated:
-            self.clear_frame()
-            username = self.get_input(f"Enter the username of the password you would like to {prompt}.")
-            result = self.manager.retrieve(username)
-            if result.empty:
-                tk.Label(self.main_frame, text=f"No passwords with username {username}").grid(row=0)
-                self._grid_frame()
-                return username, False
-            result = result["Password"].to_string(index=False)
-            #result = " username  password\n        1         2\n        2         3\n        4         5"
-            if prompt == "view":
-                tk.Label(self.main_frame, text=f"Passwords for {username}", font="BOLD").grid(row=0)
-                tk.Label(self.main_frame, text=result).grid(row=1)
-                self._grid_frame()
-            return username, result
-    
-    def add_pass(self, custom=True):
-        if self.authenticated:
-            self.clear_frame()
-            username = self.get_input("Enter the username of the new password.")
-            if custom:
-                password = self.get_input("Enter the password.")
-            else:
-                password = self.manager.pwrandom()
-            self.manager.add(username, password)
-            self.update_pass_csv()
-            tk.Label(self.main_frame, text="Password Stored!").grid(row=0)
-            self._grid_frame()
-    
-    def remove_pass(self):
-        if self.authenticated:
-            username, result = self.retrieve_pass(prompt="delete")
-            if result is not False:
-                choice = ""
-                while choice != "Y" and choice != "N":
-                    choice = self.get_input(f"The password is {result}.\n\nAre you sure you would like to delete this? (Enter Y/N)")
-                if choice.upper() == "Y":
-                    self.manager.remove(username)
-                    self.update_pass_csv()
-                    tk.Label(self.main_frame, text="Deleted!").grid(row=0)
-                    self._grid_frame()
-                else:
-                    tk.Label(self.main_frame, text="No modifications were made.").grid(row=0)
-                    self._grid_frame()
-    
-    def list_usernames(self):
-        if self.authenticated:
-            self.clear_frame()
-            names = self.manager.dataframe["Username"]
-            if names.empty:
-                tk.Label(self.main_frame, text="No usernames or passwords stored.").grid(row=0)
-            else:
-                tk.Label(self.main_frame, text="Usernames", font="BOLD").grid(row=0)
-                tk.Label(self.main_frame, text=names.to_string(index=False)).grid(row=1)
-            self._grid_frame()
-    
-    def factory_reset(self):
-        self.clear_frame()
-        answer = self.get_input("Are you sure? This cannot be undone!\nEnter 'Y' or 'yes' if you would like to do this.")
-        if answer.upper() in {"Y", "YES"}:
-            self.authenticated = False
-            self.pass_int.factoryReset()
-            self._authenticate()
-
-if __name__ == "__main__":
+import signal
+import tkinter as tk
+from pandas import DataFrame
+import Metrics
+from OS_interface import System, MasterPasswordError
+from Dataframe import Data_Manager, USERNAME, PASSWORD, SITE, URL, NOTES, TAGS
+from Worker import Worker, Coalescer, Debouncer, Cancelled
+from Virtual_list import Virtual_Table
+
+# changes are written once the user paused for SAVE_DELAY milliseconds, and never later than SAVE_LIMIT milliseconds
+SAVE_DELAY = 500
+SAVE_LIMIT = 5000
+# (column, heading, width in pixels) of the entry list and of the table retrieve_pass shows
+LIST_HEADINGS = ((USERNAME, "Username", 280), (SITE, "Site", 200), (TAGS, "Tags", 140))
+ENTRY_HEADINGS = ((SITE, "Site", 180), (PASSWORD, "Password", 200), (URL, "URL", 220), (NOTES, "Notes", 200))
+
+class GUI:
+    """
+    KEY:
+        * denotes that a function has been completed
+        ! denotes that a function is a work in progress
+        (function names that start with _) denotes that a function is primarily intended to be utilized within the
+                              class, not to called externally (you *can* if you really want to but it might break
+                              something, as these functions are also called within other functions and some aren't
+                              meant to be called twice)
+
+    ====================================================================================================================
+    * :__init__: Initializes class object
+
+    * update_pass_csv: Updates password csv file (single changes go to the journal through System.fileAppend, this
+                       rewrites the whole file). Blocks, only used once the window is closed and a journal write failed.
+
+    * _record: Queues a single change for the journal, written in the background in batches once the user paused
+               (SAVE_DELAY), or at the latest SAVE_LIMIT after the change
+
+    * _write: Runs a save on the worker thread and marks the changes it included as saved
+
+    * _flush: Final save once the window is gone, writes whatever changed since the last save (nothing if the vault
+              wasn't changed)
+
+    * _close: Closes the window on SIGINT/SIGTERM, the final save then runs like it does when the window is closed
+
+    * _heartbeat: Gives Python a chance to run signal handlers while Tk waits on the user
+
+    * _build_views: Builds every screen of the window once, they're shown and hidden from then on instead of being
+                    destroyed and rebuilt
+
+    * clear_frame: Hides the screen currently in the window (except for the menu buttons at the top)
+
+    * _show: Shows one of the screens built by _build_views
+
+    * _message: Shows a message, with a button if given
+
+    * _grid_frame: Grids the frame in its designated place
+
+    * get_input: GUI replacement of python input function (reuses the same prompt screen every time)
+
+    * _store_result: Stores the result for the get_input function
+
+    * create_interfaces: Creates OS interface with password file and conducts master password authentication
+                         (in the background, System's prompts are answered through the worker)
+
+    * _authenticate: Authenticates user in the background, retries a second after a wrong password
+
+    * _cancelled: Restores the window after the user cancelled a background job
+
+    * display_help: Displays the instructions on the GUI 
+                   (Instruction message is in a work in progress)
+
+    * retrieve_pass: Retrieves the passwords of a username, shown in a table with one row per site
+
+    * _entries_page: Fetches one page of the retrieved username's entries for the table
+
+    * add_pass: Adds a password for the user (takes a parameter for custom password or not)
+
+    * remove_pass: Removes a password for the user
+
+    * list_usernames: Lists the entries of the user in a scrolling table that only holds the visible rows, narrowed
+                      down by prefix and fuzzy search on the username as the user types and sorted by clicking a
+                      column heading (double click an entry to see its password)
+
+    * _search_page: Fetches one page of search results for the table
+
+    * _show_passwords: Shows the password of the entry picked from the table
+
+    * factory_reset: Reset to initial system state
+    """
+    instructions = ("Welcome to the Password Manager!\n"
+                    "When first entering the password manager, you will be prompted to set up a master password and security questions.\n"
+                    "To access other features of the manager, you will be asked to enter your master password.\n"
+                    "To retrieve, remove, or generate a password, click the corresponding button and enter the associated username.\n"
+                    "To add a custom password, click the corresponding button and enter your username/password.\n"
+                    "To list all your usernames, click the corresponding button.\n")
+
+    def __init__(self):
+        #self.sys_obj = System(name="password.csv")
+        self.authenticated = False
+        self.root = tk.Tk()
+        self.root.title("Password Manager")
+        self.root.resizable(False, False)
+        self._build_views()
+        # button_frame = tk.Frame(self.root)
+        width = self.root.winfo_screenwidth()
+        height = self.root.winfo_screenheight()
+
+        # Chosen so window is essentially centered on the screen
+        top_left = (width//6, height//10)
+        self.root.geometry(f"{(2*width)//3}x{(2*height)//3}+{top_left[0]}+{top_left[1]}")
+        menu = tk.Menu(self.root)
+        menu.add_command(label="Help", command=self.display_help)
+        menu.add_command(label="Retrieve Password", command=self.retrieve_pass)
+        menu.add_command(label="Add Custom Password", command=self.add_pass)
+        menu.add_command(label="Remove Password", command=self.remove_pass)
+        menu.add_command(label="Generate Password", command=lambda: self.add_pass(custom=False))
+        menu.add_command(label="List Usernames", command=self.list_usernames)
+        menu.add_command(label="Factory Reset", command=self.factory_reset)
+        self.root.config(menu=menu)
+
+        # all System calls go through the worker thread, the main loop only ever waits on the user
+        self.worker = Worker(self.root, self.get_input, cancelled=self._cancelled)
+        self.changes = []
+        # version of the manager the last submitted save brings the vault up to, see _flush
+        self.submitted = 0
+        self.journal_writer = Debouncer(self.root, Coalescer(self.worker, self._prepare_changes, failed=self._failed,
+                                                             label="Saving change..."),
+                                        delay=SAVE_DELAY, limit=SAVE_LIMIT)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self._close)
+        self.root.after(1000, self.create_interfaces)
+        self.root.after(200, self._heartbeat)
+        try:
+            self.root.mainloop()
+        finally:
+            # nothing can answer the worker's prompts anymore, so a job waiting on one is cancelled before waiting for
+            # the worker, then the final save runs here
+            self.worker.cancelled = None
+            self.worker.cancel()
+            self.worker.shutdown()
+            self._flush()
+        
+    def update_pass_csv(self):
+        self.pass_int.fileClose(self.manager.dataframe)
+        self.manager.mark_saved(self.manager.version)
+
+    def _record(self, op, username, password=None, *fields):
+        self.changes.append((op, username, password) + fields)
+        self.journal_writer.request()
+
+    def _prepare_changes(self):
+        if not self.authenticated or not self.changes:
+            return None
+        changes, self.changes = self.changes, []
+        self.submitted = self.manager.version
+        return self._write, (self.pass_int.fileAppendMany, (changes,), self.submitted)
+
+    def _write(self, function, args, version):
+        # marked here rather than in a done callback, those are skipped for jobs still running when the window closes
+        function(*args)
+        self.manager.mark_saved(version)
+
+    def _flush(self):
+        if not self.authenticated or not self.manager.dirty:
+            return
+        if self.manager.saved_version == self.submitted:
+            # every save submitted so far made it to disk, only the changes still held back are missing
+            self.pass_int.fileAppendMany(self.changes)
+            self.changes = []
+            self.manager.mark_saved(self.manager.version)
+        else:
+            # a save failed or was dropped when the worker shut down, rewriting the vault covers every change
+            self.update_pass_csv()
+
+    def _close(self, signum, frame):
+        try:
+            self.root.destroy()
+        except tk.TclError:
+            # already closing
+            pass
+
+    def _heartbeat(self):
+        # signal handlers only run when Python code does, a prompt waiting in wait_variable never returns to it
+        self.root.after(200, self._heartbeat)
+
+    def _failed(self, error):
+        if not isinstance(error, Cancelled):
+            self.root.report_callback_exception(type(error), error, error.__traceback__)
+
+    def _cancelled(self):
+        self.journal_writer.reset()
+        if self.worker.asking is not None:
+            # release the prompt the cancelled job was waiting on
+            self.result.set("")
+        if not self.authenticated:
+            self._message("Cancelled.", "Unlock", self.create_interfaces)
+
+    def _build_views(self):
+        self.views = {name: tk.Frame(self.root) for name in ("message", "prompt", "list", "entries")}
+        view = self.views["message"]
+        self.message = tk.Label(view)
+        self.message.grid(row=0)
+        self.message_button = tk.Button(view)
+
+        view = self.views["prompt"]
+        self.prompt = tk.Label(view)
+        self.prompt.grid(row=0)
+        self.txtbox = tk.Text(view, height=1, width=30)
+        self.txtbox.grid(row=1, pady=10)
+        tk.Button(view, text="Enter", command=self._store_result).grid(row=1, column=1)
+        self.txtbox.bind("<Return>", lambda event: self._store_result())
+
+        view = self.views["list"]
+        tk.Label(view, text="Entries", font="BOLD").grid(row=0)
+        self.query = tk.StringVar()
+        self.search = tk.Entry(view, textvariable=self.query, width=50)
+        self.search.grid(row=1, pady=5)
+        self.results = Virtual_Table(view, self._search_page, LIST_HEADINGS, select=self._show_passwords)
+        self.results.frame.grid(row=2)
+        self.matches = tk.Label(view)
+        self.matches.grid(row=3)
+        self.selected = tk.Label(view)
+        self.selected.grid(row=4, pady=5)
+        # every keystroke runs a search, they take a few milliseconds even on very large vaults
+        self.query.trace_add("write", lambda *args: self.results.reset())
+
+        view = self.views["entries"]
+        self.entries_title = tk.Label(view, font="BOLD")
+        self.entries_title.grid(row=0)
+        self.entries_username = None
+        self.entries = Virtual_Table(view, self._entries_page, ENTRY_HEADINGS, rows=10)
+        self.entries.frame.grid(row=1, pady=5)
+        self.main_frame = self.views["message"]
+
+    def clear_frame(self):
+        # hidden, not destroyed, the widgets are reused the next time the screen is shown
+        self.main_frame.place_forget()
+
+    def _show(self, name, x=0.3, y=0.1):
+        self.clear_frame()
+        self.main_frame = self.views[name]
+        self._grid_frame(x, y)
+
+    def _message(self, text, button=None, command=None, x=0.3):
+        self.message.config(text=text)
+        if button is None:
+            self.message_button.grid_remove()
+        else:
+            self.message_button.config(text=button, command=command)
+            self.message_button.grid(row=1, pady=10)
+        self._show("message", x=x)
+    
+    def _grid_frame(self, x=0.3, y=0.1):
+        self.main_frame.place(relx=x, rely=y)
+
+    def get_input(self, prompt):
+        """
+        :param prompt: Input prompt
+        :return: str, User input string
+        """
+        self.result = tk.StringVar()
+        self.prompt.config(text=prompt)
+        self.txtbox.delete("1.0", "end")
+        self._show("prompt")
+        self.txtbox.focus_set()
+        self.root.update()
+        self.root.wait_variable(self.result)
+        self.clear_frame()
+        val = self.result.get()
+        return val
+    
+    def _store_result(self):
+        result = self.txtbox.get("1.0", "end").strip().replace("\r", "")
+        self.txtbox.delete("1.0", "end")
+        if result:
+            self.result.set(result)
+
+    def create_interfaces(self):
+        self.clear_frame()
+        if hasattr(self, "pass_int"):
+            self._authenticate()
+        else:
+            self.worker.submit(self._create_system, done=lambda result: self._authenticate(), failed=self._failed,
+                               label="Loading vault...")
+
+    def _create_system(self):
+        self.pass_int = System(name="password.csv", get_input=self.worker.ask)
+
+    def _authenticate(self):
+        if not self.authenticated:
+            self.worker.submit(self.pass_int.fileOpen, done=self._authenticated, failed=self._authentication_failed,
+                               label="Decrypting vault...")
+
+    def _authenticated(self, df):
+        self.manager = Data_Manager(df, input_function=self.get_input)
+        self.submitted = 0
+        self.authenticated = True
+
+    def _authentication_failed(self, error):
+        if not isinstance(error, MasterPasswordError):
+            self._failed(error)
+            return
+        self._message("Authentication Failed.")
+        self.root.after(1000, self._authenticate)
+
+    def display_help(self):
+        if self.authenticated:
+            self._message(self.instructions, x=0.2)
+
+    def retrieve_pass(self, prompt="view"):
+        if self.authenticated:
+            self.clear_frame()
+            username = self.get_input(f"Enter the username of the password you would like to {prompt}.")
+            result = self.manager.retrieve(username)
+            if result.empty:
+                self._message(f"No passwords with username {username}")
+                return username, False
+            if prompt == "view":
+                self.entries_username = username
+                self.entries_title.config(text=f"Passwords for {username}")
+                self.entries.reset()
+                self._show("entries")
+            return username, result["Password"].to_string(index=False)
+
+    def _entries_page(self, offset, limit, sort, descending):
+        return self.manager.entries(username=self.entries_username, sort=sort, descending=descending, offset=offset,
+                                    limit=limit)
+    
+    def add_pass(self, custom=True):
+        if self.authenticated:
+            self.clear_frame()
+            username = self.get_input("Enter the username of the new password.")
+            if custom:
+                password = self.get_input("Enter the password.")
+            else:
+                password = self.manager.pwrandom()
+            self._record("add", *self.manager.add(username, password))
+            self._message("Password Stored!")
+    
+    def remove_pass(self):
+        if self.authenticated:
+            username, result = self.retrieve_pass(prompt="delete")
+            if result is not False:
+                choice = ""
+                while choice != "Y" and choice != "N":
+                    choice = self.get_input(f"The password is {result}.\n\nAre you sure you would like to delete this? (Enter Y/N)")
+                if choice.upper() == "Y":
+                    self.manager.remove(username)
+                    self._record("remove", username)
+                    self._message("Deleted!")
+                else:
+                    self._message("No modifications were made.")
+    
+    def list_usernames(self):
+        if self.authenticated:
+            if not len(self.manager.store):
+                self._message("No usernames or passwords stored.")
+                return
+            self.selected.config(text="")
+            # the search box's trace refreshes the table, with whatever changed since it was last shown
+            self.query.set("")
+            self._show("list")
+            self.search.focus_set()
+
+    def _search_page(self, offset, limit, sort, descending):
+        rows, total = self.manager.entries(self.query.get(), sort=sort, descending=descending, offset=offset,
+                                           limit=limit)
+        self.matches.config(text=f"{total} matches" if self.query.get() else f"{total} entries")
+        return rows, total
+
+    def _show_passwords(self, row):
+        site = f" on {row[SITE]}" if row[SITE] else ""
+        self.selected.config(text=f"Password for {row[USERNAME]}{site}\n{row[PASSWORD]}")
+    
+    def factory_reset(self):
+        self.clear_frame()
+        answer = self.get_input("Are you sure? This cannot be undone!\nEnter 'Y' or 'yes' if you would like to do this.")
+        if answer.upper() in {"Y", "YES"}:
+            self.authenticated = False
+            self.changes = []
+            # queued behind any save still running, firstTime's prompts come back through the worker
+            self.worker.submit(self.pass_int.factoryReset, done=lambda result: self._authenticate(),
+                               failed=self._failed, label="Resetting...")
+
+if __name__ == "__main__":
+    Metrics.start_session()
     GUI()
\ No newline at end of file
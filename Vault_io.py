@@ -0,0 +1,546 @@
+import array
+import base64
+import bisect
+import hashlib
+import io
+import itertools
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+try:
+    import zstandard
+except ImportError:
+    # zstd is optional, block vaults are compressed with zlib without it
+    zstandard = None
+
+# Streamed vault container:
+#   MAGIC | version | sequence | frame | frame | ... | end frame
+# every frame is a 4 byte big endian length followed by a Fernet token holding one chunk of the plaintext, and the
+# end frame is a zero length. The sequence number is the last journal record folded into this snapshot (version 1
+# files have no sequence number). Files that don't start with MAGIC are legacy vaults (one Fernet token for the whole
+# file).
+MAGIC = b"S230VLT"
+VERSION = 2
+SEQUENCE = struct.Struct(">Q")
+FRAME_HEADER = struct.Struct(">I")
+CHUNK_SIZE = 1 << 20
+
+# Entry vault container (random access):
+#   MAGIC | version 3 | sequence | count | index offset | record | record | ... | index
+# every record is a 12 byte nonce, a 4 byte length and the AES-GCM ciphertext of one row (length prefixed UTF-8 fields),
+# with the record's offset as associated data so records can't be swapped around. The index is `count` fixed width
+# entries of an 8 byte blinded username (keyed BLAKE2b of the username) and the record offset, sorted by the blinded username
+# so a lookup is a binary search over the mapped file and one decryption. Both keys are derived from key.key.
+ENTRY_VERSION = 3
+ENTRY_HEADER = struct.Struct(">QQ")
+RECORD_HEADER = struct.Struct(">12sI")
+INDEX_ENTRY = struct.Struct(">QQ")
+FIELD = struct.Struct(">I")
+
+# Block vault container (compact, whole vault loads):
+#   MAGIC | version 4 | sequence | codec | frame | frame | ...
+# every frame is a 12 byte nonce, a 4 byte length and the AES-GCM ciphertext of one compressed block of up to
+# BLOCK_ROWS rows. A block is stored by column: the row and column counts, then every column's field lengths as 4 byte
+# big endian integers, then every column's UTF-8 fields separated by a NUL byte, so it's read without parsing any text
+# and a comma, quote or newline in a password is just another byte. The lengths are what delimits the fields, the
+# separators let a column without a NUL in any field be split in one call instead of sliced field by field. The
+# associated data of a frame is the container header, the frame number and whether it's the last frame, so frames
+# can't be reordered, dropped or cut off the end. An empty vault is a single empty block.
+BLOCK_VERSION = 4
+CODEC = struct.Struct(">B")
+BLOCK_HEADER = struct.Struct(">II")
+FRAME_NUMBER = struct.Struct(">Q?")
+BLOCK_ROWS = 1 << 16
+CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD = 0, 1, 2
+DEFAULT_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def read_header(fileobj):
+    # returns (version, sequence) and leaves fileobj at the first frame, version 0 means a legacy vault
+    start = fileobj.read(len(MAGIC) + 1)
+    if len(start) < len(MAGIC) + 1 or not start.startswith(MAGIC):
+        fileobj.seek(0)
+        return 0, 0
+    version = start[-1]
+    if version == 1:
+        return version, 0
+    return version, SEQUENCE.unpack(fileobj.read(SEQUENCE.size))[0]
+
+
+def open_vault(fileobj, key, keys):
+    # returns the reader matching the file's layout, both have .sequence and close fileobj when they're closed
+    version = read_header(fileobj)[0]
+    fileobj.seek(0)
+    if version == ENTRY_VERSION:
+        return Entry_Reader(fileobj, keys)
+    if version == BLOCK_VERSION:
+        return Block_Reader(fileobj, keys)
+    return Encrypted_Reader(fileobj, key)
+
+
+def entry_keys(rawKey):
+    # splits key.key into an AES-GCM key for the records and a MAC key for the index, returned as (cipher, key)
+    material = bytearray(HKDF(algorithm=hashes.SHA256(), length=64, salt=None,
+                              info=b"sys230 entry vault").derive(base64.urlsafe_b64decode(bytes(rawKey))))
+    keys = AESGCM(bytes(material[:32])), material[32:]
+    material[:32] = bytes(32)
+    return keys
+
+
+def blind(indexKey, username):
+    return int.from_bytes(hashlib.blake2b(username.encode(), digest_size=8, key=indexKey).digest(), "big")
+
+
+def pack_fields(fields):
+    encoded = [field.encode() for field in fields]
+    return b"".join([FIELD.pack(len(field)) + field for field in encoded])
+
+
+def unpack_fields(data):
+    fields = []
+    position = 0
+    while position < len(data):
+        (length,) = FIELD.unpack_from(data, position)
+        position += FIELD.size
+        fields.append(data[position:position + length].decode())
+        position += length
+    return fields
+
+
+def compress(codec, data):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 1)
+    return data
+
+
+def decompress(codec, data):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("This vault is compressed with zstd, install the zstandard package to open it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def pack_columns(columns):
+    # one block: counts, every column's field lengths, every column's fields
+    count = len(columns[0]) if columns else 0
+    lengths = []
+    encoded = []
+    for column in columns:
+        text = "\x00".join(column)
+        data = text.encode()
+        if len(data) == len(text):
+            # ASCII, the character counts are the byte counts
+            lengths.append(struct.pack(f">{count}I", *map(len, column)))
+        else:
+            lengths.append(struct.pack(f">{count}I", *[len(field.encode()) for field in column]))
+        encoded.append(data)
+    return BLOCK_HEADER.pack(count, len(columns)) + b"".join(lengths) + b"".join(encoded)
+
+
+def unpack_columns(data):
+    count, width = BLOCK_HEADER.unpack_from(data)
+    lengths = struct.unpack_from(f">{count * width}I", data, BLOCK_HEADER.size)
+    position = BLOCK_HEADER.size + FIELD.size * count * width
+    columns = []
+    for column in range(width):
+        own = lengths[column * count:(column + 1) * count]
+        size = sum(own) + max(count - 1, 0)
+        text = data[position:position + size].decode()
+        if not count:
+            columns.append([])
+        elif text.count("\x00") == count - 1:
+            columns.append(text.split("\x00"))
+        else:
+            # a field holds a NUL itself, so the lengths have to be followed
+            starts = list(itertools.accumulate((length + 1 for length in own), initial=position))
+            columns.append([data[start:start + length].decode() for start, length in zip(starts, own)])
+        position += size
+    return columns
+
+
+def unpack_rows(data, first):
+    # the rows of one block whose first field is `first`, found in the packed first column without decoding the block
+    count, width = BLOCK_HEADER.unpack_from(data)
+    lengths = array.array("I", data[BLOCK_HEADER.size:BLOCK_HEADER.size + FIELD.size * count * width])
+    if sys.byteorder == "little":
+        lengths.byteswap()
+    starts = [BLOCK_HEADER.size + FIELD.size * count * width]
+    for column in range(width):
+        starts.append(starts[-1] + sum(lengths[column * count:(column + 1) * count]) + max(count - 1, 0))
+    names = data[starts[0]:starts[1]] if width else b""
+    if not count or names.count(b"\x00") != count - 1:
+        return [list(row) for row in zip(*unpack_columns(data)) if row[0] == first]
+    # every name between two NULs, the row is the number of NULs before it
+    names = b"\x00" + names + b"\x00"
+    needle = b"\x00" + first.encode() + b"\x00"
+    found = []
+    position = names.find(needle)
+    while position >= 0:
+        row = names.count(b"\x00", 0, position)
+        fields = []
+        for column in range(width):
+            # a field follows the fields above it in its column and the NULs between them
+            offset = starts[column] + sum(lengths[column * count:column * count + row]) + row
+            fields.append(data[offset:offset + lengths[column * count + row]].decode())
+        found.append(fields)
+        position = names.find(needle, position + len(needle) - 1)
+    return found
+
+
+class Encrypted_Writer(io.RawIOBase):
+    """
+    Write-only binary stream that encrypts everything written to it in CHUNK_SIZE frames, so at most one chunk of
+    plaintext is buffered at a time. Wrap it in io.TextIOWrapper to hand it to DataFrame.to_csv.
+    ====================================================================================================================
+    :__init__: :param fileobj: binary file object the container is written to
+               :param key: Fernet - cipher used for every frame
+               :param chunk_size: int - plaintext bytes per frame
+               :param sequence: int - last journal record included in this snapshot
+    ====================================================================================================================
+    """
+
+    def __init__(self, fileobj, key, chunk_size=CHUNK_SIZE, sequence=0):
+        super().__init__()
+        self.fileobj = fileobj
+        self.key = key
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.fileobj.write(MAGIC + bytes([VERSION]) + SEQUENCE.pack(sequence))
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            self._frame(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+        return len(data)
+
+    def _frame(self, chunk):
+        token = self.key.encrypt(chunk)
+        self.fileobj.write(FRAME_HEADER.pack(len(token)))
+        self.fileobj.write(token)
+
+    def close(self):
+        if not self.closed:
+            if self.buffer:
+                self._frame(bytes(self.buffer))
+                self.buffer.clear()
+            self.fileobj.write(FRAME_HEADER.pack(0))
+        super().close()
+
+
+class Encrypted_Reader(io.RawIOBase):
+    """
+    Read-only binary stream that decrypts a vault one frame at a time. Legacy single token vaults are decrypted in one
+    go since Fernet can't decrypt a token partially. The snapshot's journal sequence number is kept in .sequence
+    ====================================================================================================================
+    :__init__: :param fileobj: binary file object positioned at the start of the vault
+               :param key: Fernet - cipher used for every frame
+    ====================================================================================================================
+    """
+
+    def __init__(self, fileobj, key):
+        super().__init__()
+        self.fileobj = fileobj
+        self.key = key
+        self.chunk = b""
+        self.position = 0
+        self.finished = False
+        version, self.sequence = read_header(fileobj)
+        if not version:
+            # legacy vault
+            encrypted = fileobj.read()
+            self.chunk = self.key.decrypt(encrypted) if encrypted else b""
+            self.finished = True
+
+    def readable(self):
+        return True
+
+    def close(self):
+        if not self.closed:
+            self.fileobj.close()
+        super().close()
+
+    def _next_frame(self):
+        header = self.fileobj.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise EOFError("Vault ended before its end frame")
+        (length,) = FRAME_HEADER.unpack(header)
+        if length == 0:
+            self.finished = True
+            return b""
+        return self.key.decrypt(self.fileobj.read(length))
+
+    def readinto(self, target):
+        while self.position >= len(self.chunk):
+            if self.finished:
+                return 0
+            self.chunk = self._next_frame()
+            self.position = 0
+        count = min(len(target), len(self.chunk) - self.position)
+        target[:count] = self.chunk[self.position:self.position + count]
+        self.position += count
+        return count
+
+
+class Entry_Writer:
+    """
+    Writes an entry vault one row at a time, the index is written and the header filled in by close().
+    ====================================================================================================================
+    :__init__: :param fileobj: seekable binary file object the vault is written to
+               :param keys: tuple - (cipher, index key) from entry_keys
+               :param sequence: int - last journal record included in this snapshot
+    write_row: Encrypts and writes one row
+               :param fields: list of strings - the first field is the indexed username
+               :return: None
+    close: Writes the index and the header
+           :param: None
+           :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, fileobj, keys, sequence=0):
+        self.fileobj = fileobj
+        self.cipher, self.indexKey = keys
+        self.tags = []
+        self.offsets = []
+        self.nonces = b""
+        self.noncePosition = 0
+        self.fileobj.write(MAGIC + bytes([ENTRY_VERSION]) + SEQUENCE.pack(sequence) + ENTRY_HEADER.pack(0, 0))
+        self.offset = self.fileobj.tell()
+
+    def write_row(self, fields):
+        if self.noncePosition == len(self.nonces):
+            # one urandom call per 4096 records instead of one per record
+            self.nonces = os.urandom(12 * 4096)
+            self.noncePosition = 0
+        nonce = self.nonces[self.noncePosition:self.noncePosition + 12]
+        self.noncePosition += 12
+        encrypted = self.cipher.encrypt(nonce, pack_fields(fields), SEQUENCE.pack(self.offset))
+        self.fileobj.write(RECORD_HEADER.pack(nonce, len(encrypted)) + encrypted)
+        self.tags.append(blind(self.indexKey, fields[0]))
+        self.offsets.append(self.offset)
+        self.offset += RECORD_HEADER.size + len(encrypted)
+
+    def close(self):
+        import numpy as np
+        tags = np.array(self.tags, dtype=np.uint64)
+        order = np.argsort(tags, kind="stable")
+        index = np.empty((len(self.tags), 2), dtype=">u8")
+        index[:, 0] = tags[order]
+        index[:, 1] = np.array(self.offsets, dtype=np.uint64)[order]
+        self.fileobj.write(index.tobytes())
+        self.fileobj.seek(len(MAGIC) + 1 + SEQUENCE.size)
+        self.fileobj.write(ENTRY_HEADER.pack(len(self.tags), self.offset))
+        self.fileobj.seek(0, io.SEEK_END)
+
+
+class Entry_Reader:
+    """
+    Reads an entry vault, either every row in file order or only the rows for one username.
+    ====================================================================================================================
+    :__init__: :param fileobj: binary file object positioned at the start of the vault, closed by close()
+               :param keys: tuple - (cipher, index key) from entry_keys
+    rows: Decrypts every row
+          :param: None
+          :return: generator of lists of strings
+    lookup: Decrypts only the rows stored under a username. Uses the index, so the rest of the file isn't read.
+            :param username: string
+            :return: list of lists of strings
+    ====================================================================================================================
+    """
+
+    def __init__(self, fileobj, keys):
+        self.fileobj = fileobj
+        self.cipher, self.indexKey = keys
+        self.sequence = read_header(fileobj)[1]
+        self.count, self.indexOffset = ENTRY_HEADER.unpack(fileobj.read(ENTRY_HEADER.size))
+        self.start = fileobj.tell()
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.fileobj.close()
+            self.closed = True
+
+    def _decrypt(self, data, offset):
+        nonce, length = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        return unpack_fields(self.cipher.decrypt(nonce, data[start:start + length], SEQUENCE.pack(offset)))
+
+    def rows(self):
+        with mmap.mmap(self.fileobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = self.start
+            while offset < self.indexOffset:
+                length = RECORD_HEADER.unpack_from(data, offset)[1]
+                yield self._decrypt(data, offset)
+                offset += RECORD_HEADER.size + length
+
+    def lookup(self, username):
+        if not self.count:
+            return []
+        tag = blind(self.indexKey, username)
+        with mmap.mmap(self.fileobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            tags = _Index_Tags(data, self.indexOffset, self.count)
+            position = bisect.bisect_left(tags, tag)
+            found = []
+            while position < self.count and tags[position] == tag:
+                offset = INDEX_ENTRY.unpack_from(data, self.indexOffset + position * INDEX_ENTRY.size)[1]
+                fields = self._decrypt(data, offset)
+                # 64 bit tags can collide, so the decrypted username is checked too
+                if fields[0] == username:
+                    found.append(fields)
+                position += 1
+            return found
+
+
+class _Index_Tags:
+    # sequence view of the blinded usernames in a mapped index, lets bisect search it without copying
+    def __init__(self, data, offset, count):
+        self.data = data
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        return INDEX_ENTRY.unpack_from(self.data, self.offset + position * INDEX_ENTRY.size)[0]
+
+
+class Block_Writer:
+    """
+    Writes a block vault a block of columns at a time. The last block is held back until close() so it can be sealed
+    as the last frame.
+    ====================================================================================================================
+    :__init__: :param fileobj: binary file object the vault is written to
+               :param keys: tuple - (cipher, index key) from entry_keys, only the cipher is used
+               :param sequence: int - last journal record included in this snapshot
+               :param codec: int - CODEC_NONE, CODEC_ZLIB or CODEC_ZSTD
+    write_columns: Compresses and encrypts one block
+                   :param columns: list of equally long lists of strings, at most BLOCK_ROWS rows
+                   :return: None
+    close: Writes the last block
+           :param: None
+           :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, fileobj, keys, sequence=0, codec=DEFAULT_CODEC):
+        self.fileobj = fileobj
+        self.cipher = keys[0]
+        self.codec = codec
+        self.header = MAGIC + bytes([BLOCK_VERSION]) + SEQUENCE.pack(sequence) + CODEC.pack(codec)
+        self.number = 0
+        self.pending = None
+        self.fileobj.write(self.header)
+
+    def write_columns(self, columns):
+        if self.pending is not None:
+            self._frame(self.pending, False)
+        self.pending = compress(self.codec, pack_columns(columns))
+
+    def _frame(self, block, last):
+        nonce = os.urandom(12)
+        encrypted = self.cipher.encrypt(nonce, block, self.header + FRAME_NUMBER.pack(self.number, last))
+        self.fileobj.write(RECORD_HEADER.pack(nonce, len(encrypted)) + encrypted)
+        self.number += 1
+
+    def close(self):
+        if self.pending is None:
+            self.pending = compress(self.codec, pack_columns([[], []]))
+        self._frame(self.pending, True)
+        self.pending = None
+
+
+class Block_Reader:
+    """
+    Reads a block vault a block at a time.
+    ====================================================================================================================
+    :__init__: :param fileobj: binary file object positioned at the start of the vault, closed by close()
+               :param keys: tuple - (cipher, index key) from entry_keys, only the cipher is used
+    columns: Decrypts every block
+             :param: None
+             :return: generator of lists of columns (lists of strings)
+    rows: Decrypts every row
+          :param: None
+          :return: generator of lists of strings
+    lookup: Decrypts every block and returns the rows stored under a username, only blocks holding its bytes are
+            unpacked
+            :param username: string
+            :return: list of lists of strings
+    ====================================================================================================================
+    """
+
+    def __init__(self, fileobj, keys):
+        self.fileobj = fileobj
+        self.cipher = keys[0]
+        self.sequence = read_header(fileobj)[1]
+        (self.codec,) = CODEC.unpack(fileobj.read(CODEC.size))
+        self.header = MAGIC + bytes([BLOCK_VERSION]) + SEQUENCE.pack(self.sequence) + CODEC.pack(self.codec)
+        self.start = fileobj.tell()
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.fileobj.close()
+            self.closed = True
+
+    def columns(self):
+        return map(unpack_columns, self._blocks())
+
+    def _blocks(self):
+        # every block decrypted and decompressed, still packed
+        end = os.fstat(self.fileobj.fileno()).st_size
+        self.fileobj.seek(self.start)
+        number = 0
+        last = False
+        while not last:
+            header = self.fileobj.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                raise EOFError("Vault ended before its last block")
+            nonce, length = RECORD_HEADER.unpack(header)
+            encrypted = self.fileobj.read(length)
+            last = self.fileobj.tell() >= end
+            block = self.cipher.decrypt(nonce, encrypted, self.header + FRAME_NUMBER.pack(number, last))
+            number += 1
+            yield decompress(self.codec, block)
+
+    def rows(self):
+        for columns in self.columns():
+            yield from map(list, zip(*columns))
+
+    def lookup(self, username):
+        # a block without the username's bytes anywhere in it can't hold its rows, it isn't unpacked
+        needle = username.encode()
+        found = []
+        for block in self._blocks():
+            if needle in block:
+                found += unpack_rows(block, username)
+        return found
@@ -0,0 +1,68 @@
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, vaults there are only safe to use from one process at a time
+    fcntl = None
+
+LOCK_NAME = "vault.lock"
+
+
+class Vault_Lock:
+    """
+    Advisory lock on a vault directory, shared between readers and exclusive for a writer, so several processes can
+    use the same vault. Other processes are kept out with flock on a lock file next to the vault files. Within one
+    process the threads take turns on a reentrant mutex, so a thread already holding the lock can take it again, and a
+    reader can become the writer for a moment (the master password upgrade during an unlock does that). Converting a
+    flock isn't atomic: another writer can get in between, which is fine for the callers, they don't rely on the vault
+    staying unchanged across the upgrade.
+    ====================================================================================================================
+    :__init__: :param path: string - lock file, created on first use
+    shared: Context manager holding the lock for reading
+            :param: None
+    exclusive: Context manager holding the lock for writing
+               :param: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mutex = threading.RLock()
+        self.handle = None
+        self.mode = None
+        self.depth = 0
+
+    @contextmanager
+    def shared(self):
+        with self._hold(fcntl.LOCK_SH if fcntl else None):
+            yield
+
+    @contextmanager
+    def exclusive(self):
+        with self._hold(fcntl.LOCK_EX if fcntl else None):
+            yield
+
+    @contextmanager
+    def _hold(self, mode):
+        with self.mutex:
+            previous = self.mode
+            if fcntl is not None:
+                if self.handle is None:
+                    self.handle = open(self.path, 'a+b')
+                if previous is None or (previous == fcntl.LOCK_SH and mode == fcntl.LOCK_EX):
+                    fcntl.flock(self.handle.fileno(), mode)
+                    self.mode = mode
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if fcntl is not None and self.mode != previous:
+                    # back to what the outer holder had, or released
+                    fcntl.flock(self.handle.fileno(), previous if previous is not None else fcntl.LOCK_UN)
+                    self.mode = previous
+                if self.depth == 0 and self.handle is not None:
+                    self.handle.close()
+                    self.handle = None
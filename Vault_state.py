@@ -0,0 +1,74 @@
+import os
+
+# The GUI and CLI keep their vault in this directory when it's set, the working directory otherwise
+VAULT_ENV = "SYS230_VAULT_DIR"
+
+
+def vault_root(directory=None):
+    # directory given to an entry point, then the environment variable, then the working directory; made absolute once
+    # so later chdirs don't move the vault
+    if directory is None:
+        directory = os.environ.get(VAULT_ENV, "")
+    return os.path.abspath(directory)
+
+
+class Vault_State:
+    """
+    The files of one vault directory, resolved once, and what System last read from the small ones (the vault's
+    header, mpass.txt). Each check is a single stat of the file itself, so it costs the same however many other files
+    share the directory. A cached value is reused until the file's identity changes: System and other processes write
+    vault files to a temporary name and rename them in, which gives a new inode, and appends change the size.
+    ====================================================================================================================
+    :__init__: :param directory: string - absolute vault directory
+    path: Returns the path of a vault file
+          :param name: string - file name
+          :return: string
+    stamp: Returns the identity of a vault file
+           :param name: string - file name
+           :return: (inode, size, mtime in ns) tuple, None if the file doesn't exist
+    exists: Checks whether a vault file exists
+            :param name: string - file name
+            :return: bool
+    read: Returns loader(path), calling the loader again only if the file changed since it was last called
+          :param name: string - file name
+          :param loader: function - path -> value, the value is cached per file name
+          :return: the loader's value
+    forget: Drops what was cached for a file
+            :param name: string - file name
+            :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = {}
+        self.cache = {}
+
+    def path(self, name):
+        path = self.paths.get(name)
+        if path is None:
+            path = self.paths[name] = os.path.join(self.directory, name)
+        return path
+
+    def stamp(self, name):
+        try:
+            info = os.stat(self.path(name))
+        except FileNotFoundError:
+            return None
+        return info.st_ino, info.st_size, info.st_mtime_ns
+
+    def exists(self, name):
+        return self.stamp(name) is not None
+
+    def read(self, name, loader):
+        # stat before reading, the value is never older than its stamp, at worst it's read again next time
+        stamp = self.stamp(name)
+        cached = self.cache.get(name)
+        if cached is not None and stamp is not None and cached[0] == stamp:
+            return cached[1]
+        value = loader(self.path(name))
+        self.cache[name] = (stamp, value)
+        return value
+
+    def forget(self, name):
+        self.cache.pop(name, None)
@@ -0,0 +1,106 @@
+import os
+
+import Key_derivation
+from OS_interface import System
+
+# A vault is a directory holding its own key, master password header, security questions and encrypted file, so any
+# number of them can sit side by side (one per user, per team, per client) under a common root:
+#   root/alice/key.key, root/alice/mpass.txt, root/alice/recovery.txt, root/alice/password.csv[.journal], ...
+# Processes share vaults safely through the advisory lock every System takes on its directory (see Vault_lock).
+VAULT_NAME = "password.csv"
+VAULT_FILES = ("key.key", "mpass.txt")
+
+
+def missing(directory, name=VAULT_NAME):
+    # files a vault directory still needs before it can be unlocked without the interactive first time setup
+    return [file for file in VAULT_FILES + (name,) if not os.path.exists(os.path.join(directory, file))]
+
+
+def is_vault(directory, name=VAULT_NAME):
+    return not missing(directory, name)
+
+
+def find_vaults(root, name=VAULT_NAME):
+    # vault directories directly under root, sorted by name
+    with os.scandir(root) as entries:
+        return sorted(entry.path for entry in entries if entry.is_dir() and is_vault(entry.path, name))
+
+
+def create_vault(directory, password, questions=(), name=VAULT_NAME, kdf=None, **kwargs):
+    """
+    Sets up a vault without prompting, for scripts and tests.
+    :param directory: string - vault directory, created if missing
+    :param password: string - master password
+    :param questions: list of (question, answer) tuples - security questions
+    :param name: string - vault file name
+    :param kdf: Scrypt_KDF or PBKDF2_KDF - master password KDF, calibrated if not given
+    :param kwargs: passed on to System
+    :return: System - the new vault, unlocked
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    mPassPath = os.path.join(directory, "mpass.txt")
+    if not os.path.exists(mPassPath):
+        with open(mPassPath, 'x') as mPassFile:
+            mPassFile.write(Key_derivation.hash_password(password, kdf))
+    prompts = iter([text for pair in questions for text in pair] + ["stop"])
+    system = System(name=name, get_input=lambda prompt: next(prompts, password), directory=directory, **kwargs)
+    return unlocked(system, password)
+
+
+def unlocked(system, password):
+    # answers the master password prompt once and nothing else: a wrong password raises MasterPasswordError instead of
+    # falling back to the security questions
+    system.input = lambda prompt: password if prompt.startswith("Please input your master password") else ""
+    system.masterVerify()
+    return system
+
+
+def unlock(directory, password, name=VAULT_NAME, **kwargs):
+    """
+    Opens an existing vault without prompting.
+    :param directory: string - vault directory
+    :param password: string - master password
+    :param name: string - vault file name
+    :param kwargs: passed on to System
+    :return: System - the vault, unlocked
+    """
+    absent = missing(directory, name)
+    if absent:
+        raise FileNotFoundError(f"No vault in {directory or os.getcwd()} (missing {', '.join(absent)})")
+    return unlocked(System(name=name, get_input=lambda prompt: "", directory=directory, **kwargs), password)
+
+
+def _lookup(directory, password, usernames, name, kwargs):
+    # runs in a worker process, so it has to be importable at module level
+    system = unlock(directory, password, name, **kwargs)
+    found = {username: [row[1] for row in system.fileLookup(username)] for username in usernames}
+    system.session.expire()
+    return found
+
+
+def lookup_many(directories, passwords, usernames, name=VAULT_NAME, processes=None, executor=None, **kwargs):
+    """
+    Unlocks several vaults and looks the same usernames up in each, spread over a pool of processes. Unlocking is
+    dominated by the master password KDF, and each worker runs its own on a separate core.
+    :param directories: list of strings - vault directories
+    :param passwords: string, or dict of directory -> master password
+    :param usernames: list of strings
+    :param name: string - vault file name
+    :param processes: int - pool size (default: one per core), 1 looks the vaults up one after another in this process
+    :param executor: concurrent.futures.Executor - existing pool to use instead of starting one
+    :param kwargs: passed on to System
+    :return: dict - directory -> {username: list of passwords}
+    """
+    directories = list(directories)
+    jobs = [(directory, passwords[directory] if isinstance(passwords, dict) else passwords, list(usernames), name,
+             kwargs) for directory in directories]
+    if not jobs:
+        return {}
+    if executor is None and processes == 1:
+        return {directory: _lookup(*job) for directory, job in zip(directories, jobs)}
+    if executor is not None:
+        return dict(zip(directories, executor.map(_lookup, *zip(*jobs))))
+    # imported here, the CLI opens vaults through this module and shouldn't pay for multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(min(processes or os.cpu_count() or 1, max(1, len(jobs)))) as pool:
+        return dict(zip(directories, pool.map(_lookup, *zip(*jobs))))
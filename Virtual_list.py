@@ -0,0 +1,149 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+
+import Metrics
+
+
+class Virtual_Table:
+    """
+    Table that only ever holds the rows on screen. Rows come from a fetch function that returns one page and the
+    total number of rows, and the scrollbar is driven from that total, so scrolling through a million entries costs a
+    page fetch per step. The Treeview is given one item per visible row when it's created and scrolling only changes
+    their values, so no widget or item is created or destroyed after that. Scroll events are coalesced: however many
+    arrive before Tk is idle again (dragging the scrollbar sends dozens), only the last position is fetched and drawn.
+    Clicking a heading sorts by that column, clicking it again reverses the order. Fetching a page is timed under
+    "ui.fetch" and the time from the first scroll event to the redrawn rows under "ui.frame", see Metrics.
+    ====================================================================================================================
+    :__init__: :param parent: tk widget the table is created in, grid or pack .frame to show it
+               :param fetch: function - (offset, limit, sort, descending) -> (list of row tuples, total number of
+                             rows), sort is a column number or None for the fetch's own order
+               :param headings: list of (column number in the fetched rows, heading, width in pixels), the columns
+                                shown
+               :param rows: int - visible rows
+               :param select: function - called with the row the user double clicked or pressed Return on
+    scroll_to: Shows the rows starting at offset, drawn once Tk is idle
+               :param offset: int
+               :return: None
+    refresh: Fetches the rows at the current position again, call it when the underlying rows changed
+             :param: None
+             :return: None
+    reset: Scrolls back to the top and refreshes
+           :param: None
+           :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, parent, fetch, headings, rows=20, select=None):
+        self.fetch = fetch
+        self.positions = [position for position, _, _ in headings]
+        self.rows = rows
+        self.select = select
+        self.offset = 0
+        self.total = 0
+        self.sort = None
+        self.descending = False
+        self.shown = rows
+        # time of the first scroll event not drawn yet, None when nothing is pending
+        self.pending = None
+        self.frame = tk.Frame(parent)
+        names = [str(number) for number in range(len(headings))]
+        self.tree = ttk.Treeview(self.frame, columns=names, show="headings", height=rows, selectmode="browse")
+        for name, (position, heading, width) in zip(names, headings):
+            self.tree.heading(name, text=heading, command=lambda position=position: self._sorted(position))
+            self.tree.column(name, width=width, stretch=False)
+        self.items = [self.tree.insert("", "end") for _ in range(rows)]
+        self.scrollbar = tk.Scrollbar(self.frame, orient="vertical", command=self._scroll)
+        self.tree.pack(side="left", fill="both")
+        self.scrollbar.pack(side="left", fill="y")
+        # Windows and macOS send <MouseWheel>, X11 sends buttons 4 and 5
+        self.tree.bind("<MouseWheel>", lambda event: self._wheel(-3 if event.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda event: self._wheel(-3))
+        self.tree.bind("<Button-5>", lambda event: self._wheel(3))
+        self.tree.bind("<Prior>", lambda event: self._wheel(-self.rows))
+        self.tree.bind("<Next>", lambda event: self._wheel(self.rows))
+        self.tree.bind("<Up>", lambda event: self._step(-1))
+        self.tree.bind("<Down>", lambda event: self._step(1))
+        self.tree.bind("<Double-Button-1>", self._chosen)
+        self.tree.bind("<Return>", self._chosen)
+
+    def _wheel(self, amount):
+        self.scroll_to(self.offset + amount)
+        # the Treeview's own bindings would move the selection or scroll the items, there is nothing more to scroll to
+        return "break"
+
+    def _step(self, amount):
+        # arrow keys move the selection and scroll once it reaches the top or bottom row
+        selected = self.tree.selection()
+        index = self.items.index(selected[0]) + amount if selected else 0
+        if 0 <= index < self.shown:
+            self.tree.selection_set(self.items[index])
+            self.tree.focus(self.items[index])
+        else:
+            self.scroll_to(self.offset + amount)
+        return "break"
+
+    def _scroll(self, action, amount, unit=None):
+        # scrollbar command: ("moveto", fraction) or ("scroll", steps, "units" / "pages")
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total))
+        elif action == "scroll":
+            self.scroll_to(self.offset + int(amount) * (self.rows if unit == "pages" else 1))
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, self.total - self.rows))
+        if offset != self.offset:
+            self.offset = offset
+            if self.pending is None:
+                self.pending = time.perf_counter()
+                self.frame.after_idle(self._draw)
+
+    def _draw(self):
+        self.refresh()
+        # queued behind the redraw the new values just scheduled, so the frame time includes drawing them
+        self.frame.after_idle(self._drawn, self.pending)
+        self.pending = None
+
+    def _drawn(self, start):
+        Metrics.observe("ui.frame", time.perf_counter() - start)
+
+    def refresh(self):
+        with Metrics.timer("ui.fetch"):
+            rows, self.total = self.fetch(self.offset, self.rows, self.sort, self.descending)
+            if not rows and self.offset:
+                # the rows shrank below the current position
+                self.offset = max(0, self.total - self.rows)
+                rows, self.total = self.fetch(self.offset, self.rows, self.sort, self.descending)
+        for number, item in enumerate(self.items):
+            if number < len(rows):
+                self.tree.item(item, values=[rows[number][position] for position in self.positions])
+                if number >= self.shown:
+                    self.tree.move(item, "", number)
+            elif number < self.shown:
+                # fewer rows than fit, the spare items are taken out until they're needed again
+                self.tree.detach(item)
+        self.shown = len(rows)
+        if self.total:
+            self.scrollbar.set(self.offset / self.total, (self.offset + len(rows)) / self.total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def reset(self):
+        self.offset = 0
+        self.refresh()
+
+    def _sorted(self, position):
+        if self.sort == position:
+            self.descending = not self.descending
+        else:
+            self.sort = position
+            self.descending = False
+        self.reset()
+
+    def _chosen(self, event):
+        selected = self.tree.selection()
+        if selected and self.select is not None:
+            number = self.items.index(selected[0])
+            rows, _ = self.fetch(self.offset + number, 1, self.sort, self.descending)
+            if rows:
+                self.select(rows[0])
@@ -0,0 +1,278 @@
+import queue
+import threading
+import time
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+
+import Metrics
+
+
+class Cancelled(Exception):
+    '''
+    Raised inside a background job when the user cancels it while it's waiting for input.
+    '''
+    pass
+
+
+class Worker:
+    """
+    Runs System I/O and crypto on a background thread so the Tk main loop never blocks. There is one worker thread, so
+    jobs run one at a time in submission order and never touch the vault files concurrently.
+    Callbacks run on the Tk thread: the worker queues results and the Tk side picks them up with root.after polling.
+    While jobs are outstanding a progress bar with a Cancel button is shown at the bottom of the window.
+    ====================================================================================================================
+    :__init__: :param root: tk.Tk - window the progress bar lives in
+               :param prompt: function - Tk side input function (GUI.get_input), used to answer ask()
+               :param cancelled: function - called on the Tk thread after cancel(), should release a prompt that's
+                                 still waiting for the user
+               :param interval: int - polling interval in milliseconds
+    submit: Queues a job
+            :param function: callable run on the worker thread
+            :param args: arguments for function
+            :param done: function - called on the Tk thread with the job's result
+            :param failed: function - called on the Tk thread with the exception if the job raised
+            :param label: string - shown next to the progress bar
+            :return: Future
+    ask: Worker thread replacement of input(). Blocks the job until the user answered on the Tk thread. Pass this to
+         System as get_input.
+         :param prompt: string
+         :return: string
+    cancel: Cancels every outstanding job. Jobs that haven't started are dropped, a running job's callbacks are skipped
+            and, if it's waiting in ask(), Cancelled is raised inside it.
+            :param: None
+            :return: None
+    busy: Returns whether any job is outstanding
+          :param: None
+          :return: bool
+    shutdown: Waits for the running job to finish and stops the worker thread
+              :param: None
+              :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, root, prompt, cancelled=None, interval=50):
+        self.root = root
+        self.prompt = prompt
+        self.cancelled = cancelled
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vault-worker",
+                                           initializer=Metrics.profile_thread)
+        self.results = queue.Queue()
+        self.questions = queue.Queue()
+        self.jobs = []
+        self.generation = 0
+        self.polling = False
+        self.asking = None
+        self.local = threading.local()
+
+        self.status = tk.Frame(self.root)
+        self.label = tk.Label(self.status)
+        self.label.pack(side="left", padx=5)
+        self.progress = ttk.Progressbar(self.status, mode="indeterminate", length=200)
+        self.progress.pack(side="left", padx=5)
+        tk.Button(self.status, text="Cancel", command=self.cancel).pack(side="left", padx=5)
+
+    def submit(self, function, *args, done=None, failed=None, label="Working..."):
+        generation = self.generation
+
+        def job():
+            # ask() tags questions with the generation of the job that asked, not the current one
+            self.local.generation = generation
+            try:
+                self.results.put((generation, done, function(*args), None))
+            except BaseException as error:
+                self.results.put((generation, failed, None, error))
+
+        future = self.executor.submit(job)
+        self.jobs.append(future)
+        self.label.config(text=label)
+        self._show()
+        return future
+
+    def busy(self):
+        return any(not job.done() for job in self.jobs)
+
+    def _show(self):
+        if not self.polling:
+            self.polling = True
+            self.status.place(relx=0.0, rely=1.0, anchor="sw")
+            self.progress.start(15)
+            self.root.after(self.interval, self._poll)
+
+    def _hide(self):
+        self.polling = False
+        self.progress.stop()
+        self.status.place_forget()
+
+    def _poll(self):
+        # answer questions first, a job waiting for input can't finish until it's answered
+        while self.asking is None and not self.questions.empty():
+            generation, prompt, answer = self.questions.get()
+            if generation != self.generation:
+                self._answer(answer, Cancelled())
+                continue
+            self.asking = answer
+            try:
+                self._answer(answer, self.prompt(prompt))
+            except tk.TclError as error:
+                # window closed while waiting
+                self._answer(answer, Cancelled(str(error)))
+            finally:
+                self.asking = None
+        while not self.results.empty():
+            generation, callback, result, error = self.results.get()
+            if generation != self.generation:
+                continue
+            if error is not None:
+                if callback is None:
+                    self.root.report_callback_exception(type(error), error, error.__traceback__)
+                else:
+                    callback(error)
+            elif callback is not None:
+                callback(result)
+        self.jobs = [job for job in self.jobs if not job.done()]
+        if self.jobs or not self.results.empty():
+            self.root.after(self.interval, self._poll)
+        else:
+            self._hide()
+
+    def _answer(self, answer, value):
+        # a cancelled question already holds its answer, whatever the user typed afterwards is dropped
+        try:
+            answer.put_nowait(value)
+        except queue.Full:
+            pass
+
+    def ask(self, prompt):
+        answer = queue.Queue(maxsize=1)
+        self.questions.put((getattr(self.local, "generation", self.generation), prompt, answer))
+        result = answer.get()
+        if isinstance(result, Cancelled):
+            raise result
+        return result
+
+    def cancel(self):
+        self.generation += 1
+        for job in self.jobs:
+            job.cancel()
+        # wake a job that's blocked in ask(), _poll would only get to it after the user answered
+        if self.asking is not None:
+            self._answer(self.asking, Cancelled())
+        while not self.questions.empty():
+            self._answer(self.questions.get()[2], Cancelled())
+        if self.cancelled is not None:
+            self.cancelled()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class Coalescer:
+    """
+    Collapses a burst of requests for the same background job into as few runs as possible: the first request submits
+    the job, requests made while it's outstanding only mark it to run once more when it finishes.
+    ====================================================================================================================
+    :__init__: :param worker: Worker - runs the job
+               :param prepare: function - called on the Tk thread right before each run, returns (function, args) to
+                               submit or None if there's nothing to do anymore
+               :param failed: function - called on the Tk thread with the exception if a run raised
+               :param label: string - shown next to the progress bar
+    request: Asks for a run
+             :param: None
+             :return: None
+    reset: Forgets any outstanding run, call it after Worker.cancel()
+           :param: None
+           :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, worker, prepare, failed=None, label="Saving..."):
+        self.worker = worker
+        self.prepare = prepare
+        self.failed = failed
+        self.label = label
+        self.running = False
+        self.again = False
+
+    def request(self):
+        if self.running:
+            self.again = True
+            return
+        job = self.prepare()
+        if job is None:
+            return
+        function, args = job
+        self.running = True
+        self.worker.submit(function, *args, done=self._done, failed=self._failed, label=self.label)
+
+    def _done(self, result):
+        self.running = False
+        if self.again:
+            self.again = False
+            self.request()
+
+    def _failed(self, error):
+        self._done(None)
+        if self.failed is not None:
+            self.failed(error)
+
+    def reset(self):
+        self.running = False
+        self.again = False
+
+
+class Debouncer:
+    """
+    Holds a Coalescer's requests back until they stop coming for delay milliseconds, so a burst of changes is written
+    once. A steady stream of requests is still written at least every limit milliseconds.
+    ====================================================================================================================
+    :__init__: :param root: tk.Tk - runs the timer
+               :param coalescer: Coalescer - job to run once the requests settle
+               :param delay: int - quiet time in milliseconds before a run
+               :param limit: int - longest a request is held back, in milliseconds
+    request: Asks for a run after the delay
+             :param: None
+             :return: None
+    flush: Runs a held back request now
+           :param: None
+           :return: None
+    pending: Returns whether a request is being held back
+             :param: None
+             :return: bool
+    reset: Forgets the coalescer's outstanding run, call it after Worker.cancel(). A held back request is kept.
+           :param: None
+           :return: None
+    ====================================================================================================================
+    """
+
+    def __init__(self, root, coalescer, delay=500, limit=5000):
+        self.root = root
+        self.coalescer = coalescer
+        self.delay = delay
+        self.limit = limit
+        self.timer = None
+        self.first = None
+
+    def request(self):
+        now = time.monotonic()
+        if self.timer is None:
+            self.first = now
+        else:
+            self.root.after_cancel(self.timer)
+        remaining = self.limit - (now - self.first) * 1000
+        self.timer = self.root.after(max(0, int(min(self.delay, remaining))), self.flush)
+
+    def flush(self):
+        if self.timer is None:
+            return
+        self.root.after_cancel(self.timer)
+        self.timer = None
+        self.first = None
+        self.coalescer.request()
+
+    def pending(self):
+        return self.timer is not None
+
+    def reset(self):
+        self.coalescer.reset()
@@ -0,0 +1,77 @@
+"""
+Reports password audit throughput (reuse, entropy, legacy and breach checks) over synthetic vaults, and the cost of
+building and searching a breach index.
+
+    python benchmarks/bench_audit.py [--sizes 100000 500000] [--breaches 1000000] [--processes 1 4]
+
+One entry in fifty reuses another entry's password and one in a hundred is in the breach list. The index is built from
+an unsorted list, so the build time includes the in-memory sort. "lookup us" is the time per password of
+Breach_Index.counts for one audit batch of passwords, most of them not breached.
+"""
+import argparse
+import hashlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Audit
+import synthetic
+from Dataframe import Data_Manager
+
+
+def write_list(path, count, breached, seed):
+    # random digests plus the breached passwords, in no particular order
+    rng = random.Random(seed)
+    lines = [f"{rng.getrandbits(160):040X}:{rng.randint(1, 1000)}" for _ in range(count)]
+    lines += [f"{hashlib.sha1(password.encode()).hexdigest().upper()}:{rng.randint(1, 1000)}" for password in breached]
+    rng.shuffle(lines)
+    with open(path, 'w') as listFile:
+        listFile.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--breaches", type=int, default=1000000, help="digests in the breach list")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--seed", type=int, default=230)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            frame = synthetic.records(size, args.seed)
+            passwords = frame["Password"].tolist()
+            rng = random.Random(args.seed)
+            for position in rng.sample(range(size), size // 50):
+                passwords[position] = passwords[rng.randrange(size)]
+            frame["Password"] = passwords
+            breached = rng.sample(passwords, size // 100)
+            listed = os.path.join(directory, "list.txt")
+            index = os.path.join(directory, "breaches.idx")
+            write_list(listed, args.breaches, breached, args.seed)
+            start = time.perf_counter()
+            Audit.Breach_Index.build([listed], index)
+            build = time.perf_counter() - start
+            digests = [hashlib.sha1(password.encode()).digest() for password in passwords[:Audit.AUDIT_CHUNK]]
+            breaches = Audit.Breach_Index(index)
+            start = time.perf_counter()
+            breaches.counts(digests)
+            lookup = (time.perf_counter() - start) / len(digests) * 1e6
+            print(f"{size} entries, {args.breaches + len(breached)} breached digests: index built in {build:.2f}s "
+                  f"({os.path.getsize(index) >> 20} MiB), lookup {lookup:.2f} us per password")
+
+            manager = Data_Manager(frame)
+            print(f"{'entries':>8} {'processes':>9} {'seconds':>8} {'entries/s':>10} {'reused':>7} {'weak':>6} "
+                  f"{'breached':>8}")
+            for processes in args.processes:
+                result = manager.audit(io.StringIO(), breaches=index, processes=processes)
+                print(f"{size:>8} {processes:>9} {result['seconds']:>8.2f} {result['rate']:>10.0f} "
+                      f"{result['reused']:>7} {result['weak']:>6} {result['breached']:>8}")
+
+
+if __name__ == "__main__":
+    main()
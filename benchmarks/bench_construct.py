@@ -0,0 +1,59 @@
+"""
+Reports how long constructing a System on an existing vault takes as unrelated files pile up in the vault directory.
+
+    python benchmarks/bench_construct.py [--files 0 1000 10000 100000] [--repeat 50]
+
+System checks its files with one stat each, so the construction and refresh columns should stay flat. The listdir column
+is what a single existence check costs when it lists the directory instead, for comparison. "refresh" is the check done
+before every journal append: with the vault unchanged it's a stat of the vault file and one of the journal.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic
+from OS_interface import System
+
+
+def median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def pad(directory, total):
+    # empty files next to the vault until the directory holds `total` of them
+    for number in range(len(os.listdir(directory)), total):
+        open(os.path.join(directory, f"unrelated{number:06d}.txt"), 'w').close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[0, 1000, 10000, 100000])
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=230)
+    args = parser.parse_args()
+
+    print(f"{'files':>8} {'construct ms':>13} {'refresh ms':>11} {'listdir ms':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic.make_vault(directory, args.entries, args.seed)
+        for files in sorted(args.files):
+            pad(directory, files)
+            construct = median_ms(lambda: System(name="password.csv", get_input=synthetic.answers(),
+                                                 directory=directory), args.repeat)
+            system = System(name="password.csv", get_input=synthetic.answers(), directory=directory)
+            refresh = median_ms(system._journalRefresh, args.repeat)
+            listed = median_ms(lambda: "password.csv" in os.listdir(directory), args.repeat)
+            print(f"{len(os.listdir(directory)):>8} {construct:>13.3f} {refresh:>11.4f} {listed:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
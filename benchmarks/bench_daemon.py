@@ -0,0 +1,125 @@
+"""
+Load tests the vault daemon: opens a few connections and sends pipelined lookups at a fixed rate, reporting p50 and
+p99 latency.
+
+    python benchmarks/bench_daemon.py [--entries 100000] [--rate 1000] [--seconds 10] [--connections 8]
+                                      [--write-ratio 0.0]
+
+Requests are sent on a fixed schedule whatever the daemon does (open loop), and latency is measured from the time a
+request was due to be sent, so a stalled daemon shows up in the percentiles instead of slowing the load down.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import Key_derivation
+from OS_interface import System
+
+MASTER = "benchmark"
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def load(path, usernames, rate, seconds, connections, writeRatio):
+    loop = asyncio.get_running_loop()
+    streams = [await asyncio.open_unix_connection(path, limit=1 << 20) for _ in range(connections)]
+    total = int(rate * seconds)
+    due = [{} for _ in streams]
+    latencies = []
+    errors = 0
+
+    async def receive(number, reader):
+        nonlocal errors
+        # connection `number` carries every connections-th request
+        for _ in range(number, total, connections):
+            line = await reader.readline()
+            if not line:
+                return
+            response = json.loads(line)
+            latencies.append(loop.time() - due[number].pop(response["id"]))
+            errors += not response["ok"]
+
+    async def send():
+        rng = random.Random(230)
+        start = loop.time()
+        for number in range(total):
+            when = start + number / rate
+            delay = when - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            connection = number % connections
+            if rng.random() < writeRatio:
+                request = {"id": number, "op": "add", "username": f"load{number}@example.com", "password": "x" * 16}
+            else:
+                request = {"id": number, "op": "get", "username": rng.choice(usernames)}
+            due[connection][number] = when
+            streams[connection][1].write(json.dumps(request).encode() + b"\n")
+        return loop.time() - start
+
+    receivers = [asyncio.ensure_future(receive(number, reader)) for number, (reader, _) in enumerate(streams)]
+    elapsed = await send()
+    await asyncio.wait_for(asyncio.gather(*receivers), timeout=30)
+    for _, writer in streams:
+        writer.close()
+    return sorted(latencies), errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--rate", type=float, default=1000, help="requests per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--write-ratio", type=float, default=0.0, help="fraction of requests that are adds")
+    args = parser.parse_args()
+
+    usernames = [f"user{i}@example.com" for i in range(args.entries)]
+    frame = pd.DataFrame({"Username": usernames, "Password": [f"pw{i:012d}" for i in range(args.entries)]})
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        answers = iter([MASTER, "question", "answer", "stop"])
+        System(name="password.csv", get_input=lambda prompt: next(answers, MASTER))
+        # the daemon unlocks once, a cheap KDF just keeps the setup short
+        with open("mpass.txt", "w") as mPassFile:
+            mPassFile.write(Key_derivation.hash_password(MASTER, Key_derivation.PBKDF2_KDF(1000)))
+        System(name="password.csv", get_input=lambda prompt: MASTER).fileClose(frame)
+
+        socketPath = os.path.join(directory, "vault.sock")
+        environment = dict(os.environ, PYTHONPATH=REPO, SYS230_MASTER_PASSWORD=MASTER)
+        daemon = subprocess.Popen([sys.executable, "-m", "CLI", "agent", "--socket", socketPath], env=environment,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            started = time.perf_counter()
+            while not os.path.exists(socketPath):
+                if daemon.poll() is not None:
+                    raise SystemExit("daemon exited during startup")
+                time.sleep(0.05)
+            ready = time.perf_counter() - started
+            latencies, errors, elapsed = asyncio.run(load(socketPath, usernames, args.rate, args.seconds,
+                                                          args.connections, args.write_ratio))
+        finally:
+            daemon.terminate()
+            daemon.wait()
+        os.chdir("/")
+
+    print(f"daemon ready in {ready:.2f}s with {args.entries} entries")
+    print(f"{'requests':>9} {'rate/s':>8} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'max ms':>8}")
+    print(f"{len(latencies):>9} {len(latencies) / elapsed:>8.0f} {errors:>7} "
+          f"{percentile(latencies, 0.50) * 1000:>8.3f} {percentile(latencies, 0.99) * 1000:>8.3f} "
+          f"{percentile(latencies, 0.999) * 1000:>9.3f} {latencies[-1] * 1000:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
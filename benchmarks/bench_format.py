@@ -0,0 +1,76 @@
+"""
+Compares the on-disk vault formats: save time, load time and file size of the csv stream layout fileClose used to
+write against the entry and compressed block layouts, at 10k, 100k and 1M entries.
+
+    python benchmarks/bench_format.py [--entries 10000 100000 1000000]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Generator
+import Vault_io
+from OS_interface import System
+
+MASTER = "benchmark"
+CODECS = {Vault_io.CODEC_NONE: "none", Vault_io.CODEC_ZLIB: "zlib", Vault_io.CODEC_ZSTD: "zstd"}
+
+
+def csv_save(system, frame):
+    # the stream layout: to_csv through the chunked Fernet stream
+    with open(system.fileName, 'wb') as storage:
+        writer = Vault_io.Encrypted_Writer(storage, system.keyGet())
+        with io.TextIOWrapper(writer, encoding="utf-8", newline="") as stream:
+            frame.to_csv(stream, header=False, index=False)
+
+
+def csv_load(system):
+    with Vault_io.Encrypted_Reader(open(system.fileName, 'rb'), system.keyGet()) as decrypted:
+        return pd.read_csv(io.BufferedReader(decrypted), dtype=str, header=None, index_col=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        answers = iter([MASTER, "question", "answer", "stop"])
+        System(name="password.csv", get_input=lambda prompt: next(answers, MASTER))
+        print(f"block codec: {CODECS[Vault_io.DEFAULT_CODEC]}")
+        print(f"{'entries':>8} {'format':>6} {'save s':>8} {'load s':>8} {'file MB':>8}")
+        for entries in args.entries:
+            passwords = Generator.generate(entries, Generator.Policy(length=16))
+            # a few passwords with the characters csv has to quote
+            passwords[::1000] = ['pa,ss"wo\nrd'] * len(passwords[::1000])
+            frame = pd.DataFrame({"Username": [f"user{number}@example.com" for number in range(entries)],
+                                  "Password": passwords})
+            for layout in ("csv", "entry", "block"):
+                system = System(name="password.csv", get_input=lambda prompt: MASTER, layout=layout)
+                system.masterVerify()
+                start = time.perf_counter()
+                if layout == "csv":
+                    csv_save(system, frame)
+                else:
+                    system.fileEncrypt(frame)
+                saved = time.perf_counter()
+                # fileOpen would upgrade the csv vault, so it's read the way fileOpen used to read it
+                loaded = csv_load(system) if layout == "csv" else system.fileOpen()
+                opened = time.perf_counter()
+                # fileOpen returns every RECORD_COLUMNS column, username and password come first
+                if loaded.iloc[:, :2].values.tolist() != frame.values.tolist():
+                    raise SystemExit(f"{layout} didn't read back what was saved")
+                print(f"{entries:>8} {layout:>6} {saved - start:>8.2f} {opened - saved:>8.2f} "
+                      f"{os.path.getsize('password.csv') / (1 << 20):>8.1f}")
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main()
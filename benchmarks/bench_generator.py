@@ -0,0 +1,43 @@
+"""
+Compares password generation throughput of Generator against the original random.sample implementation of
+Data_Manager.pwrandom.
+
+    python benchmarks/bench_generator.py [--count 100000] [--length 16]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Generator
+
+
+def legacy(count, length):
+    alphabet = string.ascii_lowercase + string.ascii_uppercase + string.digits + string.punctuation
+    return ["".join(random.sample(alphabet, length)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--length", type=int, default=16)
+    args = parser.parse_args()
+
+    cases = [("random.sample", lambda: legacy(args.count, args.length)),
+             ("generate", lambda: Generator.generate(args.count, Generator.Policy(length=args.length))),
+             ("generate+policy", lambda: Generator.generate(args.count, Generator.Policy(
+                 length=args.length, min_digits=2, min_symbols=2, exclude="O0Il1"))),
+             ("passphrases", lambda: Generator.passphrases(args.count))]
+    print(f"{'generator':>16} {'seconds':>8} {'per second':>12}")
+    for name, run in cases:
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        print(f"{name:>16} {seconds:>8.3f} {args.count / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Reports what the vault history costs: record latency for deltas and keyframes, disk use next to keeping full snapshots,
+and how long restoring versions spread over the whole history takes.
+
+    python benchmarks/bench_history.py [--entries 100000] [--versions 1000] [--changes 10] [--restores 50]
+
+Each version changes `changes` random entries' passwords, adds one entry and removes another, like a session of edits
+saved by the GUI. Restores should stay under a second for any version, the worst case is the last delta before a
+keyframe.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic
+from cryptography.fernet import Fernet
+from Dataframe import PASSWORD, record
+from History import KEYFRAME_INTERVAL, History
+
+
+def disk_use(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--versions", type=int, default=1000)
+    parser.add_argument("--changes", type=int, default=10, help="passwords changed per version")
+    parser.add_argument("--restores", type=int, default=50, help="versions restored")
+    parser.add_argument("--interval", type=int, default=KEYFRAME_INTERVAL)
+    parser.add_argument("--seed", type=int, default=230)
+    args = parser.parse_args()
+
+    key = Fernet(Fernet.generate_key())
+    rng = random.Random(args.seed)
+    rows = [tuple(record(row)) for row in synthetic.records(args.entries, args.seed).values.tolist()]
+    extra = iter(tuple(record(row)) for row in synthetic.records(args.versions, args.seed + 1).values.tolist())
+    with tempfile.TemporaryDirectory() as directory:
+        history = History(os.path.join(directory, "history"), keep=args.versions, interval=args.interval)
+        timings = {True: [], False: []}
+        for _ in range(args.versions):
+            for position in rng.sample(range(len(rows)), args.changes):
+                changed = list(rows[position])
+                changed[PASSWORD] = "".join(rng.choices(synthetic.ALPHABET, k=16))
+                rows[position] = tuple(changed)
+            rows[rng.randrange(len(rows))] = next(extra)
+            start = time.perf_counter()
+            version = history.record(key, lambda: iter(rows))
+            timings[version.keyframe].append(time.perf_counter() - start)
+        used = disk_use(history.directory)
+        snapshot = History(os.path.join(directory, "snapshot"))
+        snapshot.record(key, lambda: iter(rows))
+        full = disk_use(snapshot.directory)
+
+        print(f"{args.entries} entries, {args.versions} versions, keyframe every {args.interval}")
+        for keyframe, samples in timings.items():
+            if samples:
+                kind = "keyframe" if keyframe else "delta"
+                print(f"record {kind:>8}: median {statistics.median(samples) * 1000:.1f} ms ({len(samples)} versions)")
+        print(f"disk: {used / 2 ** 20:.1f} MiB for the history, {full / 2 ** 20:.1f} MiB per full snapshot "
+              f"({full * args.versions / 2 ** 20:.0f} MiB to keep them all)")
+
+        versions = [version.number for version in history.versions()]
+        # the deltas right before each keyframe are the slowest to restore, make sure some are sampled
+        picked = rng.sample(versions, min(args.restores, len(versions))) + [versions[-1]]
+        picked += [number - 1 for number in versions if number % args.interval == 0][:5]
+        samples = []
+        for number in picked:
+            start = time.perf_counter()
+            history.load(key, number)
+            samples.append(time.perf_counter() - start)
+        print(f"restore: median {statistics.median(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms "
+              f"over {len(samples)} versions")
+
+
+if __name__ == "__main__":
+    main()
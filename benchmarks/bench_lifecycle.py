@@ -0,0 +1,162 @@
+"""
+Times the whole vault lifecycle on seeded synthetic vaults and compares it against a stored baseline: unlock, open,
+lookup, add, remove, save, journal append and compaction and password generation at several vault sizes, with the peak
+memory of each step from tracemalloc.
+
+    python benchmarks/bench_lifecycle.py [--sizes 1000 10000 100000] [--output results.json]
+                                         [--baseline baseline.json] [--threshold 0.2]
+
+Times are the median of --repeat runs (per operation for lookup, add, remove, append and generate). Memory is measured
+in a separate run, tracemalloc slows everything down. With --baseline the exit status is 1 when a time or a peak grew
+by more than --threshold (0.2 = 20%) over the baseline, so the script can gate CI. Write a baseline with --output on a
+known good commit; it's only comparable on the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic
+from Dataframe import Data_Manager
+from OS_interface import System
+
+
+def steps(directory, size, seed, ops, layout):
+    # yields (step name, operations, function) in lifecycle order, each function runs the step once
+    state = {}
+    names = synthetic.usernames(size, seed)
+    wanted = names[::max(1, size // ops)][:ops]
+    added = [(f"new{number}@example.net", f"pw{number}") for number in range(ops)]
+
+    def unlock():
+        state["system"] = System(name="password.csv", get_input=synthetic.answers(), layout=layout,
+                                 directory=directory)
+        state["system"].masterVerify()
+
+    def open_vault():
+        state["manager"] = Data_Manager(state["system"].fileOpen(), input_function=lambda prompt: "16")
+
+    def lookup():
+        for name in wanted:
+            state["system"].fileLookup(name)
+
+    def retrieve():
+        for name in wanted:
+            state["manager"].retrieve(name)
+
+    def add():
+        for username, password in added:
+            state["manager"].add(username, password)
+
+    def remove():
+        for username, _ in added:
+            state["manager"].remove(username)
+
+    def save():
+        state["system"].fileClose(state["manager"].dataframe)
+
+    def append():
+        for username, password in added:
+            state["system"].fileAppend("add", username, password)
+        state["system"].fileAppendMany([("remove", username, None) for username, _ in added])
+
+    def compact():
+        # folds the appends back out so every repeat starts from the same vault
+        state["system"].journalCompact().join()
+
+    def generate():
+        for _ in range(ops):
+            state["manager"].pwrandom()
+
+    yield "unlock", 1, unlock
+    yield "open", 1, open_vault
+    yield "lookup", len(wanted), lookup
+    yield "retrieve", len(wanted), retrieve
+    yield "add", len(added), add
+    yield "remove", len(added), remove
+    yield "save", 1, save
+    yield "append", len(added) + 1, append
+    yield "compact", 1, compact
+    yield "generate", ops, generate
+
+
+def measure(size, args):
+    # one vault per size, every repeat walks the lifecycle once, the memory run is one more walk under tracemalloc
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic.make_vault(directory, size, args.seed, args.layout)
+        times = {}
+        for _ in range(args.repeat):
+            for name, operations, function in steps(directory, size, args.seed, args.ops, args.layout):
+                start = time.perf_counter()
+                function()
+                times.setdefault(name, []).append((time.perf_counter() - start) / operations)
+        peaks = {}
+        tracemalloc.start()
+        for name, operations, function in steps(directory, size, args.seed, args.ops, args.layout):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function()
+            peaks[name] = tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+    return {name: {"seconds": statistics.median(samples), "peak_bytes": peaks[name]}
+            for name, samples in times.items()}
+
+
+def compare(results, baseline, threshold):
+    # returns the lines describing every metric that grew past the threshold
+    regressions = []
+    for size, steps_ in results["results"].items():
+        for name, values in steps_.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            for metric, value in values.items():
+                if before.get(metric) and value > before[metric] * (1 + threshold):
+                    regressions.append(f"{size:>8} {name:>9} {metric:>10}: {before[metric]:.6g} -> {value:.6g} "
+                                       f"(+{(value / before[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ops", type=int, default=100, help="operations per step for the per operation steps")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=230)
+    parser.add_argument("--layout", default="entry", help="vault layout, entry or block")
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed growth over the baseline, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    results = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                        "system": platform.system(), "cpus": os.cpu_count(), "seed": args.seed, "ops": args.ops,
+                        "repeat": args.repeat, "layout": args.layout, "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+               "results": {}}
+    print(f"{'entries':>8} {'step':>9} {'ms':>10} {'peak KB':>10}")
+    for size in args.sizes:
+        measured = results["results"][str(size)] = measure(size, args)
+        for name, values in measured.items():
+            print(f"{size:>8} {name:>9} {values['seconds'] * 1000:>10.3f} {values['peak_bytes'] / 1024:>10.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as stored:
+            regressions = compare(results, json.load(stored), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.threshold:.0%}:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"no regressions over {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
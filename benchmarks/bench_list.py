@@ -0,0 +1,102 @@
+"""
+Reports frame times of the GUI's entry table while scrolling through a large vault, sorted by each column.
+
+    python benchmarks/bench_list.py [--entries 1000000] [--frames 500] [--query amb]
+
+Each sort order scrolls like a user would: wheel steps, page steps and scrollbar drags to random positions. "sort ms"
+is the first page after picking the order, the one time the order is built (the first filtered order also builds the
+search index), "fetch ms" the median and worst page fetched from Data_Manager after that. With a display (DISPLAY set,
+or on Windows and macOS) the same scrolling drives a Virtual_Table and "frame ms" is the time from the scroll event to
+the redrawn rows, Metrics' "ui.frame". Without one only the fetches are measured. A frame under 16 ms keeps scrolling
+at 60 frames per second.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Metrics
+import synthetic
+from Dataframe import CREATED, Data_Manager, SITE, USERNAME
+
+ROWS = 20
+
+
+def offsets(total, frames, rng):
+    # a mix of wheel steps, page steps and scrollbar drags
+    offset = 0
+    for _ in range(frames):
+        kind = rng.random()
+        if kind < 0.6:
+            offset += 3
+        elif kind < 0.8:
+            offset += ROWS
+        else:
+            offset = rng.randrange(max(total - ROWS, 1))
+        offset = min(offset, max(total - ROWS, 0))
+        yield offset
+
+
+def fetched(manager, query, sort, frames, seed):
+    start = time.perf_counter()
+    _, total = manager.entries(query, sort=sort, limit=ROWS)
+    first = time.perf_counter() - start
+    samples = []
+    for offset in offsets(total, frames, random.Random(seed)):
+        start = time.perf_counter()
+        manager.entries(query, sort=sort, offset=offset, limit=ROWS)
+        samples.append(time.perf_counter() - start)
+    return total, first, samples
+
+
+def drawn(manager, query, sort, frames, seed):
+    # the real table, each scroll handed to Tk and the loop run until the rows are redrawn
+    import tkinter as tk
+    from Virtual_list import Virtual_Table
+    root = tk.Tk()
+    table = Virtual_Table(root, lambda offset, limit, sort, descending:
+                          manager.entries(query, sort=sort, descending=descending, offset=offset, limit=limit),
+                          ((USERNAME, "Username", 280), (SITE, "Site", 200)), rows=ROWS)
+    table.frame.pack()
+    table.sort = sort
+    table.reset()
+    root.update()
+    Metrics.metrics.reset()
+    for offset in offsets(table.total, frames, random.Random(seed)):
+        table.scroll_to(offset)
+        root.update()
+    root.destroy()
+    frame = Metrics.metrics.snapshot()["timers"].get("ui.frame", {"count": 0, "seconds": 0.0, "max": 0.0})
+    return frame["seconds"] / max(frame["count"], 1), frame["max"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--frames", type=int, default=500, help="scroll steps per sort order")
+    parser.add_argument("--query", default="amb", help="search typed in the box for the filtered runs")
+    parser.add_argument("--seed", type=int, default=230)
+    args = parser.parse_args()
+
+    display = bool(os.environ.get("DISPLAY")) or sys.platform in ("win32", "darwin")
+    manager = Data_Manager(synthetic.records(args.entries, args.seed))
+    print(f"{args.entries} entries, {args.frames} scroll steps per order"
+          + ("" if display else ", no display: fetches only"))
+    print(f"{'query':>6} {'sort':>9} {'rows':>8} {'sort ms':>8} {'fetch ms':>9} {'worst ms':>9}"
+          + (f" {'frame ms':>9} {'worst ms':>9}" if display else ""))
+    for query in ("", args.query):
+        for sort, name in ((None, "default"), (USERNAME, "username"), (SITE, "site"), (CREATED, "created")):
+            total, first, samples = fetched(manager, query, sort, args.frames, args.seed)
+            line = (f"{query or '-':>6} {name:>9} {total:>8} {first * 1000:>8.0f} "
+                    f"{statistics.median(samples) * 1000:>9.2f} {max(samples) * 1000:>9.2f}")
+            if display:
+                average, worst = drawn(manager, query, sort, args.frames, args.seed)
+                line += f" {average * 1000:>9.2f} {worst * 1000:>9.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
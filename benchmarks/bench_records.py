@@ -0,0 +1,82 @@
+"""
+Reports the memory per record of the category-encoded Vault_Store next to a plain pandas DataFrame of the same entries,
+and the latency of filtered queries (by site, by tag, by both, by username) through its secondary indexes.
+
+    python benchmarks/bench_records.py [--sizes 100000 1000000] [--queries 200]
+
+Sites follow a long tail, so "largest site" and the tags match a big share of the vault: those queries count every
+match but only build one page of entries. The first query builds the site and tag indexes, it's reported on its own.
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic
+from Dataframe import Data_Manager, Vault_Store
+
+
+def traced(function):
+    # returns (result, bytes still allocated by the call)
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def median_ms(function, arguments):
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(*argument)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=230)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'layout':>10} {'bytes/rec':>10}")
+    for size in args.sizes:
+        # both are charged for the strings they keep, the dataframe the store was built from is freed by then
+        frame, frame_bytes = traced(lambda: synthetic.records(size, args.seed))
+        _, store_bytes = traced(lambda: Vault_Store.from_dataframe(synthetic.records(size, args.seed)))
+        print(f"{size:>8} {'dataframe':>10} {frame_bytes / size:>10.0f}")
+        print(f"{size:>8} {'store':>10} {store_bytes / size:>10.0f}")
+
+        manager = Data_Manager(frame)
+        rng = random.Random(args.seed)
+        sites = list(dict.fromkeys(frame["Site"]))
+        largest = frame["Site"].value_counts().index[0]
+        names = frame["Username"].tolist()
+        start = time.perf_counter()
+        manager.query(site=largest)
+        build = (time.perf_counter() - start) * 1000
+        cases = [("site", [(rng.choice(sites),) for _ in range(args.queries)], lambda site: manager.query(site=site)),
+                 ("largest site", [(largest,)] * args.queries, lambda site: manager.query(site=site)),
+                 ("tag", [(rng.choice(synthetic.TAGS),) for _ in range(args.queries)],
+                  lambda tag: manager.query(tag=tag)),
+                 ("site + tag", [(rng.choice(sites), rng.choice(synthetic.TAGS)) for _ in range(args.queries)],
+                  lambda site, tag: manager.query(site=site, tag=tag)),
+                 ("username", [(rng.choice(names),) for _ in range(args.queries)],
+                  lambda username: manager.query(username=username))]
+        print(f"{'entries':>8} {'query':>14} {'ms':>8}")
+        print(f"{size:>8} {'index build':>14} {build:>8.1f}")
+        for name, arguments, function in cases:
+            print(f"{size:>8} {name:>14} {median_ms(function, arguments):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
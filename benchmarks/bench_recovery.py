@@ -0,0 +1,99 @@
+"""
+Reports security question recovery latency: loading recovery.txt, checking right and wrong answers and unwrapping the
+vault key for several k-of-n setups, next to the legacy security.csv check.
+
+    python benchmarks/bench_recovery.py [--setups 1/1 2/3 3/5] [--kdf pbkdf2-sha256] [--repeat 5]
+
+Answers are stretched like the master password, by default with the calibrated KDF, so recovery takes about threshold
+times the unlock latency. Right and wrong answers should take the same time. The last line checks in a fresh interpreter
+that recovery never imports pandas.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Key_derivation
+from cryptography.hazmat.primitives import hashes
+from Recovery import Recovery
+
+CHILD = """
+import sys
+sys.path.insert(0, {root!r})
+from Recovery import Recovery
+recovery = Recovery.load({path!r})
+recovery.unwrap({{0: recovery.check(0, "answer0")}})
+print("pandas.core" in sys.modules)
+"""
+
+
+def median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def legacy_hash(answer):
+    generate = hashes.Hash(hashes.SHA256())
+    generate.update(answer.encode())
+    return generate.finalize()
+
+
+def legacy_check(path, answer):
+    # what SecQ did before recovery.txt: read the csv with pandas on every attempt, compare the digest reprs
+    qs = pd.read_csv(path, dtype=str, header=None, index_col=False)
+    return str(legacy_hash(answer)) == qs.iat[1, 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--setups", nargs="+", default=["1/1", "2/3", "3/5"], help="threshold/questions")
+    parser.add_argument("--kdf", default="scrypt", help="scrypt or pbkdf2-sha256, calibrated to --target")
+    parser.add_argument("--target", type=float, default=Key_derivation.TARGET_SECONDS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    kdf = Key_derivation.calibrate(args.kdf, args.target)
+    key = os.urandom(44)
+    print(f"kdf {kdf.name} {kdf.params()}")
+    print(f"{'setup':>6} {'create ms':>10} {'load ms':>8} {'right ms':>9} {'wrong ms':>9} {'recover ms':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "recovery.txt")
+        for setup in args.setups:
+            threshold, count = (int(part) for part in setup.split("/"))
+            pairs = [(f"question{number}", f"answer{number}") for number in range(count)]
+            created = median_ms(lambda: Recovery.create(pairs, key, threshold, kdf).save(path), 1)
+            loaded = median_ms(lambda: Recovery.load(path), args.repeat)
+            recovery = Recovery.load(path)
+            right = median_ms(lambda: recovery.check(0, "answer0"), args.repeat)
+            wrong = median_ms(lambda: recovery.check(0, "wrong"), args.repeat)
+
+            def recover():
+                shares = {number: recovery.check(number, f"answer{number}") for number in range(threshold)}
+                assert recovery.unwrap(shares) == key
+
+            recovered = median_ms(recover, args.repeat)
+            print(f"{setup:>6} {created:>10.1f} {loaded:>8.3f} {right:>9.1f} {wrong:>9.1f} {recovered:>11.1f}")
+
+        legacy = os.path.join(directory, "security.csv")
+        pd.DataFrame([["question0"], [legacy_hash("answer0")]]).to_csv(legacy, header=False, index=False)
+        print(f"legacy security.csv check: {median_ms(lambda: legacy_check(legacy, 'answer0'), args.repeat):.3f} ms "
+              f"(unsalted, no KDF)")
+
+        Recovery.create([("question0", "answer0")], key, 1, kdf).save(path)
+        child = CHILD.format(root=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path=path)
+        imported = subprocess.run([sys.executable, "-c", child], capture_output=True, text=True, check=True)
+        print(f"recovery imports pandas: {imported.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Times reading one password out of a large vault: a full fileOpen against the indexed fileRetrieve, for both on-disk
+layouts.
+
+    python benchmarks/bench_retrieve.py [--entries 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from OS_interface import System
+
+MASTER = "benchmark"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    args = parser.parse_args()
+
+    frame = pd.DataFrame({"Username": [f"user{i}@example.com" for i in range(args.entries)],
+                          "Password": [f"pw{i:012d}" for i in range(args.entries)]})
+    wanted = f"user{args.entries // 2}@example.com"
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        answers = iter([MASTER, "question", "answer", "stop"])
+        System(name="password.csv", get_input=lambda prompt: next(answers, MASTER))
+        print(f"{'layout':>8} {'save s':>8} {'open s':>8} {'retrieve ms':>12} {'file MB':>8}")
+        for layout in ("block", "entry"):
+            system = System(name="password.csv", get_input=lambda prompt: MASTER, layout=layout)
+            start = time.perf_counter()
+            system.fileClose(frame)
+            saved = time.perf_counter()
+            system.fileOpen()
+            opened = time.perf_counter()
+            system.fileRetrieve(wanted)
+            retrieved = time.perf_counter()
+            print(f"{layout:>8} {saved - start:>8.2f} {opened - saved:>8.2f} {(retrieved - opened) * 1000:>12.2f} "
+                  f"{os.path.getsize('password.csv') / (1 << 20):>8.1f}")
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Times username search: building the index, then a page of results per keystroke while typing usernames from the
+vault, with and without typos, plus incremental adds and removes.
+
+    python benchmarks/bench_search.py [--entries 1000000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Generator
+from Search import Username_Index
+
+DOMAINS = ("gmail.com", "outlook.com", "yahoo.com", "proton.me", "example.com", "icloud.com", "work.example.org")
+
+
+def usernames(count, rng):
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(Generator.WORDS)}.{rng.choice(Generator.WORDS)}{rng.randrange(10000)}"
+                  f"@{rng.choice(DOMAINS)}")
+    return list(names)
+
+
+def typo(name, rng):
+    # swaps two neighbouring characters
+    position = rng.randrange(len(name) - 1)
+    return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200, help="usernames typed out, one search per keystroke")
+    args = parser.parse_args()
+
+    rng = random.Random(230)
+    names = usernames(args.entries, rng)
+    start = time.perf_counter()
+    index = Username_Index(names)
+    built = time.perf_counter() - start
+
+    print(f"{args.entries} usernames, index built in {built:.2f}s")
+    print(f"{'typing':>8} {'searches':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, transform in (("exact", lambda name: name), ("typo", lambda name: typo(name, rng))):
+        latencies = []
+        for name in rng.sample(names, args.queries):
+            typed = transform(name)
+            for length in range(1, len(typed) + 1):
+                start = time.perf_counter()
+                index.search(typed[:length])
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"{label:>8} {len(latencies):>9} {percentile(latencies, 0.5) * 1000:>8.3f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.3f} {latencies[-1] * 1000:>8.3f}")
+
+    added = [f"new{number}@example.net" for number in range(1000)]
+    start = time.perf_counter()
+    for name in added:
+        index.add(name)
+    adding = time.perf_counter() - start
+    start = time.perf_counter()
+    for name in added:
+        index.remove(name)
+    removing = time.perf_counter() - start
+    print(f"add {adding / len(added) * 1e6:.1f} us, remove {removing / len(added) * 1e6:.1f} us per username")
+
+
+if __name__ == "__main__":
+    main()
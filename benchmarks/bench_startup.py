@@ -0,0 +1,72 @@
+"""
+Times a headless `python -m CLI get` from process start to exit and checks which heavy modules it imports.
+
+    python benchmarks/bench_startup.py [--entries 100000] [--runs 20]
+
+The master password is stored with a cheap PBKDF2 setting so the numbers show the interpreter, import and lookup
+overhead; a real vault adds its calibrated KDF cost (~250 ms by default) on top.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import Key_derivation
+from OS_interface import System
+
+MASTER = "benchmark"
+HEAVY = ("pandas", "numpy", "tkinter")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    frame = pd.DataFrame({"Username": [f"user{i}@example.com" for i in range(args.entries)],
+                          "Password": [f"pw{i:012d}" for i in range(args.entries)]})
+    wanted = f"user{args.entries // 2}@example.com"
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        answers = iter([MASTER, "question", "answer", "stop"])
+        System(name="password.csv", get_input=lambda prompt: next(answers, MASTER))
+        with open("mpass.txt", "w") as mPassFile:
+            mPassFile.write(Key_derivation.hash_password(MASTER, Key_derivation.PBKDF2_KDF(1000)))
+        System(name="password.csv", get_input=lambda prompt: MASTER).fileClose(frame)
+
+        environment = dict(os.environ, PYTHONPATH=REPO, SYS230_MASTER_PASSWORD=MASTER)
+        command = [sys.executable, "-m", "CLI", "get", wanted]
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run(command, env=environment, check=True, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        baseline = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            baseline.append(time.perf_counter() - start)
+
+        # -X importtime lists every module imported, one per line on stderr
+        traced = subprocess.run([sys.executable, "-X", "importtime"] + command[1:], env=environment, check=True,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+        imported = {line.split("|")[-1].strip().split(".")[0] for line in traced.splitlines() if "|" in line}
+        os.chdir("/")
+
+    print(f"{'entries':>8} {'get median ms':>14} {'get max ms':>11} {'bare python ms':>15}")
+    print(f"{args.entries:>8} {statistics.median(times) * 1000:>14.1f} {max(times) * 1000:>11.1f} "
+          f"{statistics.median(baseline) * 1000:>15.1f}")
+    for module in HEAVY:
+        print(f"{module}: {'imported' if module in imported else 'not imported'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compares lookup, add and remove latency of the indexed Data_Manager store against the original
+DataFrame-scanning implementation.
+
+    python benchmarks/bench_store.py [--sizes 1000 100000 1000000] [--ops 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Dataframe import Data_Manager
+
+
+class Legacy_Manager:
+    # the pre-index implementation: boolean masks for lookups, one .loc enlargement per add
+    def __init__(self, df):
+        self.dataframe = df
+
+    def add(self, username, passwd):
+        index = len(self.dataframe.index)
+        self.dataframe.loc[index, :] = [username, passwd]
+
+    def remove(self, username):
+        index = int(self.dataframe[self.dataframe['Username'] == username].index.values[0])
+        self.dataframe.drop(labels=[index], axis=0, inplace=True)
+
+    def retrieve(self, username):
+        return self.dataframe[self.dataframe['Username'] == username]
+
+
+def make_frame(size):
+    return pd.DataFrame({"Username": [f"user{i}" for i in range(size)],
+                         "Password": [f"pw{i}" for i in range(size)]})
+
+
+def time_ops(function, args):
+    # returns the mean latency of the calls in microseconds
+    start = time.perf_counter()
+    for arg in args:
+        function(*arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def run(manager_class, size, ops, seed):
+    rng = random.Random(seed)
+    manager = manager_class(make_frame(size))
+    lookups = [(f"user{rng.randrange(size)}",) for _ in range(ops)]
+    adds = [(f"new{i}", f"pw{i}") for i in range(ops)]
+    removes = [(f"user{i}",) for i in rng.sample(range(size), min(ops, size))]
+    return {"lookup": time_ops(manager.retrieve, lookups),
+            "add": time_ops(manager.add, adds),
+            "remove": time_ops(manager.remove, removes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=230)
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'impl':>8} {'lookup us':>12} {'add us':>12} {'remove us':>12}")
+    for size in args.sizes:
+        for name, manager_class in (("legacy", Legacy_Manager), ("indexed", Data_Manager)):
+            result = run(manager_class, size, args.ops, args.seed)
+            print(f"{size:>10} {name:>8} {result['lookup']:>12.1f} {result['add']:>12.1f} {result['remove']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measures open and save latency and peak memory of System's vault pipeline against the original whole-file pipeline
+(decrypt to disk, read_csv, to_csv, re-read and encrypt).
+
+    python benchmarks/bench_stream.py [--size-mb 500] [--layout block|entry] [--history]
+
+Every measurement runs in a fresh interpreter so the peak RSS of one pipeline doesn't hide the other. The System runs
+pin what they measure: the vault layout saves are written in (block, System's default, unless --layout says otherwise)
+and whether each save is also recorded in the vault history (off unless --history), and both are printed with the
+results. Opening includes the master password KDF, with the legacy unsalted hash the vault is built with.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MASTER = "benchmark"
+
+
+def legacy_open(name, key):
+    # fileDecrypt + fileOpen as they were: plaintext is written back to disk and parsed from there
+    with open(name, 'rb') as storage:
+        decrypted = key.decrypt(storage.read())
+    with open(name, 'wb') as storage:
+        storage.write(decrypted)
+    import pandas as pd
+    return pd.read_csv(name, dtype=str, header=None, index_col=False)
+
+
+def legacy_close(name, key, frame):
+    frame.to_csv(name, header=False, index=False)
+    with open(name, 'rb') as storage:
+        encrypted = key.encrypt(storage.read())
+    with open(name, 'wb') as storage:
+        storage.write(encrypted)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def child(mode, directory, layout, history):
+    os.chdir(directory)
+    from cryptography.fernet import Fernet
+    from History import HISTORY_KEEP
+    from OS_interface import System
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "legacy":
+        key = Fernet(open("key.key", 'rb').read())
+        frame = legacy_open("password.csv", key)
+        opened = time.perf_counter()
+        legacy_close("password.csv", key, frame)
+    else:
+        system = System(name="password.csv", get_input=lambda prompt: MASTER, layout=layout,
+                        historyKeep=HISTORY_KEEP if history else 0)
+        frame = system.fileOpen()
+        opened = time.perf_counter()
+        system.fileClose(frame)
+    closed = time.perf_counter()
+    print(json.dumps({"open_s": opened - start, "save_s": closed - opened, "rows": len(frame.index),
+                      "baseline_mb": baseline, "peak_mb": peak_rss_mb()}))
+
+
+def build_vault(directory, size_mb):
+    import pandas as pd
+    from cryptography.fernet import Fernet
+    from OS_interface import System
+    os.chdir(directory)
+    key = Fernet.generate_key()
+    open("key.key", 'wb').write(key)
+    rows = size_mb * (1 << 20) // 40
+    frame = pd.DataFrame({"Username": [f"user{i:010d}@example.com" for i in range(rows)],
+                          "Password": [f"pw{i:012d}" for i in range(rows)]})
+    legacy_close("password.csv", Fernet(key), frame)
+    system = System.__new__(System)
+    open("mpass.txt", 'w').write(str(system.strHash(MASTER)))
+    open("security.csv", 'w').write("q\nanswer\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--layout", choices=("block", "entry"), default="block", help="layout saves are written in")
+    parser.add_argument("--history", action="store_true", help="record every save in the vault history too")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        mode, directory = args.child
+        if mode == "build":
+            build_vault(directory, args.size_mb)
+        else:
+            child(mode, directory, args.layout, args.history)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        # linux carries ru_maxrss over fork, so even building the vault happens in a child
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--size-mb", str(args.size_mb),
+                        "--child", "build", directory], check=True)
+        print(f"vault: {os.path.getsize(os.path.join(directory, 'password.csv')) / (1 << 20):.0f} MB encrypted, "
+              f"System saves in the {args.layout} layout, history {'on' if args.history else 'off'}")
+        print(f"{'pipeline':>10} {'open s':>8} {'save s':>8} {'peak MB':>9} {'over base MB':>13}")
+        # the first streamed run still has to read the legacy single token file, it's reported as "upgrade"
+        for label, mode in (("legacy", "legacy"), ("upgrade", "streamed"), ("streamed", "streamed")):
+            command = [sys.executable, os.path.abspath(__file__), "--child", mode, directory, "--layout", args.layout]
+            output = subprocess.run(command + (["--history"] if args.history else []),
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{label:>10} {result['open_s']:>8.2f} {result['save_s']:>8.2f} {result['peak_mb']:>9.0f} "
+                  f"{result['peak_mb'] - result['baseline_mb']:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
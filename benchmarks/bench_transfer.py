@@ -0,0 +1,53 @@
+"""
+Reports import and export throughput in entries per second for a synthetic Bitwarden-style CSV export.
+
+    python benchmarks/bench_transfer.py [--entries 100000]
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Dataframe import Data_Manager
+from OS_interface import System
+
+MASTER = "benchmark"
+
+
+def write_export(path, entries):
+    with open(path, 'w', newline="") as export:
+        writer = csv.writer(export)
+        writer.writerow(("folder", "favorite", "type", "name", "notes", "fields", "reprompt", "login_uri",
+                         "login_username", "login_password", "login_totp"))
+        for i in range(entries):
+            writer.writerow(("", "", "login", f"site{i}", "", "", "0", f"https://site{i}.example.com",
+                             f"user{i}@example.com", f"pw,{i:012d}", ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        write_export("bitwarden.csv", args.entries)
+        answers = iter([MASTER, "question", "answer", "stop"])
+        system = System(name="password.csv", get_input=lambda prompt: next(answers, MASTER))
+        manager = Data_Manager(pd.DataFrame(columns=("Username", "Password")))
+        print(f"{'operation':>18} {'entries':>10} {'seconds':>8} {'entries/s':>10}")
+        results = [("import", system.fileImport("bitwarden.csv", manager)),
+                   ("export encrypted", system.fileExport("export.vault")),
+                   ("export plaintext", system.fileExport("export.csv", encrypted=False)),
+                   ("import encrypted", system.fileImport("export.vault", manager, replace=True))]
+        for name, result in results:
+            print(f"{name:>18} {result['entries']:>10} {result['seconds']:>8.2f} {result['rate']:>10.0f}")
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Times unlocking and querying 1 to 64 vaults, one after another in this process and spread over a process pool, then
+checks that processes appending to the same vault at once don't lose records.
+
+    python benchmarks/bench_vaults.py [--vaults 64] [--entries 1000] [--iterations 100000] [--writers 4]
+
+The speedup is bounded by the number of cores, it's printed alongside the results.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Key_derivation
+import Vaults
+
+MASTER = "correct horse battery staple"
+
+
+def append(directory, writer, count):
+    # one process's share of the concurrent writes, each one its own locked journal append
+    system = Vaults.unlock(directory, MASTER)
+    for number in range(count):
+        system.fileAppend("add", f"writer{writer}-{number}@example.com", f"pw{number}")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vaults", type=int, default=64, help="largest number of vaults, doubled from 1")
+    parser.add_argument("--entries", type=int, default=1000, help="entries per vault")
+    parser.add_argument("--iterations", type=int, default=100000, help="PBKDF2 iterations of each master password")
+    parser.add_argument("--lookups", type=int, default=10, help="usernames looked up in every vault")
+    parser.add_argument("--writers", type=int, default=4, help="processes appending to one vault at once")
+    parser.add_argument("--appends", type=int, default=200, help="appends per writer")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as root:
+        os.chdir(root)
+        kdf = Key_derivation.PBKDF2_KDF(args.iterations)
+        start = time.perf_counter()
+        directories = []
+        # the first time setup still prints what it creates
+        with contextlib.redirect_stdout(io.StringIO()):
+            for number in range(args.vaults):
+                directory = os.path.join(root, f"vault{number:02d}")
+                system = Vaults.create_vault(directory, MASTER, [("question", "answer")], kdf=kdf)
+                system.fileAppendMany([("add", f"user{entry}@example.com", f"pw{number}-{entry}")
+                                       for entry in range(args.entries)])
+                system.journalCompact().join()
+                directories.append(directory)
+        print(f"{args.vaults} vaults of {args.entries} entries created in {time.perf_counter() - start:.1f}s, "
+              f"{cores} cores")
+
+        usernames = [f"user{entry * 7 % args.entries}@example.com" for entry in range(args.lookups)]
+        print(f"{'vaults':>6} {'serial s':>9} {'pool s':>8} {'vaults/s':>9} {'speedup':>8}")
+        with ProcessPoolExecutor(cores) as pool:
+            # starts the workers before timing
+            list(pool.map(abs, range(cores)))
+            count = 1
+            while count <= args.vaults:
+                chosen = directories[:count]
+                start = time.perf_counter()
+                serial = Vaults.lookup_many(chosen, MASTER, usernames, processes=1)
+                serialSeconds = time.perf_counter() - start
+                start = time.perf_counter()
+                pooled = Vaults.lookup_many(chosen, MASTER, usernames, executor=pool)
+                poolSeconds = time.perf_counter() - start
+                if pooled != serial:
+                    raise SystemExit("pool and serial lookups disagree")
+                print(f"{count:>6} {serialSeconds:>9.2f} {poolSeconds:>8.2f} {count / poolSeconds:>9.1f} "
+                      f"{serialSeconds / poolSeconds:>7.2f}x")
+                count *= 2
+
+        # concurrent writers on one vault: every append has to land, with its own sequence number
+        directory = directories[0]
+        start = time.perf_counter()
+        with ProcessPoolExecutor(args.writers) as pool:
+            written = sum(pool.map(append, [directory] * args.writers, range(args.writers),
+                                   [args.appends] * args.writers))
+        seconds = time.perf_counter() - start
+        with contextlib.redirect_stdout(io.StringIO()):
+            system = Vaults.unlock(directory, MASTER)
+            content = system.fileOpen()
+        sequences = [record[0] for record in system.journal.records(system.keyGet())]
+        found = len(content.index) - args.entries
+        print(f"{args.writers} writers, {written} appends in {seconds:.2f}s: {found} found, "
+              f"{len(set(sequences))} distinct sequence numbers in {len(sequences)} journal records")
+        if found != written or len(set(sequences)) != len(sequences):
+            raise SystemExit("concurrent appends were lost")
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Seeded synthetic vaults for the benchmarks: the same seed always gives the same usernames, passwords and vault.
+"""
+import os
+import random
+import string
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Key_derivation
+from OS_interface import System
+
+MASTER = "benchmark"
+DOMAINS = ("gmail.com", "outlook.com", "yahoo.com", "proton.me", "example.com", "icloud.com", "work.example.org")
+TAGS = ("work", "personal", "finance", "shopping", "social", "travel", "dev", "family")
+WORDS = ("river", "stone", "maple", "orbit", "lemon", "cedar", "pixel", "amber", "delta", "harbor", "violet", "tiger")
+ALPHABET = string.ascii_letters + string.digits + "!@#$%^&*()-_=+[]{},.;:'\"/?\\|"
+
+
+def usernames(count, seed):
+    # unique, email-like, with the shared domains and word stems real vaults have
+    rng = random.Random(seed)
+    names = dict.fromkeys(f"{rng.choice(WORDS)}.{rng.choice(WORDS)}{number}@{rng.choice(DOMAINS)}"
+                          for number in range(count))
+    return list(names)
+
+
+def passwords(count, seed, length=16):
+    # quotes, commas and backslashes included, they're what trips up serialization
+    rng = random.Random(seed + 1)
+    return ["".join(rng.choices(ALPHABET, k=length)) for _ in range(count)]
+
+
+def frame(count, seed):
+    return pd.DataFrame({"Username": usernames(count, seed), "Password": passwords(count, seed)})
+
+
+def records(count, seed, sites=2000):
+    # full entries: sites drawn with a long tail (a few sites hold most entries), one URL per site, one or two tags,
+    # timestamps over the last couple of years
+    rng = random.Random(seed + 2)
+    names = [f"{rng.choice(WORDS)}{number}.example.com" for number in range(sites)]
+    picked = [names[min(int(rng.paretovariate(1.0)) - 1, sites - 1)] for _ in range(count)]
+    tags = [",".join(sorted(set(rng.sample(TAGS, rng.randint(1, 2))))) for _ in range(count)]
+    created = [str(1700000000 + rng.randrange(60000000)) for _ in range(count)]
+    return pd.DataFrame({"Username": usernames(count, seed), "Password": passwords(count, seed), "Site": picked,
+                         "URL": [f"https://{site}/login" for site in picked], "Notes": [""] * count, "Tags": tags,
+                         "Created": created, "Modified": created})
+
+
+def answers(password=MASTER):
+    # scripted get_input for System: one security question during the first time setup, the master password for
+    # everything else
+    questions = iter(["question"])
+
+    def answer(prompt):
+        if prompt.startswith("Please input a security question"):
+            return next(questions, "stop")
+        if prompt.startswith("Please input an answer"):
+            return "answer"
+        return password
+    return answer
+
+
+def make_vault(directory, count, seed, layout="entry", iterations=1000):
+    """
+    Creates a vault of `count` synthetic entries in directory and returns it unlocked.
+    :param iterations: int - PBKDF2 iterations of the master password, kept low so unlocking doesn't drown out what's
+                       being measured
+    :return: System
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "mpass.txt"), 'w') as mPassFile:
+        mPassFile.write(Key_derivation.hash_password(MASTER, Key_derivation.PBKDF2_KDF(iterations)))
+    system = System(name="password.csv", get_input=answers(), layout=layout, directory=directory)
+    system.fileClose(frame(count, seed))
+    return system
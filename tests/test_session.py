@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cryptography.fernet import Fernet
+from Session import Session
+
+
+def test_expire_waits_for_holders(tmp_path):
+    path = tmp_path / "key.key"
+    path.write_bytes(Fernet.generate_key())
+    session = Session(str(path), timeout=None)
+    with session.hold():
+        _, indexKey = session.entryKeys()
+        copy = bytes(indexKey)
+        session.expire()
+        # locked at once, the next use loads its own buffers, the ones in use are left alone
+        assert session.indexKey is None
+        assert bytes(indexKey) == copy
+        assert session.entryKeys()[1] is not indexKey
+    assert indexKey == bytearray(len(indexKey))
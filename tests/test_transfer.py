@@ -0,0 +1,36 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+import Transfer
+from Dataframe import Data_Manager
+
+# header and date format of a KeePassXC 2.7 CSV export
+KEEPASSXC = ('"Group","Title","Username","Password","URL","Notes","TOTP","Icon","Last Modified","Created"\n'
+             '"Root","github","me@example.org","a","https://github.com","","","0","2021-03-04T10:11:12Z",'
+             '"2020-01-02T03:04:05Z"\n'
+             '"Root/Work","gitlab","me@example.org","b","","","","0","not a date",""\n')
+
+
+def test_keepassxc_dates_become_seconds(tmp_path):
+    path = tmp_path / "keepassxc.csv"
+    path.write_text(KEEPASSXC)
+    frame = pd.concat(Transfer.read(str(path)))
+    assert frame["Created"].tolist() == ["1577934245", ""]
+    assert frame["Modified"].tolist() == ["1614852672", ""]
+
+    manager = Data_Manager(pd.DataFrame(columns=("Username", "Password")))
+    assert sum(manager.add_many(chunk) for chunk in Transfer.read(str(path))) == 2
+    imported = manager.dataframe.set_index("Site")
+    assert imported.loc["github", "Created"] == "1577934245"
+    # dates that can't be read are stamped with the import time
+    assert int(imported.loc["gitlab", "Modified"]) > 1614852672
+
+
+def test_out_of_range_seconds_are_stamped(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text("Username,Password,Site,Created\nalice,a,github,99999999999999999999\n")
+    manager = Data_Manager(pd.DataFrame(columns=("Username", "Password")))
+    assert sum(manager.add_many(chunk) for chunk in Transfer.read(str(path))) == 1
+    assert int(manager.dataframe["Created"][0]) < 10 ** 11